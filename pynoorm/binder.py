@@ -41,7 +41,7 @@ Binder classes perform two functions through their format method
       {"country":"CAN", "customer" : 101}
 
 
-  a positional database (paramstyle="numeric") (NotImplementedError)
+  a positional database (paramstyle="numeric")
   would instead return
 
   qry:
@@ -52,25 +52,2492 @@ Binder classes perform two functions through their format method
 
 """
 
+import hashlib
 import re
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from numbers import Integral
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    # Python 2
+    from collections import Mapping
+from itertools import chain
+
+
+# how many compiled query templates each Binder keeps around
+DEFAULT_CACHE_SIZE = 512
+
+# list bind bucketing:  pad lists up to the next power of 2...
+BUCKETS_POW2 = "pow2"
+
+# ... by repeating their last value or with NULLs
+PAD_LAST = "last"
+PAD_NULL = "null"
+
+
+class TemplateCache(object):
+    """bounded LRU cache of compiled query templates
+
+    keyed by the query template text.  `hits`, `misses` and `evictions`
+    are simple counters, use `stats()` to size `maxsize` from real traffic.
+
+    safe to share between threads.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._di = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+        # moves a key to the most-recently-used end, None on Python 2
+        self._touch = getattr(self._di, "move_to_end", None)
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.stats())
+
+    def __len__(self):
+        return len(self._di)
+
+    def get(self, key, compile_):
+        """return the cached value for `key`, calling `compile_(key)` on a miss"""
+        di = self._di
+
+        if self._touch is not None:
+            # hits don't take the lock, OrderedDict's operations are atomic.
+            # `hits` can miss a few increments between threads.
+            try:
+                value = di[key]
+                self._touch(key)
+            except KeyError:
+                # missing, or evicted by another thread in between
+                pass
+            else:
+                self.hits += 1
+                return value
+
+        with self._lock:
+            try:
+                value = di.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                # (re)inserting puts the key back at the most-recently-used end
+                di[key] = value
+                return value
+
+        # compile outside the lock, at worst two threads compile the same template
+        value = compile_(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """cache `value` for `key`, such as an already compiled template"""
+
+        if self.maxsize <= 0:
+            # caching disabled
+            return
+
+        di = self._di
+        with self._lock:
+            di.pop(key, None)
+            while len(di) >= self.maxsize:
+                di.popitem(last=False)
+                self.evictions += 1
+            di[key] = value
+
+    def values(self):
+        """a snapshot of the cached values"""
+        with self._lock:
+            return list(self._di.values())
+
+    def clear(self):
+        with self._lock:
+            self._di.clear()
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            size=len(self._di),
+            maxsize=self.maxsize,
+        )
+
+
+# what normalize_sql drops:  comments (but not /*+ optimizer hints */) and whitespace
+# runs, collapsed to a single space.  quoted strings and identifiers are kept as is.
+RE_NORMALIZE = re.compile(
+    r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|((?:\s|--[^\n]*|/\*(?!\+).*?\*/)+)""", re.DOTALL
+)
+
+
+def _normalize_match(match):
+    quoted = match.group(1)
+    return " " if quoted is None else quoted
+
+
+def normalize_sql(tqry):
+    """
+    the query template without its comments and insignificant whitespace:
+
+        select *   -- all of it
+        from orders
+        where status = 'A  B'
+
+    becomes `select * from orders where status = 'A  B'`.
+
+    quotes are doubled to escape them, as in standard SQL.  backslash escapes
+    (MySQL, Postgres E'...') aren't understood.
+    """
+    return RE_NORMALIZE.sub(_normalize_match, tqry).strip()
+
+
+def fingerprint_sql(tqry):
+    """a stable id for a query template, the same whatever its comments,
+       whitespace or the paramstyle it's rendered in"""
+    return hashlib.sha1(normalize_sql(tqry).encode("utf-8")).hexdigest()[:16]
+
+
+# query template tokens, see `tokenize`
+TOKEN_LITERAL = "literal"
+TOKEN_BIND = "s"
+TOKEN_LIST = "l"
+
+# %[ ... %] optional fragments
+TOKEN_OPEN = "["
+TOKEN_CLOSE = "]"
+
+
+def tokenize(tqry):
+    """
+    splits a query template into (kind, value) tokens in a single pass:
+
+    - (TOKEN_LITERAL, text) for SQL text, where `%%` is already unescaped to `%`
+    - (TOKEN_BIND, key) for scalar binds, %(key)s
+    - (TOKEN_LIST, key) for list binds, %(key)l
+    - (TOKEN_OPEN, "") and (TOKEN_CLOSE, "") around optional fragments, %[ ... %]
+
+    any other use of `%` raises ValueError.
+    """
+
+    tokens = []
+    literal = []
+    pos = 0
+    length = len(tqry)
+
+    while True:
+        found = tqry.find("%", pos)
+        if found < 0:
+            literal.append(tqry[pos:])
+            break
+
+        literal.append(tqry[pos:found])
+        follow = tqry[found + 1 : found + 2]
+
+        if follow == "%":
+            literal.append("%")
+            pos = found + 2
+            continue
+
+        if follow in (TOKEN_OPEN, TOKEN_CLOSE):
+            text = "".join(literal)
+            if text:
+                tokens.append((TOKEN_LITERAL, text))
+            literal = []
+            tokens.append((follow, ""))
+            pos = found + 2
+            continue
+
+        if follow != "(":
+            raise ValueError(
+                "unsupported format at position %s of query template: %r.  "
+                "use %%(key)s for binds, %%[ ... %%] for optional fragments "
+                "and %%%% for a literal %%" % (found, tqry[found : found + 10])
+            )
+
+        # the key runs to the matching parenthesis
+        depth = 1
+        ix = found + 2
+        while ix < length:
+            char = tqry[ix]
+            if char == ")":
+                depth -= 1
+                if not depth:
+                    break
+            elif char == "(":
+                depth += 1
+            ix += 1
+
+        key = tqry[found + 2 : ix]
+        kind = tqry[ix + 1 : ix + 2]
+        if ix >= length or kind not in (TOKEN_BIND, TOKEN_LIST):
+            raise ValueError(
+                "unsupported bind at position %s of query template: %r.  "
+                "expecting %%(key)s or %%(key)l" % (found, tqry[found : ix + 2])
+            )
+
+        text = "".join(literal)
+        if text:
+            tokens.append((TOKEN_LITERAL, text))
+        literal = []
+
+        tokens.append((kind, key))
+        pos = ix + 2
+
+    text = "".join(literal)
+    if text:
+        tokens.append((TOKEN_LITERAL, text))
+
+    return tokens
+
+
+# how %(xxx)l list binds get rendered, see ListStrategy
+LIST_EXPAND = "expand"
+LIST_ARRAY = "array"
+LIST_VALUES = "values"
+LIST_TEMPTABLE = "temptable"
+LIST_RANGES = "ranges"
+LIST_ROWS = "rows"
+LIST_ROWS_OR = "rows_or"
+
+# lists with at least this many values switch to the Binder's list_strategy
+DEFAULT_LIST_STRATEGY_THRESHOLD = 1000
+
+# list_optimize: runs of at least this many consecutive integers become a BETWEEN
+DEFAULT_LIST_MIN_RANGE = 3
+
+# rows fetched at a time by execute_chunks, DB-API's default arraysize is 1
+DEFAULT_FETCH_SIZE = 1000
+
+# a list bind used as `expr in (%(xxx)l)` or `expr not in (%(xxx)l)`:
+# the literal text before the list and the one after it
+# `expr` can also be a row of columns, `(custid, ordernum) in (%(xxx)l)`.
+# the predicate has to be a whole operand:  `abs(custid) in`, `a + b in`
+# or `... in (%(xxx)l) = 0` are left alone.
+RE_IN_BEFORE = re.compile(
+    r"(?:^|[(,]|\b(?:select|where|and|or|not|on|having|when|then|else)\b)\s*"
+    r"(?:(?P<expr>[\w.$#\"`\[\]]+)\s+|(?P<row>\([^()]*\))\s*)"
+    r"(?P<negated>not\s+)?in\s*\(\s*$",
+    re.IGNORECASE,
+)
+RE_IN_AFTER = re.compile(
+    r"\s*\)(?!\s*(?:[-+*/%|=<>!^&~]|(?:is|collate|between|like|glob|in)\b))",
+    re.IGNORECASE,
+)
+
+
+class ListStrategy(object):
+    """how a %(xxx)l list bind is rendered in the query
+
+    only the list bind itself is replaced, i.e. the `%(xxx)l` in
+    `where custid in (%(xxx)l)`, so the template text stays the same
+    whatever the strategy.
+    """
+
+    name = None
+
+    # True if the query text depends on the list's length
+    sized = True
+
+    # paramstyles the strategy works with, None for all of them
+    paramstyles = None
+
+    # True if `setup` needs to run on a cursor before the query, see Binder.execute
+    needs_cursor = False
+
+    # True if the strategy replaces the whole `expr [not] in (%(xxx)l)` predicate,
+    # see `render_predicate`
+    predicate = False
+
+    # True if format_chunks can split the list, its spec is then (name, length,...)
+    chunkable = False
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.name)
+
+    def spec(self, length):
+        """stands for a list of `length` values in CompiledTemplate variant keys"""
+        if self.sized:
+            return (self.name, length)
+        return (self.name,)
+
+    def get_length(self, spec):
+        """the `length` passed on to `render`, back from a `spec`"""
+        return spec[1] if len(spec) > 1 else None
+
+    def resize(self, spec, length):
+        """the spec of a `chunkable` list cut down to `length`"""
+        return (spec[0], length) + spec[2:]
+
+    def render(self, binder, key, length, di_element):
+        """return the tokens replacing %(key)l, see `tokenize`.  binds used for
+           the list's values are added to `di_element` as {bindname: (key, ix)}"""
+        raise NotImplementedError()
+
+    def _get_binds(self, binder, key, length, di_element):
+        """one bind per value:  %(xxx_000__)s, %(xxx_001__)s..."""
+        li = []
+        for ix in range(length):
+            ikeyname = binder.T_LIST_KEYNAME % (key, ix)
+            di_element[ikeyname] = (key, ix)
+            li.append((TOKEN_BIND, ikeyname))
+        return li
+
+    def _join(self, tokens, sep=", "):
+        """interleave `tokens` with a literal separator"""
+        li = []
+        for token in tokens:
+            if li:
+                li.append((TOKEN_LITERAL, sep))
+            li.append(token)
+        return li
+
+    def setup(self, cursor, binder, key, li):
+        """prepare the database for the query, only called if `needs_cursor`"""
+        pass
+
+
+class ListExpand(ListStrategy):
+    """the default, one bind per value:
+       in (%(xxx)l) => in (%(xxx_000__)s, %(xxx_001__)s...)
+    """
+
+    name = LIST_EXPAND
+
+    def spec(self, length):
+        # plain lengths, these are the most common
+        return length
+
+    def render(self, binder, key, length, di_element):
+        if not length:
+            # empty list or set
+            return [(TOKEN_LITERAL, "NULL")]
+        return self._join(self._get_binds(binder, key, length, di_element))
+
+
+class ListArray(ListStrategy):
+    """the whole list as a single array bind, for PostgreSQL drivers
+       that adapt Python lists to arrays:
+       in (%(xxx)l) => in (SELECT unnest(%(xxx__)s))
+    """
+
+    name = LIST_ARRAY
+    sized = False
+    paramstyles = ("pyformat", "dollar")
+
+    t_render = ("SELECT unnest(", ")")
+    T_ARRAY_KEYNAME = "%s__"
+
+    def render(self, binder, key, length, di_element):
+        ikeyname = self.T_ARRAY_KEYNAME % (key)
+        # slicing the whole list passes a copy of it as the value
+        di_element[ikeyname] = (key, slice(None))
+        before, after = self.t_render
+        return [(TOKEN_LITERAL, before), (TOKEN_BIND, ikeyname), (TOKEN_LITERAL, after)]
+
+
+class ListValues(ListStrategy):
+    """a VALUES table constructor, which the database can hash join:
+       in (%(xxx)l) => in (VALUES (%(xxx_000__)s), (%(xxx_001__)s)...)
+       works for sqlite3 and PostgreSQL.
+    """
+
+    name = LIST_VALUES
+
+    t_render = "VALUES "
+
+    def render(self, binder, key, length, di_element):
+        li = [(TOKEN_LITERAL, self.t_render)]
+        for ix, token in enumerate(self._get_binds(binder, key, length, di_element)):
+            li.extend(
+                [(TOKEN_LITERAL, ", (" if ix else "("), token, (TOKEN_LITERAL, ")")]
+            )
+        return li
+
+
+class ListTempTable(ListStrategy):
+    """loads the list into a session temporary table, with executemany:
+       in (%(xxx)l) => in (SELECT value FROM pynoorm_xxx__)
+       the statements are sqlite3/PostgreSQL syntax, subclass for other databases.
+    """
+
+    name = LIST_TEMPTABLE
+    sized = False
+    needs_cursor = True
+
+    t_table = "pynoorm_%s__"
+    t_create = "CREATE TEMP TABLE IF NOT EXISTS %s (value)"
+    t_delete = "DELETE FROM %s"
+    t_insert = "INSERT INTO %s (value) VALUES (%%(value)s)"
+    t_render = "SELECT value FROM %s"
+
+    def render(self, binder, key, length, di_element):
+        return [(TOKEN_LITERAL, self.t_render % (self.t_table % (key)))]
+
+    def setup(self, cursor, binder, key, li):
+        table = self.t_table % (key)
+        cursor.execute(self.t_create % (table))
+        cursor.execute(self.t_delete % (table))
+        qry, li_sub = binder.format_many(
+            self.t_insert % (table), (dict(value=value) for value in li)
+        )
+        cursor.executemany(qry, li_sub)
+
+
+class ListRanges(ListStrategy):
+    """integer lists with runs of consecutive values, see Binder(list_optimize=True)
+
+       rewrites the whole predicate, each run becoming a BETWEEN:
+       custid in (%(xxx)l) => (custid BETWEEN %(xxx_000__)s AND %(xxx_001__)s
+                               OR custid IN (%(xxx_002__)s, %(xxx_003__)s...))
+
+       the list's values are the bounds of each run, followed by the other values.
+    """
+
+    name = LIST_RANGES
+    predicate = True
+
+    def spec(self, length):
+        # length is (number of runs, number of other values)
+        return (self.name,) + tuple(length)
+
+    def get_length(self, spec):
+        return spec[1:]
+
+    def render(self, binder, key, length, di_element):
+        raise ValueError(
+            "%s only renders `expr in (%%(%s)l)` predicates" % (self, key)
+        )
+
+    def render_predicate(self, binder, key, length, expr, negated, di_element):
+        """return the tokens replacing `expr [not] in (%(key)l)`"""
+
+        ranges, singles = length
+        binds = self._get_binds(binder, key, 2 * ranges + singles, di_element)
+
+        li = []
+        for ix in range(ranges):
+            li.append(
+                [
+                    (TOKEN_LITERAL, "%s BETWEEN " % (expr)),
+                    binds[2 * ix],
+                    (TOKEN_LITERAL, " AND "),
+                    binds[2 * ix + 1],
+                ]
+            )
+        if singles:
+            li.append(
+                [(TOKEN_LITERAL, "%s IN (" % (expr))]
+                + self._join(binds[2 * ranges :])
+                + [(TOKEN_LITERAL, ")")]
+            )
+
+        tokens = [(TOKEN_LITERAL, "NOT (" if negated else "(")]
+        for ix, li_token in enumerate(li):
+            if ix:
+                tokens.append((TOKEN_LITERAL, " OR "))
+            tokens.extend(li_token)
+        tokens.append((TOKEN_LITERAL, ")"))
+        return tokens
+
+
+class ListRows(ListStrategy):
+    """lists of tuples, for compound keys:
+       (custid, ordernum) in (%(xxx)l) =>
+       (custid, ordernum) in ((%(xxx_000__)s, %(xxx_001__)s), (%(xxx_002__)s, %(xxx_003__)s)...)
+
+       the list's values are those of its tuples, one after the other.
+    """
+
+    name = LIST_ROWS
+    chunkable = True
+
+    def spec(self, length):
+        # length is (number of tuples, tuple length)
+        return (self.name,) + tuple(length)
+
+    def get_length(self, spec):
+        return spec[1:]
+
+    def render(self, binder, key, length, di_element):
+        rows, width = length
+        binds = self._get_binds(binder, key, rows * width, di_element)
+
+        li = []
+        for row in range(rows):
+            li.append((TOKEN_LITERAL, ", (" if row else "("))
+            li.extend(self._join(binds[row * width : (row + 1) * width]))
+            li.append((TOKEN_LITERAL, ")"))
+        return li
+
+
+class ListRowsOr(ListRows):
+    """lists of tuples, for databases without row values (SQL Server):
+       (custid, ordernum) in (%(xxx)l) =>
+       ((custid = %(xxx_000__)s AND ordernum = %(xxx_001__)s) OR (...))
+    """
+
+    name = LIST_ROWS_OR
+    predicate = True
+
+    def render(self, binder, key, length, di_element):
+        raise ValueError(
+            "%s only renders `(col1, col2...) in (%%(%s)l)` predicates" % (self, key)
+        )
+
+    def render_predicate(self, binder, key, length, expr, negated, di_element):
+        rows, width = length
+
+        expr = expr.strip()
+        if expr.startswith("("):
+            columns = [column.strip() for column in expr[1:-1].split(",")]
+        else:
+            columns = [expr]
+        if len(columns) != width:
+            raise ValueError(
+                "`%s` has %s columns, but the tuples in `%s` have %s values"
+                % (expr, len(columns), key, width)
+            )
+
+        binds = self._get_binds(binder, key, rows * width, di_element)
+
+        tokens = [(TOKEN_LITERAL, "NOT (" if negated else "(")]
+        for row in range(rows):
+            tokens.append((TOKEN_LITERAL, " OR (" if row else "("))
+            for ix, column in enumerate(columns):
+                tokens.append((TOKEN_LITERAL, "%s%s = " % (" AND " if ix else "", column)))
+                tokens.append(binds[row * width + ix])
+            tokens.append((TOKEN_LITERAL, ")"))
+        tokens.append((TOKEN_LITERAL, ")"))
+        return tokens
+
+
+class AdapterRegistry(object):
+    """converters for bind values, by type:
+
+        adapters = AdapterRegistry()
+        adapters.register(uuid.UUID, str)
+        adapters.register(enum.Enum, lambda value: value.value)
+
+        binder = Binder.factory("qmark", adapters=adapters)
+
+    a value's adapter is that of the first of its type's __mro__ that has one,
+    looked up once per concrete type.  lists without an adapter of their own,
+    such as LIST_ARRAY's arrays, get their values adapted.
+    """
+
+    def __init__(self):
+        # type => adapter
+        self._di = {}
+
+        # concrete type => adapter or None
+        self._di_type = {}
+
+    def __repr__(self):
+        return "%s %s" % (
+            self.__class__.__name__,
+            [type_.__name__ for type_ in self._di.keys()],
+        )
+
+    def register(self, type_, adapter):
+        """`adapter(value)` returns what to pass to the driver for values of `type_`"""
+        self._di[type_] = adapter
+        self._di_type = {}
+
+    def get(self, type_):
+        """the adapter for values of `type_`, None if they're passed as they are"""
+
+        try:
+            return self._di_type[type_]
+        except KeyError:
+            pass
+
+        adapter = None
+        for klass in getattr(type_, "__mro__", (type_,)):
+            if klass in self._di:
+                adapter = self._di[klass]
+                break
+        return self._di_type.setdefault(type_, adapter)
+
+    def adapt(self, value):
+        try:
+            adapter = self._di_type[type(value)]
+        except KeyError:
+            adapter = self.get(type(value))
+        if adapter is None:
+            if type(value) is list:
+                return self.adapt_column(value)
+            return value
+        return adapter(value)
+
+    def adapt_column(self, values):
+        """adapt a sequence of values, dispatching once if they're all the same type"""
+
+        types = set(map(type, values))
+        if len(types) == 1:
+            type_ = types.pop()
+            adapter = self.get(type_)
+            if adapter is None:
+                if type_ is list:
+                    return list(map(self.adapt_column, values))
+                return values
+            return list(map(adapter, values))
+
+        return list(map(self.adapt, values))
+
+
+# (value type, hint type) where converting the value to the hint loses nothing
+WIDENING = set([(int, float), (int, Decimal)])
+try:
+    WIDENING.update([(long, float), (long, Decimal), (int, long)])
+except NameError:
+    # Python 3
+    pass
+
+# integers beyond this lose digits as floats, TypeTracker.coerce leaves them be
+MAX_EXACT_FLOAT = 2 ** 53
+
+
+class TypeTracker(object):
+    """the Python types bound to each key of a template, see Binder(track_types=True)
+
+    a key's hint is the first type seen for it other than NoneType, widened
+    if need be (int, then Decimal:  Decimal), so that it stays stable.
+
+    `changes` counts, per key, the calls that bound other types than the
+    previous one, which is what makes some databases parse the query again.
+    """
+
+    def __init__(self, tqry, fingerprint=None):
+        self.tqry = tqry
+        self.fingerprint = fingerprint
+        self.calls = 0
+
+        # key => {type: count}
+        self.types = {}
+        # key => type
+        self.hints = {}
+        # key => frozenset of the types bound by the last call
+        self.last = {}
+        # key => number of calls whose types differed from the previous call's
+        self.changes = {}
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.tqry)
+
+    def observe(self, li_key_value):
+        """record a call's (key, value)s"""
+
+        self.calls += 1
+        di_call = {}
+        for key, value in li_key_value:
+            type_ = type(value)
+
+            counts = self.types.setdefault(key, {})
+            counts[type_] = counts.get(type_, 0) + 1
+
+            if value is not None:
+                hint = self.hints.get(key)
+                if hint is None or (hint, type_) in WIDENING:
+                    self.hints[key] = type_
+
+            di_call.setdefault(key, set()).add(type_)
+
+        for key, types in di_call.items():
+            types = frozenset(types)
+            last = self.last.get(key)
+            if last is not None and last != types:
+                self.changes[key] = self.changes.get(key, 0) + 1
+            self.last[key] = types
+
+    def coerce(self, key, value):
+        """`value` converted to the key's hint, when that's lossless"""
+        hint = self.hints.get(key)
+        if value is None or hint is None:
+            return value
+        if (type(value), hint) in WIDENING:
+            if hint is float and not -MAX_EXACT_FLOAT <= value <= MAX_EXACT_FLOAT:
+                return value
+            return hint(value)
+        return value
+
+    def stats(self):
+        return dict(
+            tqry=self.tqry,
+            fingerprint=self.fingerprint,
+            calls=self.calls,
+            changes=sum(self.changes.values()),
+            keys=dict(
+                [
+                    (
+                        key,
+                        dict(
+                            types=dict(counts),
+                            hint=self.hints.get(key),
+                            changes=self.changes.get(key, 0),
+                        ),
+                    )
+                    for key, counts in self.types.items()
+                ]
+            ),
+        )
+
+
+class Rendering(object):
+    """the query text and bind slots of a CompiledTemplate, for one set of list lengths
+
+    :param qry: query text, in the Binder's paramstyle
+    :param slots: ordered (bindname, key, ix) tuples, one per bind parameter.
+                  `ix` is None for scalar binds, the list position otherwise.
+    :param scalar_keys: distinct scalar keys, in order of first appearance
+    """
+
+    def __init__(self, qry, slots, scalar_keys):
+        self.qry = qry
+        self.slots = slots
+        self.scalar_keys = scalar_keys
+
+        # the slots' bind names and keys, for Binder._format_simple
+        self.names = tuple([name for name, key, ix in slots])
+        self.keys = tuple([key for name, key, ix in slots])
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.qry)
+
+
+class ParsedTemplate(object):
+    """a query template, parsed once whatever the paramstyle
+
+    holds the CompiledTemplate of each Binder type that used it in `compiled`,
+    so that binders sharing a TemplateCache only parse a template once.
+
+    `fingerprint` identifies the template in instrumentation, see fingerprint_sql.
+    with `normalize`, the tokens come from normalize_sql(tqry).
+    """
+
+    def __init__(self, tqry, tokens=None, normalize=False, fingerprint=None):
+        self.tqry = tqry
+        self.normalized = normalize
+        self.fingerprint = fingerprint or fingerprint_sql(tqry)
+        if tokens is None:
+            tokens = tokenize(normalize_sql(tqry) if normalize else tqry)
+        self.tokens = tokens
+        self.fragments = self._get_fragments(self.tokens)
+
+        # distinct list bind keys, in order of appearance
+        self.list_keys = []
+        for kind, key in self.tokens:
+            if kind == TOKEN_LIST and key not in self.list_keys:
+                self.list_keys.append(key)
+
+        # token index => (expr, negated, end of the literal before, start of the literal after)
+        # for the list binds used as `expr [not] in (%(xxx)l)`
+        self.predicates = {}
+        tokens = self.tokens
+        for ix in range(1, len(tokens) - 1):
+            if (
+                tokens[ix][0] != TOKEN_LIST
+                or tokens[ix - 1][0] != TOKEN_LITERAL
+                or tokens[ix + 1][0] != TOKEN_LITERAL
+            ):
+                continue
+            before = RE_IN_BEFORE.search(tokens[ix - 1][1])
+            after = RE_IN_AFTER.match(tokens[ix + 1][1])
+            if before and after:
+                group = "expr" if before.group("expr") else "row"
+                self.predicates[ix] = (
+                    before.group(group),
+                    bool(before.group("negated")),
+                    before.start(group),
+                    after.end(),
+                )
+
+        # list keys that only ever appear in such predicates
+        self.predicate_keys = set(self.list_keys) - set(
+            [
+                key
+                for ix, (kind, key) in enumerate(tokens)
+                if kind == TOKEN_LIST and ix not in self.predicates
+            ]
+        )
+
+        # Binder.render_key => CompiledTemplate
+        self.compiled = {}
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.tqry)
+
+    def _get_fragments(self, tokens):
+        """(index of the enclosing fragment or None, bind keys) for each %[ ... %]
+           fragment, in order of appearance.  a fragment's keys don't include
+           those of the fragments nested in it."""
+
+        fragments = []
+        stack = []
+        for kind, key in tokens:
+            if kind == TOKEN_OPEN:
+                fragments.append((stack[-1] if stack else None, []))
+                stack.append(len(fragments) - 1)
+            elif kind == TOKEN_CLOSE:
+                if not stack:
+                    raise ValueError("%%] without a matching %%[ in query template: %s" % (self.tqry))
+                stack.pop()
+            elif kind != TOKEN_LITERAL and stack:
+                keys = fragments[stack[-1]][1]
+                if key not in keys:
+                    keys.append(key)
+
+        if stack:
+            raise ValueError("%%[ without a matching %%] in query template: %s" % (self.tqry))
+
+        return [(parent, tuple(keys)) for parent, keys in fragments]
+
+
+def _move_to_end(di, key):
+    """move `key` to the most-recently-used end of an OrderedDict, if it's still there"""
+    try:
+        di.move_to_end(key)
+    except KeyError:
+        # evicted by another thread
+        pass
+
+
+if not hasattr(OrderedDict, "move_to_end"):  # pragma: no cover
+    # Python 2
+    def _move_to_end(di, key):
+        try:
+            di[key] = di.pop(key)
+        except KeyError:
+            pass
+
+
+class CompiledTemplate(object):
+    """a ParsedTemplate, rendered in a given Binder's paramstyle
+
+    list binds make the query text depend on the length of the bound lists,
+    so renderings are kept per length signature in `variants`.
+    """
+
+    # bound the renderings kept for a single template with list binds
+    MAX_VARIANTS = 64
+
+    # bound the list lengths recorded for list_bucket_stats, which then
+    # only counts the first ones seen
+    MAX_RAW_LENGTHS = 1024
+
+    def __init__(self, binder, parsed):
+        # the parse is shared, not copied
+        self.tqry = parsed.tqry
+        self.fingerprint = parsed.fingerprint
+        self.tokens = parsed.tokens
+        self.list_keys = parsed.list_keys
+        self.predicates = parsed.predicates
+        self.predicate_keys = parsed.predicate_keys
+        self.fragments = parsed.fragments
+
+        self.variants = {}
+
+        # list lengths before bucketing, to report bucketing savings
+        self.raw_lengths = set()
+
+        # fragments included, (True, False...) => CompiledTemplate, least recently used first
+        self.shapes = OrderedDict()
+
+        # see Binder(track_types=True)
+        self.type_tracker = None
+
+        # the only Rendering of templates without lists or fragments, see Binder.format
+        self.rendering = None
+        if not self.list_keys and not self.fragments:
+            self.rendering = self.variants[()] = self._render(binder, ())
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.tqry)
+
+    def shape(self, binder, mask):
+        """the CompiledTemplate of the template with only the fragments
+           that `mask` includes, one bool per `fragments`"""
+
+        shapes = self.shapes
+        try:
+            compiled = shapes[mask]
+        except KeyError:
+            pass
+        else:
+            _move_to_end(shapes, mask)
+            return compiled
+
+        tokens = []
+        ix = 0
+        stack = []
+        for kind, value in self.tokens:
+            if kind == TOKEN_OPEN:
+                # included only if the enclosing fragment is
+                stack.append(mask[ix] and (not stack or stack[-1]))
+                ix += 1
+            elif kind == TOKEN_CLOSE:
+                stack.pop()
+            elif not stack or stack[-1]:
+                if kind == TOKEN_LITERAL and tokens and tokens[-1][0] == TOKEN_LITERAL:
+                    tokens[-1] = (kind, tokens[-1][1] + value)
+                else:
+                    tokens.append((kind, value))
+
+        while len(shapes) >= self.MAX_VARIANTS:
+            try:
+                shapes.popitem(last=False)
+            except KeyError:
+                break
+        # each shape is a distinct query to the database
+        fingerprint = "%s.%s" % (
+            self.fingerprint,
+            "".join(["1" if included else "0" for included in mask]),
+        )
+        compiled = CompiledTemplate(binder, ParsedTemplate(self.tqry, tokens, fingerprint=fingerprint))
+        return shapes.setdefault(mask, compiled)
+
+    def variant(self, binder, lengths):
+        """the Rendering for a tuple of list lengths, one per `list_keys`.
+           lists rendered by a ListStrategy other than ListExpand appear as its `spec`
+        """
+        try:
+            return self.variants[lengths]
+        except KeyError:
+            if len(self.variants) >= self.MAX_VARIANTS:
+                self.variants.clear()
+            # setdefault so that threads racing on the same lengths share one rendering
+            return self.variants.setdefault(lengths, self._render(binder, lengths))
+
+    def _render(self, binder, lengths):
+        """emits the tokens in the Binder's paramstyle,
+           with %(xxx)l expanded to %(xxx_000__)s, %(xxx_001__)s
+           (or whatever the list's strategy renders)
+        """
+
+        di_spec = dict(zip(self.list_keys, lengths))
+        di_element = {}
+
+        def get_strategy(spec):
+            if isinstance(spec, tuple):
+                strategy = binder._di_list_strategy[spec[0]]
+                return strategy, strategy.get_length(spec)
+            return binder._di_list_strategy[LIST_EXPAND], spec
+
+        # the predicates whose list strategy rewrites them, and the empty row lists:
+        # `(a, b) in (NULL)` is an error, the predicate is false (true with `not in`)
+        di_predicate = {}
+        for ix, predicate in self.predicates.items():
+            spec = di_spec[self.tokens[ix][1]]
+            strategy, length = get_strategy(spec)
+            if strategy.predicate or (spec == 0 and predicate[0].startswith("(")):
+                di_predicate[ix] = predicate
+
+        li_token = []
+
+        def emit(tokens):
+            for kind, value in tokens:
+                if kind == TOKEN_LIST:
+                    strategy, length = get_strategy(di_spec[value])
+                    emit(strategy.render(binder, value, length, di_element))
+                else:
+                    li_token.append((kind, value))
+
+        for ix, (kind, value) in enumerate(self.tokens):
+            if ix in di_predicate:
+                expr, negated = di_predicate[ix][:2]
+                strategy, length = get_strategy(di_spec[value])
+                if not strategy.predicate:
+                    emit([(TOKEN_LITERAL, "(1 = 1)" if negated else "(1 = 0)")])
+                    continue
+                emit(
+                    strategy.render_predicate(
+                        binder, value, length, expr, negated, di_element
+                    )
+                )
+                continue
+
+            if kind == TOKEN_LITERAL:
+                # cut the `expr in (` and `)` around rewritten predicates
+                start = di_predicate[ix - 1][3] if ix - 1 in di_predicate else 0
+                end = di_predicate[ix + 1][2] if ix + 1 in di_predicate else len(value)
+                value = value[start:end]
+
+            emit([(kind, value)])
+
+        return self._rendering(binder, li_token, di_element)
+
+    def _rendering(self, binder, tokens, di_element):
+        """the Rendering of literal and scalar bind `tokens`.
+           `di_element` has the (key, ix) of the binds standing for list values
+        """
+
+        escape = binder._escape_literal
+        placeholder = binder._placeholder
+
+        li_text = []
+        li_name = []
+        di_position = {}
+
+        for kind, value in tokens:
+            if kind == TOKEN_LITERAL:
+                li_text.append(escape(value))
+            else:
+                li_name.append(value)
+                # 1-based, by first appearance
+                position = di_position.setdefault(value, len(di_position) + 1)
+                li_text.append(placeholder(value, position))
+
+        qry = "".join(li_text)
+
+        slots = []
+        scalar_keys = []
+        seen = set()
+        for name in li_name:
+            if name in seen:
+                if not binder.repeat_binds:
+                    continue
+            else:
+                seen.add(name)
+                if name not in di_element:
+                    scalar_keys.append(name)
+
+            key, ix = di_element.get(name, (name, None))
+            slots.append((name, key, ix))
+
+        return Rendering(qry, slots, scalar_keys)
+
+
+# cache key marker for normalized parses, see Binder.cache_key
+NORMALIZED = "normalized"
+
+
+# the row in a single row INSERT template
+RE_VALUES = re.compile(r"\bvalues\s*\(", re.IGNORECASE)
+
+
+class ParsedInsert(ParsedTemplate):
+    """a single row INSERT template, parsed once whatever the paramstyle,
+       see InsertTemplate"""
+
+    def __init__(self, tqry, normalize=False):
+        self.tqry = tqry
+        self.normalized = normalize
+        self.fingerprint = fingerprint_sql(tqry)
+        self.tokens = tokenize(normalize_sql(tqry) if normalize else tqry)
+
+        if [kind for kind, value in self.tokens if kind not in (TOKEN_LITERAL, TOKEN_BIND)]:
+            raise ValueError(
+                "list binds and optional fragments can't be used in an INSERT template: %s"
+                % (tqry)
+            )
+        self.fragments = []
+
+        self.prefix, self.row, self.suffix = self._split_row(self.tokens)
+
+        # distinct bind keys of the row, in order of appearance
+        self.row_keys = []
+        for kind, key in self.row:
+            if kind == TOKEN_BIND and key not in self.row_keys:
+                self.row_keys.append(key)
+
+        self.list_keys = []
+        self.predicates = {}
+        self.predicate_keys = set()
+        self.compiled = {}
+
+    def _split_row(self, tokens):
+        """prefix, row and suffix tokens, the row running from the `(`
+           after VALUES to its matching `)`"""
+
+        first = [ix for ix, (kind, value) in enumerate(tokens) if kind == TOKEN_BIND]
+        li_match = []
+        if first and first[0]:
+            li_match = list(RE_VALUES.finditer(tokens[first[0] - 1][1]))
+        if not li_match:
+            raise ValueError(
+                "expecting a single row `insert into ... values (%%(xxx)s...)`: %s" % (self.tqry)
+            )
+
+        ix_start = first[0] - 1
+        text = tokens[ix_start][1]
+        start = li_match[-1].end() - 1
+
+        prefix = tokens[:ix_start] + [(TOKEN_LITERAL, text[:start])]
+        row = []
+        depth = 0
+        tokens = [(TOKEN_LITERAL, text[start:])] + tokens[ix_start + 1 :]
+        for ix, (kind, value) in enumerate(tokens):
+            if kind != TOKEN_LITERAL:
+                row.append((kind, value))
+                continue
+
+            for pos, char in enumerate(value):
+                if char == "(":
+                    depth += 1
+                elif char == ")":
+                    depth -= 1
+                    if not depth:
+                        row.append((kind, value[: pos + 1]))
+                        suffix = [(kind, value[pos + 1 :])] + tokens[ix + 1 :]
+                        return prefix, row, suffix
+
+            row.append((kind, value))
+
+        raise ValueError("unbalanced parentheses in the VALUES row: %s" % (self.tqry))
+
+
+class InsertTemplate(CompiledTemplate):
+    """a single row INSERT template, rendered for several rows at once:
+       insert into t (a, b) values (%(a)s, %(b)s) =>
+       insert into t (a, b) values (%(a_000__)s, %(b_000__)s), (%(a_001__)s, %(b_001__)s)...
+
+       `variants` are keyed by (number of rows,).  binds outside of the
+       VALUES row are the same for all the rows, see Binder.format_insert.
+    """
+
+    def __init__(self, binder, parsed):
+        self.prefix = parsed.prefix
+        self.row = parsed.row
+        self.suffix = parsed.suffix
+        self.row_keys = parsed.row_keys
+
+        self.tqry = parsed.tqry
+        self.fingerprint = parsed.fingerprint
+        self.tokens = parsed.tokens
+        self.list_keys = parsed.list_keys
+        self.predicates = parsed.predicates
+        self.predicate_keys = parsed.predicate_keys
+        self.fragments = parsed.fragments
+        self.variants = {}
+        self.raw_lengths = set()
+        self.shapes = OrderedDict()
+        self.type_tracker = None
+
+    def _render(self, binder, lengths):
+        (rows,) = lengths
+        di_element = {}
+
+        li_token = list(self.prefix)
+        for row in range(rows):
+            if row:
+                li_token.append((TOKEN_LITERAL, ", "))
+            for kind, value in self.row:
+                if kind == TOKEN_BIND:
+                    name = binder.T_LIST_KEYNAME % (value, row)
+                    di_element[name] = (value, row)
+                    value = name
+                li_token.append((kind, value))
+        li_token.extend(self.suffix)
+
+        return self._rendering(binder, li_token, di_element)
+
+
+# stands for "not found" in accessors, None being a valid bind value
+_MISSING = object()
+
+
+def _get_item_then_attr(key):
+    """the generic lookup:  arg[key], then getattr(arg, key)"""
+
+    def get(arg):
+        try:
+            return arg[key]
+        except (KeyError, AttributeError, TypeError):
+            # no such key or no __getitem__, try getattr
+            return getattr(arg, key, _MISSING)
+
+    return get
+
+
+def _get_dict_item(key, has_attr):
+    """plain dictionaries:  no exception on a miss"""
+
+    def get(arg):
+        got = arg.get(key, _MISSING)
+        if got is _MISSING and has_attr:
+            return getattr(arg, key, _MISSING)
+        return got
+
+    return get
+
+
+def _get_instance_attr(key):
+    """instances whose class has no say in `key`, read straight from their __dict__"""
+
+    def get(arg):
+        try:
+            return arg.__dict__.get(key, _MISSING)
+        except AttributeError:
+            return getattr(arg, key, _MISSING)
+
+    return get
+
+
+def _get_attr(key):
+    """no __getitem__, only getattr makes sense"""
+
+    def get(arg):
+        return getattr(arg, key, _MISSING)
+
+    return get
+
+
+def plan_accessor(type_, key):
+    """picks the cheapest way to look up `key` on instances of `type_`
+       that gives the same result as `arg[key]`, then `getattr(arg, key)`.
+
+       returns a function(arg) returning the value or _MISSING.
+    """
+
+    if issubclass(type_, dict):
+        if (
+            type_.__getitem__ is dict.__getitem__
+            and type_.get is dict.get
+            and not hasattr(type_, "__missing__")
+        ):
+            return _get_dict_item(key, hasattr(type_, key) or type_ is not dict)
+        return _get_item_then_attr(key)
+
+    if hasattr(type_, "__getitem__"):
+        return _get_item_then_attr(key)
+
+    if (
+        type_.__getattribute__ is object.__getattribute__
+        and not hasattr(type_, "__getattr__")
+        and not hasattr(type_, key)
+        and getattr(type_, "__dictoffset__", 0)
+    ):
+        # no property, slot or class attribute by that name either
+        return _get_instance_attr(key)
+
+    return _get_attr(key)
+
+
+class BindContext(object):
+    """the per-call state of a Binder: the arguments being looked up
+
+    keeping it off the Binder means that one Binder instance
+    can be shared between threads.
+    """
+
+    def __init__(self, binder, args):
+        self.li_arg = args
+        self._types = tuple([type(arg) for arg in args])
+        self._di_plan = binder._di_plan
+        self._plan = binder._plan
+        self._plan_accessor = binder._plan_accessor
+        self.case_insensitive = binder.case_insensitive
+
+        # argument index => {folded key: value}, built on demand
+        self._di_folded = {}
+
+    def set_first(self, arg):
+        """swap the first argument, i.e. the row in Binder.format_many"""
+        self.li_arg[0] = arg
+        self._types = (type(arg),) + self._types[1:]
+        self._di_folded.pop(0, None)
+
+    def get(self, key_in):
+        """generic way to look for a key in the arg list
+
+        each argument is checked left-to-right, argument[<key>], then
+        getattr(argument, <key>).  the accessors are planned once per
+        argument types and key, see Binder._plan, so that a miss
+        doesn't cost an exception.
+        """
+
+        try:
+            plan = self._di_plan[(self._types, key_in)]
+        except KeyError:
+            plan = self._plan(self._types, key_in)
+
+        li_arg = self.li_arg
+        for ix, get in plan:
+            got = get(li_arg[ix])
+            if got is not _MISSING:
+                return got
+
+        if self.case_insensitive:
+            got = self._get_folded(key_in)
+            if got is not _MISSING:
+                return got
+
+        raise KeyError(key_in)
+
+    def _get_folded(self, key_in):
+        """case-insensitive lookup, once the exact key was found nowhere"""
+
+        folded = key_in.lower()
+        li_variant = [key for key in set([key_in.upper(), folded]) if key != key_in]
+
+        for ix, arg in enumerate(self.li_arg):
+            try:
+                index = self._di_folded[ix]
+            except KeyError:
+                index = self._di_folded[ix] = self._fold(arg)
+
+            got = index.get(folded, _MISSING)
+            if got is not _MISSING:
+                return got
+
+            if not isinstance(arg, Mapping):
+                # properties, class attributes and __getitem__ objects
+                # only get their all-upper/all-lower variants checked
+                for key in li_variant:
+                    got = self._plan_accessor(type(arg), key)(arg)
+                    if got is not _MISSING:
+                        return got
+
+        return _MISSING
+
+    def _fold(self, arg):
+        """{lowercased key: value} for a mapping's keys or an object's __dict__.
+           when keys only differ by case, the first one wins.
+        """
+
+        if isinstance(arg, Mapping):
+            items = arg.items()
+        else:
+            items = getattr(arg, "__dict__", {}).items()
+
+        index = {}
+        for key, value in items:
+            try:
+                index.setdefault(key.lower(), value)
+            except AttributeError:
+                # not a string
+                continue
+        return index
+
+
+class PinnedContext(BindContext):
+    """the BindContext of a BoundTemplate call:  the call's arguments,
+       then the BoundTemplate's pinned ones"""
+
+    def __init__(self, binder, args, bound):
+        BindContext.__init__(self, binder, args)
+        self._bound = bound
+
+    def get(self, key_in):
+        try:
+            plan = self._di_plan[(self._types, key_in)]
+        except KeyError:
+            plan = self._plan(self._types, key_in)
+
+        li_arg = self.li_arg
+        for ix, get in plan:
+            got = get(li_arg[ix])
+            if got is not _MISSING:
+                return got
+
+        bound = self._bound
+        try:
+            got = bound._di_pinned[key_in]
+        except KeyError:
+            got = bound._resolve(key_in)
+        if got is not _MISSING:
+            return got
+
+        if self.case_insensitive:
+            got = self._get_folded(key_in)
+            if got is _MISSING:
+                got = bound._resolve_folded(key_in)
+            if got is not _MISSING:
+                return got
+
+        raise KeyError(key_in)
+
+
+class BoundTemplate(object):
+    """a query template, its Binder and pinned trailing arguments, see Binder.bind
+
+    the values of the pinned arguments are resolved the first time a key is
+    needed and kept from then on, so changes made to the pinned arguments
+    afterwards aren't seen.  the compiled template is kept too, so calls
+    skip the template cache.
+
+    safe to share between threads.
+    """
+
+    def __init__(self, binder, tqry, pinned):
+        self.binder = binder
+        self.tqry = tqry
+        self.pinned = tuple(pinned)
+        self.compiled = binder.compile(tqry)
+
+        # exact lookups only, PinnedContext sequences the case-insensitive ones
+        self._ctx = BindContext(binder, list(pinned))
+        self._ctx.case_insensitive = False
+
+        # key => value or _MISSING
+        self._di_pinned = {}
+        self._di_pinned_folded = {}
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.tqry)
+
+    def _resolve(self, key):
+        try:
+            got = self._ctx.get(key)
+        except KeyError:
+            got = _MISSING
+        return self._di_pinned.setdefault(key, got)
+
+    def _resolve_folded(self, key):
+        try:
+            return self._di_pinned_folded[key]
+        except KeyError:
+            return self._di_pinned_folded.setdefault(key, self._ctx._get_folded(key))
+
+    def format(self, *args):
+        """same as binder.format(tqry, *(args + pinned))"""
+
+        binder = self.binder
+        qry, sub, li_setup = binder._format_compiled(
+            self.compiled, PinnedContext(binder, list(args), self)
+        )
+        if li_setup:
+            binder._raise_needs_cursor(li_setup)
+        return qry, sub
+
+    __call__ = format
+
+    def format_many(self, rows):
+        """same as binder.format_many(tqry, rows, *pinned)"""
+        return self.binder.format_many(self.tqry, rows, *self.pinned)
 
 
 class Binder(object):
     """query template and substitution management - generic
+
+    per-call state lives in a BindContext, so one Binder
+    can serve any number of threads.
     """
 
-    def __init__(self, *args, **kwds):
-        pass
+    # True when the parameters are a sequence rather than a dictionary
+    positional = False
+
+    # True when a bind used several times needs to be passed once per use
+    repeat_binds = False
+
+    # the most bind parameters a statement can have, None for no limit
+    max_params = None
+
+    # the most values a single list bind can have, None for no limit
+    max_list_size = None
+
+    # False for databases without `(col1, col2) in ((?, ?),...)`, see LIST_ROWS_OR
+    row_values = True
+
+    # record the types bound per template and key, see TypeTracker
+    track_types = False
+
+    # convert values to their key's type hint when that's lossless, needs track_types
+    coerce_types = False
+
+    # an AdapterRegistry converting bind values, None to pass them as found
+    adapters = None
+
+    # format_many adapts this many rows at a time
+    ADAPT_BATCH = 1000
+
+    # the most rows in a single INSERT ... VALUES, SQL Server's limit
+    max_insert_rows = 1000
+
+    # send the query text without comments and insignificant whitespace, see normalize_sql
+    normalize = False
+
+    def __init__(
+        self,
+        cache_size=DEFAULT_CACHE_SIZE,
+        list_buckets=None,
+        list_pad=PAD_LAST,
+        max_params=None,
+        max_list_size=None,
+        list_strategy=None,
+        list_strategy_threshold=DEFAULT_LIST_STRATEGY_THRESHOLD,
+        list_optimize=False,
+        list_min_range=DEFAULT_LIST_MIN_RANGE,
+        row_values=None,
+        cache=None,
+        track_types=False,
+        coerce_types=False,
+        adapters=None,
+        normalize=False,
+    ):
+        """
+        :param cache_size: how many compiled query templates to keep.  0 disables caching.
+        :param list_buckets: None, BUCKETS_POW2 or an ascending sequence of sizes.
+                             pads list binds to a bucket size so that a template
+                             only produces a handful of distinct query texts,
+                             which database statement caches can reuse.
+        :param list_pad: PAD_LAST repeats the list's last value, PAD_NULL pads with NULL.
+                         beware that NULLs make `not in (...)` always false.
+        :param max_params: overrides the paramstyle's default limit, see `format_chunks`
+        :param max_list_size: overrides the paramstyle's default limit, see `format_chunks`
+        :param list_strategy: None, a LIST_xxx name or a ListStrategy instance, used
+                              for lists with at least `list_strategy_threshold` values.
+        :param list_optimize: dedupe and sort list bind values.  integer lists used as
+                              `expr [not] in (%(xxx)l)` also get their runs of at least
+                              `list_min_range` consecutive values rendered as BETWEEN.
+        :param row_values: lists of tuples are rendered as `((?, ?), (?, ?)...)`,
+                           False renders `(col1, col2) in (%(xxx)l)` as ORed equalities.
+        :param cache: a TemplateCache to share with other binders, see `factories`.
+                      `cache_size` is ignored then.
+        :param track_types: record the types bound per template, see `type_stats`
+        :param coerce_types: convert values to the type hint of their key when that's
+                             lossless, int to Decimal for example.  implies track_types.
+        :param adapters: an AdapterRegistry converting bind values before they're passed on
+        :param normalize: strip comments and insignificant whitespace from the query text
+        """
+        self.cache = TemplateCache(cache_size) if cache is None else cache
+
+        # binders with the same render_key render a parsed template the same way
+        self.render_key = type(self)
+
+        if max_params is not None:
+            self.max_params = max_params
+        if max_list_size is not None:
+            self.max_list_size = max_list_size
+        if row_values is not None:
+            self.row_values = row_values
+
+        self.track_types = track_types or coerce_types
+        self.coerce_types = coerce_types
+        if adapters is not None:
+            self.adapters = adapters
+        self.normalize = normalize
+
+        if list_buckets is not None and list_buckets != BUCKETS_POW2:
+            list_buckets = sorted(list_buckets)
+            if not list_buckets or list_buckets[0] <= 0:
+                raise ValueError("list_buckets needs positive sizes: %s" % (list_buckets))
+        if list_pad not in (PAD_LAST, PAD_NULL):
+            raise ValueError("list_pad needs to be one of %s" % ((PAD_LAST, PAD_NULL),))
+
+        self.list_buckets = list_buckets
+        self.list_pad = list_pad
+        self.padded_values = 0
+
+        self.list_strategy = self._get_list_strategy(list_strategy)
+        self.list_strategy_threshold = list_strategy_threshold
+
+        self.list_optimize = list_optimize
+        self.list_min_range = list_min_range
+
+        # (type(arg), key) => accessor, see plan_accessor
+        self._di_accessor = {}
+
+        # (argument types, key) => ((argument index, accessor),...)
+        self._di_plan = {}
+
+    def _get_list_strategy(self, list_strategy, register=True):
+        """validate a list strategy, registering it if it's a new ListStrategy instance.
+
+           with `register` False, for a single call, only the binder's own strategies
+           are accepted:  registering changes how the binder renders every template.
+        """
+
+        if list_strategy is None:
+            return None
+
+        if isinstance(list_strategy, ListStrategy):
+            if self._di_list_strategy.get(list_strategy.name) is not list_strategy:
+                if not register:
+                    raise ValueError(
+                        "%s isn't one of the binder's list strategies, pass it to "
+                        "Binder.factory or use its name" % (list_strategy)
+                    )
+                # don't touch the class-level registry
+                self._di_list_strategy = dict(self._di_list_strategy)
+                self._di_list_strategy[list_strategy.name] = list_strategy
+                # and don't share renderings with other binders anymore
+                self.render_key = (type(self), object())
+        else:
+            try:
+                list_strategy = self._di_list_strategy[list_strategy]
+            except KeyError:
+                raise ValueError(
+                    "unknown list strategy %s, expecting one of %s"
+                    % (list_strategy, "/".join(self._di_list_strategy.keys()))
+                )
+
+        if (
+            list_strategy.paramstyles is not None
+            and self.paramstyle not in list_strategy.paramstyles
+        ):
+            raise ValueError(
+                "%s does not support paramstyle %s" % (list_strategy, self.paramstyle)
+            )
+
+        return list_strategy
+
+    def format(self, tqry, *args):
+        """
+        :param tqry: query with optional substitution variables
+                     Python style i.e.
+                     select * from orders where custid = %(custid)s
+        :param *args: zero or more arguments that will be checked
+                      left-to-right, argument[<key>], getattr(argument,<key>)
+
+        the template is only parsed the first time it is seen, after which
+        it comes out of `self.cache` and binding only has to resolve values.
+        """
+
+        compiled = self.compile(tqry)
+        rendering = compiled.rendering
+        if rendering is not None and not self.track_types and self.adapters is None:
+            return rendering.qry, self._format_simple(rendering, args)
+
+        qry, sub, li_setup = self._format_compiled(compiled, BindContext(self, list(args)))
+        if li_setup:
+            self._raise_needs_cursor(li_setup)
+        return qry, sub
+
+    __call__ = format
+
+    def _format_simple(self, rendering, args):
+        """the parameters of a template without lists or fragments, the most common call"""
+
+        values = None
+        if len(args) == 1 and type(args[0]) is dict:
+            # what the planned accessor does for a dict holding all the keys
+            arg = args[0]
+            try:
+                values = [arg[key] for key in rendering.keys]
+            except KeyError:
+                pass
+
+        if values is None:
+            get = BindContext(self, list(args)).get
+            values = [get(key) for key in rendering.keys]
+
+        if self.positional:
+            return tuple(values)
+        return dict(zip(rendering.names, values))
+
+    def execute(self, cursor, tqry, *args, **kwds):
+        """
+        formats `tqry`, see `format`, and executes it on `cursor`
+
+        this is needed for list strategies that prepare the database
+        before the query runs, such as LIST_TEMPTABLE.
+
+        :param list_strategy: overrides the Binder's for this call, a LIST_xxx name
+        :param list_strategy_threshold: overrides the Binder's for this call
+        :param input_sizes: True calls cursor.setinputsizes with the type hints
+                            first, see `format_input_sizes`
+        :return: the cursor, ready to fetch from
+        """
+
+        list_strategy = kwds.pop("list_strategy", None)
+        threshold = kwds.pop("list_strategy_threshold", None)
+        input_sizes = kwds.pop("input_sizes", False)
+        if kwds:
+            raise TypeError("unexpected keyword arguments %s" % (list(kwds.keys())))
+
+        compiled = self.compile(tqry)
+        rendering, sub, li_setup = self._format_rendering(
+            compiled,
+            BindContext(self, list(args)),
+            self._get_list_strategy(list_strategy, register=False),
+            threshold,
+            self.track_types or input_sizes,
+        )
+        for strategy, key, li in li_setup:
+            strategy.setup(cursor, self, key, li)
+
+        if input_sizes:
+            sizes = self._get_input_sizes(compiled, rendering)
+            if self.positional:
+                cursor.setinputsizes(*sizes)
+            else:
+                cursor.setinputsizes(**sizes)
+
+        cursor.execute(rendering.qry, sub)
+        return cursor
+
+    def bind(self, tqry, *pinned):
+        """
+        return a BoundTemplate for `tqry`, with `pinned` as its trailing arguments
+
+            bound = binder.bind(tqry, request_ctx, defaults)
+            qry, sub = bound(row)    # same as binder(tqry, row, request_ctx, defaults)
+
+        the pinned arguments are only looked up once per key, use this
+        when they stay the same over many calls.
+        """
+        return BoundTemplate(self, tqry, pinned)
+
+    def _format_compiled(self, compiled, ctx, list_strategy=None, threshold=None):
+        """returns the query, its parameters and the (strategy, key, list)
+           whose strategy needs to set up the database first
+        """
+
+        rendering, sub, li_setup = self._format_rendering(
+            compiled, ctx, list_strategy, threshold, self.track_types
+        )
+        return rendering.qry, sub, li_setup
+
+    def _format_rendering(self, compiled, ctx, list_strategy, threshold, track_types):
+        """returns the Rendering used, the parameters and the list setups"""
+
+        root = compiled
+        if compiled.fragments:
+            compiled = self._get_shape(compiled, ctx)
+
+        lengths, di_list = self._get_lists(compiled, ctx, True, list_strategy, threshold)
+        rendering = compiled.variant(self, lengths)
+
+        li_setup = []
+        for key, spec in zip(compiled.list_keys, lengths):
+            if isinstance(spec, tuple):
+                strategy = self._di_list_strategy[spec[0]]
+                if strategy.needs_cursor:
+                    li_setup.append((strategy, key, di_list[key]))
+
+        sub = self._get_sub(rendering, di_list, ctx)
+        if track_types:
+            sub = self._track_types(root, rendering, sub)
+        return rendering, sub, li_setup
+
+    def _track_types(self, compiled, rendering, sub):
+        """record the types bound, coercing the values if `coerce_types`"""
+
+        tracker = compiled.type_tracker
+        if tracker is None:
+            tracker = compiled.type_tracker = TypeTracker(compiled.tqry, compiled.fingerprint)
+
+        if self.positional:
+            li = [(key, value) for (name, key, ix), value in zip(rendering.slots, sub)]
+        else:
+            li = [(key, sub[name]) for name, key, ix in rendering.slots]
+        tracker.observe(li)
+
+        if not self.coerce_types:
+            return sub
+
+        coerce = tracker.coerce
+        if self.positional:
+            return tuple([coerce(key, value) for key, value in li])
+        return dict(
+            [(name, coerce(key, sub[name])) for name, key, ix in rendering.slots]
+        )
+
+    def format_input_sizes(self, tqry, *args):
+        """
+        like `format`, but also returns the type hint of each parameter, in the
+        same shape as the parameters:  cursor.setinputsizes(*sizes) for positional
+        paramstyles, cursor.setinputsizes(**sizes) for the others.
+
+        the hints are the types seen for each key over the calls so far,
+        see TypeTracker.  this records types even if `track_types` is off.
+
+        :return: query, parameters, sizes
+        """
+
+        compiled = self.compile(tqry)
+        rendering, sub, li_setup = self._format_rendering(
+            compiled, BindContext(self, list(args)), None, None, True
+        )
+        if li_setup:
+            self._raise_needs_cursor(li_setup)
+
+        return rendering.qry, sub, self._get_input_sizes(compiled, rendering)
+
+    def _get_input_sizes(self, compiled, rendering):
+        hints = compiled.type_tracker.hints
+        if self.positional:
+            return tuple([hints.get(key) for name, key, ix in rendering.slots])
+        return dict([(name, hints.get(key)) for name, key, ix in rendering.slots])
+
+    def type_stats(self):
+        """TypeTracker stats for the cached templates, those with the most type changes first"""
+
+        li = []
+        for parsed in self.cache.values():
+            compiled = parsed.compiled.get(self.render_key)
+            if compiled is not None and compiled.type_tracker is not None:
+                li.append(compiled.type_tracker.stats())
+
+        li.sort(key=lambda stats: -stats["changes"])
+        return li
+
+    def _raise_needs_cursor(self, li_setup):
+        raise ValueError(
+            "list strategies %s need a cursor, use Binder.execute"
+            % ([strategy.name for strategy, key, li in li_setup])
+        )
+
+    def _check_no_setup(self, lengths):
+        """list strategies that need a cursor can only be used through `execute`"""
+        li_setup = [
+            (self._di_list_strategy[spec[0]], None, None)
+            for spec in lengths
+            if isinstance(spec, tuple) and self._di_list_strategy[spec[0]].needs_cursor
+        ]
+        if li_setup:
+            self._raise_needs_cursor(li_setup)
+
+    def format_many(self, tqry, rows, *defaults):
+        """
+        binds a batch of rows for `cursor.executemany`, parsing the template only once
+
+        :param tqry: query template, see `format`
+        :param rows: iterable of arguments, one per execution.  each row is
+                     checked before `defaults`
+        :param *defaults: arguments shared by all rows
+        :return: query, generator of parameters in the paramstyle's shape
+
+        list binds are supported but need to have the same length on every row,
+        since there is only one query.  likewise for the optional fragments included.
+        """
+
+        compiled = self.compile(tqry)
+        defaults = list(defaults)
+        rows = iter(rows)
+
+        lengths = ()
+        shaped = compiled
+        if compiled.list_keys or compiled.fragments:
+            # the query text depends on list lengths, so peek at the first row
+            try:
+                first = next(rows)
+            except StopIteration:
+                # nothing will get executed anyway
+                first = None
+                ctx = BindContext(self, list(defaults))
+            else:
+                ctx = BindContext(self, [first] + defaults)
+                rows = chain([first], rows)
+
+            if compiled.fragments:
+                shaped = self._get_shape(compiled, ctx)
+
+            if first is None:
+                lengths = (0,) * len(shaped.list_keys)
+            else:
+                lengths, di_list = self._get_lists(shaped, ctx)
+
+        self._check_no_setup(lengths)
+        rendering = shaped.variant(self, lengths)
+        return (
+            rendering.qry,
+            self._iter_sub(compiled, shaped, rendering, lengths, rows, defaults),
+        )
+
+    def _iter_sub(self, compiled, shaped, rendering, lengths, rows, defaults):
+        """lazily bind each row in turn"""
+
+        li_sub = self._iter_raw_sub(compiled, shaped, rendering, lengths, rows, defaults)
+
+        if self.adapters is not None:
+            li_sub = self._iter_adapted(li_sub)
+
+        if self.track_types:
+            li_sub = (self._track_types(compiled, rendering, sub) for sub in li_sub)
+
+        return li_sub
+
+    def _iter_adapted(self, li_sub):
+        """adapt the parameters ADAPT_BATCH rows at a time, see AdapterRegistry.adapt_column"""
+
+        batch = []
+        for sub in li_sub:
+            batch.append(sub)
+            if len(batch) >= self.ADAPT_BATCH:
+                for sub in self._adapt_batch(batch):
+                    yield sub
+                batch = []
+
+        if batch:
+            for sub in self._adapt_batch(batch):
+                yield sub
+
+    def _adapt_batch(self, li_sub):
+        """adapt a batch of parameters from the same rendering, column by column"""
+
+        if not li_sub[0]:
+            return li_sub
+
+        adapt_column = self.adapters.adapt_column
+        if self.positional:
+            return list(zip(*[adapt_column(column) for column in zip(*li_sub)]))
+
+        names = list(li_sub[0].keys())
+        columns = [adapt_column([sub[name] for sub in li_sub]) for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def _iter_raw_sub(self, compiled, shaped, rendering, lengths, rows, defaults):
+        """the parameters of each row, before adapters"""
+
+        # one context for the whole batch, only its first argument changes
+        ctx = BindContext(self, [None] + defaults)
+        get_lists = self._get_lists
+        get_sub = self._get_sub
+
+        for row in rows:
+            ctx.set_first(row)
 
-    def format(self, tqry, *args):
+            if compiled.fragments and self._get_shape(compiled, ctx) is not shaped:
+                raise ValueError(
+                    "format_many needs the same optional fragments on each row: %s" % (row)
+                )
+
+            lengths_row, di_list = get_lists(shaped, ctx)
+            if lengths_row != lengths:
+                raise ValueError(
+                    "format_many list binds need the same lengths on each row: %s, got %s"
+                    % (lengths, lengths_row)
+                )
+
+            yield get_sub(rendering, di_list, ctx, adapt=False)
+
+    def format_chunks(self, tqry, *args):
         """
-        :param tqry: query with optional substitution variables
-                     Python style i.e.
-                     select * from orders where custid = %(custid)s
-        :param *args: zero or more arguments that will be checked
-                      left-to-right, argument[<key>], getattr(argument,<key>)
+        like `format`, but splits a list bind that is over the database's limits
+
+        :return: lazy iterator of (query, parameters), one per chunk
+
+        the longest list bind is split so that each statement stays within
+        `max_params` and `max_list_size`.  only one list can be split, the others
+        need to fit as they are.
+
+        this is meant for `where xxx in (%(xxx)l)` predicates, where the rows of
+        each chunk can simply be concatenated (see `execute_chunks`).  a `not in`
+        would not give the same results once split.
+        """
+
+        compiled = self.compile(tqry)
+        ctx = BindContext(self, list(args))
+        if compiled.fragments:
+            compiled = self._get_shape(compiled, ctx)
+
+        lengths, di_list = self._get_lists(compiled, ctx, pad=False)
+        self._check_no_setup(lengths)
+
+        key = self._get_chunk_key(compiled, lengths)
+        if key is None:
+            if self.list_buckets is not None and lengths:
+                lengths = self._pad_lists(compiled, lengths, di_list)
+            rendering = compiled.variant(self, lengths)
+            return iter([(rendering.qry, self._get_sub(rendering, di_list, ctx))])
+
+        return self._iter_chunks(compiled, ctx, key, lengths, di_list)
+
+    def _get_shape(self, compiled, ctx):
+        """the CompiledTemplate with the optional fragments whose binds are all set"""
+
+        mask = []
+        for parent, keys in compiled.fragments:
+            included = parent is None or mask[parent]
+            if included:
+                for key in keys:
+                    if self._is_unset(ctx, key):
+                        included = False
+                        break
+            mask.append(included)
+
+        return compiled.shape(self, tuple(mask))
+
+    def _is_unset(self, ctx, key):
+        """True if `key` is missing, None or empty, which excludes its fragment"""
+
+        try:
+            value = ctx.get(key)
+        except KeyError:
+            return True
+
+        if value is None:
+            return True
+        try:
+            return not len(value)
+        except TypeError:
+            # not a sized value, such as a number
+            return False
+
+    def _get_chunk_key(self, compiled, lengths):
+        """which list bind to split, None if the statement fits as is"""
+
+        if not lengths:
+            return None
+
+        max_list_size = self.max_list_size
+        max_params = self.max_params
+
+        # lists rendered by most other strategies don't have a bind per value
+        li_expanded = [
+            (self._chunk_length(spec), key)
+            for key, spec in zip(compiled.list_keys, lengths)
+            if self._chunk_length(spec) is not None
+        ]
+        if not li_expanded:
+            return None
+
+        over = [
+            key
+            for length, key in li_expanded
+            if max_list_size is not None and length > max_list_size
+        ]
+        if len(over) > 1:
+            raise ValueError(
+                "only one list bind can be split into chunks, %s are over %s values"
+                % (over, max_list_size)
+            )
+
+        if over:
+            return over[0]
+
+        if max_params is None:
+            return None
+
+        if self.list_buckets is not None:
+            padded = tuple([self._bucket(length) for length in lengths])
+        else:
+            padded = lengths
+        if self._count_params(compiled, padded) <= max_params:
+            return None
+
+        # split the longest list
+        return max(li_expanded)[1]
+
+    def _chunk_length(self, spec):
+        """how many values format_chunks can split a list into, None if it can't"""
+        if not isinstance(spec, tuple):
+            return spec
+        if self._di_list_strategy[spec[0]].chunkable:
+            return spec[1]
+        return None
+
+    def _chunk_resize(self, spec, length):
+        """`spec` for `length` values"""
+        if not isinstance(spec, tuple):
+            return length
+        return self._di_list_strategy[spec[0]].resize(spec, length)
+
+    def _count_params(self, compiled, lengths):
+        return len(compiled.variant(self, lengths).slots)
+
+    def _get_chunk_size(self, compiled, key, lengths):
+        """how many values of the `key` list fit in a statement, with the other lists at `lengths`"""
+
+        ix = compiled.list_keys.index(key)
+
+        def count(length):
+            li = list(lengths)
+            li[ix] = self._chunk_resize(lengths[ix], length)
+            return self._count_params(compiled, tuple(li))
+
+        # a list can appear more than once in a template
+        per_value = count(2) - count(1)
+        fixed = count(1) - per_value
+
+        size = self.max_list_size
+        if self.max_params is not None:
+            size_params = (self.max_params - fixed) // per_value
+            size = size_params if size is None else min(size, size_params)
+
+        if size is None or size < 1:
+            raise ValueError(
+                "can't split `%s` to fit within %s parameters" % (key, self.max_params)
+            )
+
+        if self.list_buckets is not None:
+            # padding must not take a chunk over the limits
+            bucket = size
+            while bucket > 1 and self._bucket(bucket) > size:
+                bucket -= 1
+            if self._bucket(bucket) <= size:
+                size = bucket
+
+        return size
+
+    def _iter_chunks(self, compiled, ctx, key, lengths, di_list):
+        """bind each chunk of the `key` list in turn"""
+
+        ix = compiled.list_keys.index(key)
+        li_chunked = di_list[key]
+        spec = lengths[ix]
+
+        # values per list element, for lists of tuples
+        width = len(li_chunked) // (self._chunk_length(spec) or 1) or 1
+
+        if self.list_buckets is not None:
+            # the other lists are padded in place, once and for all
+            others = list(lengths)
+            others[ix] = self._chunk_resize(spec, 0)
+            di_others = dict([(k, v) for k, v in di_list.items() if k != key])
+            others = list(self._pad_lists(compiled, tuple(others), di_others))
+        else:
+            others = list(lengths)
+
+        size = self._get_chunk_size(compiled, key, tuple(others)) * width
+
+        values = None
+        for start in range(0, len(li_chunked), size):
+            di_chunk = dict(di_list)
+            di_chunk[key] = li_chunked[start : start + size]
+
+            others[ix] = self._chunk_resize(spec, len(di_chunk[key]) // width)
+            lengths_chunk = tuple(others)
+            if self.list_buckets is not None:
+                lengths_chunk = self._pad_lists(compiled, lengths_chunk, di_chunk)
+
+            rendering = compiled.variant(self, lengths_chunk)
+            if values is None:
+                values = self._get_values(rendering, ctx)
+
+            yield rendering.qry, self._get_sub(rendering, di_chunk, ctx, values)
+
+    def format_insert(self, tqry, rows, *defaults, **kwds):
+        """
+        binds a stream of rows into multi-row INSERT statements, for drivers
+        whose `executemany` makes one round trip per row
+
+        :param tqry: a single row INSERT template,
+                     insert into orders (custid, ordernum) values (%(custid)s, %(ordernum)s)
+        :param rows: iterable of arguments, one per row.  each row is checked before `defaults`
+        :param *defaults: arguments shared by all rows.  binds outside of the
+                          VALUES row are only looked up in them
+        :param rows_per_statement: caps the number of rows per statement
+        :return: lazy iterator of (query, parameters), one per statement
+
+        each statement gets as many rows as `max_params` and `max_insert_rows` allow.
+        """
+
+        rows_per_statement = kwds.pop("rows_per_statement", None)
+        if kwds:
+            raise TypeError("unexpected keyword arguments %s" % (list(kwds.keys())))
+
+        compiled = self._get_compiled(
+            (InsertTemplate, tqry, self.normalize), self._parse_insert, InsertTemplate
+        )
+
+        size = self._get_insert_size(compiled)
+        if rows_per_statement is not None:
+            size = min(size, rows_per_statement)
+
+        return self._iter_insert(compiled, size, iter(rows), list(defaults))
+
+    def _parse_insert(self, key):
+        return ParsedInsert(key[1], normalize=key[2])
+
+    def _get_insert_size(self, compiled):
+        """how many rows fit in a statement"""
+
+        if self.max_params is None:
+            return self.max_insert_rows
+
+        count_1 = self._count_params(compiled, (1,))
+        per_row = self._count_params(compiled, (2,)) - count_1
+        if not per_row:
+            return self.max_insert_rows
+
+        size = min((self.max_params - (count_1 - per_row)) // per_row, self.max_insert_rows)
+        if size < 1:
+            raise ValueError("a single row doesn't fit within %s parameters" % (self.max_params))
+        return size
+
+    def _iter_insert(self, compiled, size, rows, defaults):
+        """bind `size` rows at a time"""
+
+        ctx = BindContext(self, [None] + defaults)
+        get = ctx.get
+        row_keys = compiled.row_keys
+
+        values = None
+        while True:
+            di_list = dict([(key, []) for key in row_keys])
+            li_append = [(key, di_list[key].append) for key in row_keys]
+
+            count = 0
+            for row in rows:
+                ctx.set_first(row)
+                for key, append in li_append:
+                    append(get(key))
+                count += 1
+                if count == size:
+                    break
+
+            if not count:
+                return
+
+            rendering = compiled.variant(self, (count,))
+            if values is None:
+                values = self._get_values(rendering, BindContext(self, defaults))
+
+            yield rendering.qry, self._get_sub(rendering, di_list, ctx, values)
+
+            if count < size:
+                return
+
+    def compile(self, tqry):
+        """return the CompiledTemplate for `tqry`, from cache if possible"""
+        return self._get_compiled(self.cache_key(tqry), self._parse, CompiledTemplate)
+
+    def cache_key(self, tqry):
+        """what `tqry`'s ParsedTemplate is cached under.  normalized and
+           verbatim parses of a template are cached separately."""
+        if self.normalize:
+            return (NORMALIZED, tqry)
+        return tqry
+
+    def _parse(self, key):
+        if isinstance(key, tuple):
+            return ParsedTemplate(key[1], normalize=True)
+        return ParsedTemplate(key)
+
+    def fingerprint(self, tqry):
+        """the stable id of `tqry`, see fingerprint_sql"""
+        return self.compile(tqry).fingerprint
+
+    def _get_compiled(self, key, parse, compiled_class):
+        """the `key` template parsed by `parse`, then rendered by a `compiled_class`
+           for this Binder's paramstyle.  both are cached."""
+
+        parsed = self.cache.get(key, parse)
+        try:
+            return parsed.compiled[self.render_key]
+        except KeyError:
+            return parsed.compiled.setdefault(self.render_key, compiled_class(self, parsed))
+
+    def _placeholder(self, name, position):
+        """the paramstyle's placeholder for bind variable `name`,
+           `position` is its 1-based rank by first appearance"""
+        raise NotImplementedError()
+
+    def _escape_literal(self, text):
+        """literal SQL text, as it needs to appear in the paramstyle's query"""
+        return text
+
+    def _get_lists(self, compiled, ctx, pad=True, list_strategy=None, threshold=None):
+        """look up list binds, returns their lengths and the lists by key.
+           lists handled by a list strategy have its `spec` instead of their length
+        """
+
+        di_list = {}
+        lengths = []
+        for key in compiled.list_keys:
+            got = ctx.get(key)
+
+            if not isinstance(got, (list, set)):
+                raise ValueError(
+                    "list substitutions require an iterable parameter: `%s` was of type `%s`"
+                    % (key, type(got))
+                )
+            li = list(got)
+            if self.list_optimize:
+                li = self._optimize_list(li)
+            if li and isinstance(li[0], tuple):
+                lengths.append(self._get_rows(key, li, di_list))
+            else:
+                di_list[key] = li
+                lengths.append(len(li))
+
+        if self.list_optimize and compiled.predicate_keys:
+            lengths = self._get_ranges(compiled, lengths, di_list)
+
+        list_strategy = list_strategy or self.list_strategy
+        if list_strategy is not None and lengths:
+            if threshold is None:
+                threshold = self.list_strategy_threshold
+            lengths = [
+                list_strategy.spec(length)
+                if not isinstance(length, tuple) and length and length >= threshold
+                else length
+                for length in lengths
+            ]
+
+        lengths = tuple(lengths)
+        if pad and self.list_buckets is not None and lengths:
+            lengths = self._pad_lists(compiled, lengths, di_list)
+
+        return lengths, di_list
+
+    def _optimize_list(self, li):
+        """dedupe and sort a list's values.  values that can't be compared
+           are only deduped, keeping their first appearance"""
+
+        try:
+            return sorted(set(li))
+        except TypeError:
+            pass
+
+        try:
+            return list(OrderedDict.fromkeys(li))
+        except TypeError:
+            # unhashable values, leave them be
+            return li
+
+    def _get_rows(self, key, li, di_list):
+        """a list of tuples, flattened into `di_list`. returns its spec"""
+
+        width = len(li[0])
+        for row in li:
+            if not isinstance(row, tuple) or len(row) != width or not width:
+                raise ValueError(
+                    "`%s` needs to be a list of tuples of the same length: got %r and %r"
+                    % (key, li[0], row)
+                )
+
+        di_list[key] = [value for row in li for value in row]
+        strategy = self._di_list_strategy[LIST_ROWS if self.row_values else LIST_ROWS_OR]
+        return strategy.spec((len(li), width))
+
+    def _get_ranges(self, compiled, lengths, di_list):
+        """switch the sorted integer lists that have runs of consecutive values
+           to LIST_RANGES, returns the new lengths"""
+
+        strategy = self._di_list_strategy[LIST_RANGES]
+        min_range = max(self.list_min_range, 2)
+
+        lengths = list(lengths)
+        for ix, key in enumerate(compiled.list_keys):
+            li = di_list[key]
+            if key not in compiled.predicate_keys or not li or isinstance(lengths[ix], tuple):
+                continue
+
+            if not all(
+                [isinstance(value, Integral) and not isinstance(value, bool) for value in li]
+            ):
+                continue
+
+            li_range = []
+            li_single = []
+            start = 0
+            for pos in range(1, len(li) + 1):
+                if pos < len(li) and li[pos] == li[pos - 1] + 1:
+                    continue
+                if pos - start >= min_range:
+                    li_range.extend([li[start], li[pos - 1]])
+                else:
+                    li_single.extend(li[start:pos])
+                start = pos
+
+            if not li_range:
+                continue
+
+            if self.max_list_size is not None and len(li_single) > self.max_list_size:
+                # leave it to format_chunks to split
+                continue
+
+            length = lengths[ix]
+            lengths[ix] = strategy.spec((len(li_range) // 2, len(li_single)))
+            if (
+                self.max_params is not None
+                and self._count_params(compiled, tuple(lengths)) > self.max_params
+            ):
+                # ranges can't be split, leave the plain list to format_chunks
+                lengths[ix] = length
+                continue
+
+            di_list[key] = li_range + li_single
+
+        return tuple(lengths)
+
+    def _bucket(self, length):
+        """the bucket size for a list of `length` values"""
+
+        if isinstance(length, tuple):
+            # rendered by a list strategy
+            return length
+
+        if not length:
+            # still rendered as NULL
+            return 0
+
+        if self.list_buckets == BUCKETS_POW2:
+            size = 1
+            while size < length:
+                size *= 2
+            return size
+
+        for size in self.list_buckets:
+            if size >= length:
+                return size
+
+        # past the top of the ladder, use multiples of its largest size
+        top = self.list_buckets[-1]
+        return -(-length // top) * top
+
+    def _pad_lists(self, compiled, lengths, di_list):
+        """pad each list in `di_list` to its bucket size, returns the padded lengths"""
+
+        raw_lengths = compiled.raw_lengths
+        if len(raw_lengths) < compiled.MAX_RAW_LENGTHS:
+            raw_lengths.add(lengths)
+
+        padded = tuple([self._bucket(length) for length in lengths])
+        if padded == lengths:
+            return lengths
+
+        for key, length, size in zip(compiled.list_keys, lengths, padded):
+            if size > length:
+                li = di_list[key]
+                pad = li[-1] if self.list_pad == PAD_LAST else None
+                li.extend([pad] * (size - length))
+                self.padded_values += size - length
+
+        return padded
+
+    def list_bucket_stats(self):
+        """how many query texts list bucketing saved, over the cached templates
+
+        `raw` is the number of distinct query texts the list lengths seen would
+        have produced, `texts` how many were produced after bucketing.
+        every text saved is a hard parse saved on the server and a slot saved
+        in the driver's statement cache.
+
+        only the first CompiledTemplate.MAX_RAW_LENGTHS distinct lengths of
+        each template are counted.
         """
 
+        raw = texts = 0
+        for parsed in self.cache.values():
+            compiled = parsed.compiled.get(self.render_key)
+            if compiled is None:
+                continue
+            # templates with fragments record their lengths per shape
+            for compiled in [compiled] + list(compiled.shapes.values()):
+                li_lengths = list(compiled.raw_lengths)
+                raw += len(li_lengths)
+                texts += len(
+                    set(
+                        [tuple([self._bucket(length) for length in lengths]) for lengths in li_lengths]
+                    )
+                )
+
+        return dict(raw=raw, texts=texts, saved=raw - texts, padded_values=self.padded_values)
+
+    def _get_values(self, rendering, ctx):
+        """look up scalar binds"""
+        get = ctx.get
+        return dict([(key, get(key)) for key in rendering.scalar_keys])
+
+    def _get_sub(self, rendering, di_list, ctx, values=None, adapt=True):
+        """build the parameters to pass to cursor.execute,
+           looking up scalar binds unless `values` already has them"""
+
+        if values is None:
+            values = self._get_values(rendering, ctx)
+
+        li = [
+            (name, values[key] if ix is None else di_list[key][ix])
+            for name, key, ix in rendering.slots
+        ]
+
+        if adapt and self.adapters is not None:
+            adapt = self.adapters.adapt
+            li = [(name, adapt(value)) for name, value in li]
+        if self.positional:
+            return tuple([value for name, value in li])
+        return dict(li)
+
     def __repr__(self):
         msg = "%s paramstyle=%s" % (self.__class__.__name__, self.paramstyle)
 
@@ -79,65 +2546,67 @@ class Binder(object):
 
         return msg
 
-    def _case_sensitive(self, key):
-        return [key]
+    # see `factory`
+    case_insensitive = False
 
-    def _case_insensitive(self, key):
-        if key == key.upper():
-            return [key, key.lower()]
-        if key == key.lower():
-            return [key, key.upper()]
-        return [key]
+    # set to False if the classes of bind arguments are patched at runtime,
+    # accessors then always go through arg[key], then getattr(arg, key)
+    plan_accessors = True
 
-    _key_expand = _case_sensitive
+    # bound the number of planned accessors and lookups
+    MAX_ACCESSORS = 4096
 
-    def _get_from_args(self, key_in):
-        """generic way to look for a key in the arg list"""
+    def _plan_accessor(self, type_, key):
+        """plan and cache the accessor for `key` on instances of `type_`"""
 
-        li_key = self._key_expand(key_in)
+        di = self._di_accessor
+        try:
+            return di[(type_, key)]
+        except KeyError:
+            pass
 
-        for key in li_key:
-            for arg in self.li_arg:
-                try:
-                    got = arg[key]
-                    return got
-                except (KeyError):
-                    try:
-                        # try getattr
-                        got = getattr(arg, key)
-                        return got
-                    except AttributeError:
-                        continue
+        if self.plan_accessors:
+            get = plan_accessor(type_, key)
+        else:
+            get = _get_item_then_attr(key)
 
-                except (AttributeError, TypeError):
-                    # no __getitem__, try getattr
-                    try:
-                        got = getattr(arg, key)
-                        return got
-                    except AttributeError:
-                        continue
+        if len(di) >= self.MAX_ACCESSORS:
+            di.clear()
+        return di.setdefault((type_, key), get)
 
-        try:
-            raise KeyError(key_in)
-        except Exception as e:
-            raise
+    def _plan(self, types, key_in):
+        """the ordered (argument index, accessor) to try for `key_in`,
+           given the argument types.
+        """
+
+        plan = tuple(
+            [(ix, self._plan_accessor(type_, key_in)) for ix, type_ in enumerate(types)]
+        )
+
+        di = self._di_plan
+        if len(di) >= self.MAX_ACCESSORS:
+            di.clear()
+        return di.setdefault((types, key_in), plan)
 
     @classmethod
-    def factory(cls, paramstyle, case_insensitive=False):
+    def factory(cls, paramstyle, case_insensitive=False, **kwds):
         """
         return a Binder subclass instance appropriate
         to the underlying db library paramstyle bind variable
 
         :param paramstyle: parameter style string as per PEP-249
-        :case_insensitive: %(custid)s will match {"custid":1} or {"CUSTID":2}, with priority
-        going to the initial case.  mixed-case keys (custId) will only match {"custId":3}
+        :case_insensitive: %(custid)s will match {"custid":1}, {"CUSTID":2} or {"CustId":3},
+        with priority going to the initial case.  the exact key is looked up across all
+        the arguments first, then a case-folded index of each argument's keys
+        (or instance attributes), built once per format call.
+        :param **kwds: passed on to the Binder, see `Binder.__init__`
 
         """
 
         try:
-            inst = cls._di_paramstyle[paramstyle]()
+            inst = cls._di_paramstyle[paramstyle](**kwds)
             if case_insensitive:
-                inst._key_expand = inst._case_insensitive
+                inst.case_insensitive = True
 
             return inst
         except KeyError:
@@ -154,59 +2623,29 @@ class Binder(object):
             msg = "%s is not implemented yet" % (paramstyle)
             raise NotImplementedError(msg)
 
-    _di_paramstyle = {}
-
-    # the regular expression pattern that looks for list type binds
-    re_pattern_listsubstition = re.compile("%\([a-zA-Z0-9_]+\)l")
-
-    # leading '__' variable name makes name clashes more unlikely
-    T_LIST_KEYNAME = "%s_%03d__"
-
-    # def _pre_process(self):
-    #     """do nothing for now - intended to support list substitutions"""
-    #     pass
-
-    def _pre_process(self):
-        li_listsubstition = self.re_pattern_listsubstition.findall(self.tqry)
-        if li_listsubstition:
-            self.preprocess_listsubstitution(li_listsubstition)
-
-    def preprocess_listsubstitution(self, li_hit):
-        """ this will transform %(xxx)l into %(__xxx_000)s, %(__xxx_001)s """
-
-        di_list_sub = {}
+    @classmethod
+    def factories(cls, paramstyles, cache_size=DEFAULT_CACHE_SIZE, **kwds):
+        """
+        return {paramstyle: Binder} for several databases at once, for
+        applications that run the same templates against all of them.
 
-        self.li_arg.insert(0, di_list_sub)
+        the binders share a single TemplateCache:  each template is parsed
+        once and its renderings for each paramstyle are cached side by side.
 
-        for hit in li_hit:
-            key = hit[2:-2]
-            got = self._get_from_args(key)
+        :param **kwds: passed on to `factory`
+        """
 
-            if not isinstance(got, (list, set)):
-                raise ValueError(
-                    "list substitutions require an iterable parameter: `%s` was of type `%s`"
-                    % (key, type(got))
-                )
-                #
-                # self.tqry = self.tqry.replace(hit, hit[:-1] + "s")
-            else:
+        cache = TemplateCache(cache_size)
+        return dict(
+            [(paramstyle, cls.factory(paramstyle, cache=cache, **kwds)) for paramstyle in paramstyles]
+        )
 
-                li = []
-                if not got:
-                    # empty list or set
-                    self.tqry = self.tqry.replace(hit, "NULL")
-                    continue
+    _di_paramstyle = {}
 
-                for ix, val in enumerate(got):
-                    ikeyname = self.T_LIST_KEYNAME % (key, ix)
-                    ikeyname_sub = "%%(%s)s" % (ikeyname)
-                    di_list_sub[ikeyname] = val
-                    li.append(ikeyname_sub)
+    # leading '__' variable name makes name clashes more unlikely
+    T_LIST_KEYNAME = "%s_%03d__"
 
-                # replace the original bind %(xxx)l with
-                # %(__xxx_000)s, %(__xxx_001)s, ...
-                repval = ", ".join(li)
-                self.tqry = self.tqry.replace(hit, repval)
+    _di_list_strategy = {}
 
 
 class Binder_pyformat(Binder):
@@ -214,53 +2653,24 @@ class Binder_pyformat(Binder):
        query template and substitution management for postgresql
        query is unchanged because postgresql is happy
        with %(somevar)s as a  bind
-    """
-
-    paramstyle = "pyformat"
-    supports = "Postgresql"
-
-    def _pre_process(self):
-        li_listsubstition = self.re_pattern_listsubstition.findall(self.tqry)
-        if li_listsubstition:
-            self.preprocess_listsubstitution(li_listsubstition)
-
-    def format(self, tqry, *args):
-        """
-        looks up substitutions and sets them up in dictionary self.sub
-
-        postgresql accepts Python named variable so keeping the query as is
 
         select * from foo where bar = %(somebar)s"
         =>
         select * from foo where bar = %(somebar)s
         {"somebar" : value-found-for-somebar}
-        """
-
-        self.sub = {}
-        self.li_arg = list(args)
-        self.tqry = tqry
+    """
 
-        self._pre_process()
+    paramstyle = "pyformat"
+    supports = "Postgresql"
+    max_params = 65535
 
-        try:
-            self.tqry % (self)
-        except (Exception,) as e:
-            raise
+    def _placeholder(self, name, position):
+        return "%%(%s)s" % (name)
 
+    def _escape_literal(self, text):
         # Postgresql query format stays as %(foo)s
-        # so we just return the original query
-        # (which _pre_process may have altered)
-        return self.tqry, self.sub
-
-    __call__ = format
-
-    def __getitem__(self, key):
-        if key in self.sub:
-            return None
-
-        got = self._get_from_args(key)
-        self.sub[key] = got
-        return None
+        # so a literal % remains %%
+        return text.replace("%", "%%")
 
 
 PARAMSTYLE_QMARK = PARAMSTYLE_SQLITE = PARAMSTYLE_SQLSERVER = "qmark"
@@ -275,52 +2685,23 @@ class BinderQmark(Binder):
         =>
         select * from foo where bar = ?,
         (value-found-for-somebar,)
-    """
-
-    paramstyle = PARAMSTYLE_QMARK
-    supports = "sqlite3, mssql"
-    qry_replace = "?"
-
-    def format(self, tqry, *args):
-        """
-        looks up substitutions and sets them up in self.sub
 
         Note:
             Assuming both will be happy with a tuple.
             Might be one SQL Server needs a list instead.
+    """
 
-        """
-        self.tqry = tqry
-        self._di_sub = {}
-        self.sub = []
-        self.li_arg = list(args)
-
-        self._pre_process()
-
-        try:
-            qry = self.tqry % (self)
-        except (Exception,) as e:
-            raise
-
-        return qry, tuple(self.sub)
-
-    __call__ = format
-
-    def __getitem__(self, key):
-        """
-        finds a substitution and append it to the bind list
-        but also transforms the variable in the query to ?
-        """
-
-        qry_replace = self.qry_replace
+    paramstyle = PARAMSTYLE_QMARK
+    supports = "sqlite3, mssql"
+    qry_replace = "?"
+    positional = True
+    repeat_binds = True
 
-        try:
-            got = self._di_sub[key]
-        except KeyError:
-            got = self._di_sub[key] = self._get_from_args(key)
+    # sqlite3 before 3.32 (SQL Server's limit is 2100)
+    max_params = 999
 
-        self.sub.append(got)
-        return qry_replace
+    def _placeholder(self, name, position):
+        return self.qry_replace
 
 
 class BinderFormat(BinderQmark):
@@ -338,6 +2719,7 @@ class BinderFormat(BinderQmark):
     paramstyle = "format"
     supports = "MySQL"
     qry_replace = "%s"
+    max_params = 65535
 
 
 class BinderNamed(Binder):
@@ -345,56 +2727,24 @@ class BinderNamed(Binder):
        query template and substitution management for Oracle
        query changes from %(somevar)s to :somevar format
        list-based substitutions:
-           %(somelist)l :__somelist_000, :__somelist_001...
-    """
-
-    paramstyle = "named"
-    supports = "Oracle"
-    t_qry_replace = ":%s"
-
-    def format(self, tqry, *args):
-        """
-        looks up substitutions and sets them up in self.sub
+           %(somelist)l :somelist_000__, :somelist_001__...
 
-        but also transforms the query to Oracle named
-        format
         "select * from foo where bar = %(somebar)s"
         =>
         "select * from foo where bar = :somebar "
         {"somebar" : value-found-for-somebar}
-        
-        """
-
-        self.sub = {}
-        self.li_arg = list(args)
-        self.tqry = tqry
-
-        self._pre_process()
-
-        try:
-            qry = self.tqry % (self)
-        except (Exception,) as e:
-            raise
-
-        return qry, self.sub
-
-    __call__ = format
+    """
 
-    def __getitem__(self, key):
-        """
-        finds a substitution
-        but also transforms the variable in the query to Oracle named
-        format :foo
-        """
+    paramstyle = "named"
+    supports = "Oracle"
+    t_qry_replace = ":%s"
 
-        # already seen so already in the substition dict
-        # replace the query's %(foo)s with :foo
-        if key in self.sub:
-            return self.t_qry_replace % (key)
+    # ORA-01795: maximum number of expressions in a list is 1000
+    max_list_size = 1000
+    max_params = 65535
 
-        got = self._get_from_args(key)
-        self.sub[key] = got
-        return self.t_qry_replace % (key)
+    def _placeholder(self, name, position):
+        return self.t_qry_replace % (name)
 
     """
     https://www.python.org/dev/peps/pep-0249/#paramstyle
@@ -412,6 +2762,63 @@ class BinderNamed(Binder):
 ExperimentalBinderNamed = BinderNamed
 
 
+class BinderNumeric(Binder):
+    """supports: Oracle positional binds
+       query changes from %(somevar)s to :1 format
+       parameters are (<var1>,<var2>,)
+
+       unlike qmark, each distinct bind is passed only once and
+       repeats reuse its position:
+
+        "select * from foo where bar = %(somebar)s or baz = %(somebar)s"
+        =>
+        "select * from foo where bar = :1 or baz = :1"
+        (value-found-for-somebar,)
+    """
+
+    paramstyle = "numeric"
+    supports = "Oracle"
+    t_qry_replace = ":%d"
+    positional = True
+    max_list_size = 1000
+    max_params = 65535
+
+    def _placeholder(self, name, position):
+        return self.t_qry_replace % (position)
+
+
+class BinderDollar(BinderNumeric):
+    """supports: asyncpg
+       same as BinderNumeric, but with $1, $2 placeholders
+    """
+
+    paramstyle = "dollar"
+    supports = "asyncpg"
+    t_qry_replace = "$%d"
+    max_list_size = None
+    max_params = 32767
+
+
+def execute_chunks(cursor, chunks, size=DEFAULT_FETCH_SIZE):
+    """
+    executes the (query, parameters) from `Binder.format_chunks`
+    and streams the rows of all the chunks, one after the other
+
+    use list(execute_chunks(...)) to get them all at once.
+
+    :param size: how many rows to fetch at a time
+    """
+
+    for qry, sub in chunks:
+        cursor.execute(qry, sub)
+        while True:
+            li = cursor.fetchmany(size)
+            if not li:
+                break
+            for row in li:
+                yield row
+
+
 class Binder_NotImplementedError(Binder):
     """not implemented yet"""
 
@@ -428,7 +2835,18 @@ Binder._di_paramstyle["named"] = BinderNamed
 Binder._di_paramstyle[PARAMSTYLE_QMARK] = BinderQmark
 Binder._di_paramstyle["format"] = BinderFormat
 
+Binder._di_paramstyle["numeric"] = BinderNumeric
+Binder._di_paramstyle["dollar"] = BinderDollar
+
 Binder._di_paramstyle["experimentalnamed"] = ExperimentalBinderNamed
 
-# and these are not done yet
-Binder._di_paramstyle["numeric"] = Binder_NotImplementedError
+for strategy in [
+    ListExpand(),
+    ListArray(),
+    ListValues(),
+    ListTempTable(),
+    ListRanges(),
+    ListRows(),
+    ListRowsOr(),
+]:
+    Binder._di_list_strategy[strategy.name] = strategy
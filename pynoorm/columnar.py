@@ -0,0 +1,255 @@
+"""
+columnar results:  one typed buffer per column instead of one object per row
+
+    result = executor.fetch_columns("select custid, qty, amount from orders")
+
+    amount = result["amount"]
+    amount.values           # array.array("d"), or a NumPy array when NumPy is installed
+    amount.mask             # None if there were no NULLs, else 1 for each NULL
+    amount.memoryview()     # the buffer itself, no copy
+
+integer and float columns go in typed buffers, NULLs stored as 0 and flagged
+in the column's mask.  other types (strings, Decimals, dates, booleans...) stay
+Python objects, in a list.  `ColumnarResult.index` maps key values to row positions,
+for `Linker.link_keys`.
+"""
+
+import array
+from numbers import Integral
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# array typecodes
+try:
+    array.array("q")
+    TYPECODE_INT = "q"
+except ValueError:  # pragma: no cover
+    # Python 2
+    TYPECODE_INT = "l"
+TYPECODE_FLOAT = "d"
+
+# Python type of a column's first value => typecode of its buffer.
+# not bool, which would come back as 1/0
+TYPECODES = {int: TYPECODE_INT, float: TYPECODE_FLOAT}
+try:
+    TYPECODES[long] = TYPECODE_INT
+except NameError:
+    # Python 3
+    pass
+
+
+class Column(object):
+    """a result column
+
+    :param typecode: the array typecode of `values`, None if they're Python objects
+    :param values: array.array, NumPy array or list
+    :param mask: None without NULLs, else 1 for NULLs and 0 otherwise, a bytearray or NumPy bool array
+    """
+
+    def __init__(self, name, typecode=None):
+        """
+        :param typecode: declares the column's type, values that don't fit raise TypeError.
+                         with None, the type is inferred from the column's first value
+                         and widened to float or objects if need be.
+        """
+        self.name = name
+        self.typecode = typecode
+        self.declared = typecode is not None
+        self.values = [] if typecode is None else array.array(typecode)
+        self.mask = None
+        self.length = 0
+
+        # until the first value other than NULL
+        self._infer = not self.declared
+
+    def __repr__(self):
+        return "%s %s %s" % (self.__class__.__name__, self.name, self.typecode)
+
+    def __len__(self):
+        return self.length
+
+    def extend(self, values):
+        """append a batch of values, a tuple"""
+
+        if self._infer:
+            self._infer_typecode(values)
+
+        nulls = None in values
+
+        if self.typecode is not None and not self.declared and bool in set(map(type, values)):
+            self._to_objects()
+
+        if self.typecode is None:
+            self.values.extend(values)
+        else:
+            typed = [0 if value is None else value for value in values] if nulls else values
+            before = len(self.values)
+            try:
+                self.values.extend(typed)
+            except (TypeError, OverflowError) as e:
+                # array.extend keeps what it appended before failing
+                del self.values[before:]
+                if self.declared:
+                    raise TypeError("column %s: %s" % (self.name, e))
+                self._widen(values)
+                self.values.extend(
+                    [0 if value is None else value for value in values]
+                    if nulls and self.typecode is not None
+                    else values
+                )
+
+        if nulls:
+            if self.mask is None:
+                self.mask = bytearray(self.length)
+            self.mask.extend([value is None for value in values])
+        elif self.mask is not None:
+            self.mask.extend(bytearray(len(values)))
+
+        self.length += len(values)
+
+    def _infer_typecode(self, values):
+        for value in values:
+            if value is not None:
+                break
+        else:
+            return
+
+        self._infer = False
+        self.typecode = TYPECODES.get(type(value))
+        if self.typecode is not None:
+            # the values so far were all NULLs
+            self.values = array.array(self.typecode, [0]) * len(self.values)
+
+    def _widen(self, values):
+        """integers to floats if all `values` are numbers, else to Python objects"""
+
+        numbers = [value for value in values if value is not None]
+        if self.typecode == TYPECODE_INT and all(
+            [isinstance(value, (Integral, float)) for value in numbers]
+        ) and [value for value in numbers if isinstance(value, float)]:
+            self.values = array.array(TYPECODE_FLOAT, self.values)
+            self.typecode = TYPECODE_FLOAT
+            return
+
+        self._to_objects()
+
+    def _to_objects(self):
+        self.values = self.tolist()
+        self.typecode = None
+
+    def tolist(self):
+        """the values as Python objects, None for NULLs"""
+
+        li = self.values.tolist() if self.typecode is not None else list(self.values)
+        if self.mask is not None and self.typecode is not None:
+            for ix, null in enumerate(self.mask):
+                if null:
+                    li[ix] = None
+        return li
+
+    def memoryview(self):
+        """the column's buffer, without copying it"""
+        if self.typecode is None:
+            raise TypeError("column %s holds Python objects, it has no buffer" % (self.name))
+        return memoryview(self.values)
+
+    def finish(self, use_numpy):
+        """the column is complete, switch to NumPy arrays if `use_numpy`.
+           the NumPy arrays share the buffers of the array.arrays, nothing is copied."""
+
+        if not use_numpy:
+            return
+
+        if self.typecode is not None:
+            if self.length:
+                self.values = numpy.frombuffer(self.values, dtype=self.typecode)
+            else:
+                self.values = numpy.zeros(0, dtype=self.typecode)
+
+        if self.mask is not None:
+            self.mask = numpy.frombuffer(self.mask, dtype=numpy.bool_)
+
+
+class ColumnarResult(object):
+    """the rows of a query, by column.  columns are looked up by name or position.
+
+    `stats` are those of the RowStream the rows came from.
+    """
+
+    def __init__(self, description, typecodes=None):
+        """
+        :param description: the cursor.description of the rows
+        :param typecodes: {column name: array typecode} for the columns whose type is known
+        """
+        typecodes = typecodes or {}
+
+        self.names = [column[0] for column in description]
+        self.columns = [Column(name, typecodes.get(name)) for name in self.names]
+        self._di_column = dict(zip(self.names, self.columns))
+        self.length = 0
+        self.stats = None
+
+    def __repr__(self):
+        return "%s %s rows %s" % (self.__class__.__name__, self.length, self.names)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, Integral):
+            return self.columns[key]
+        return self._di_column[key]
+
+    def extend(self, batch):
+        """append a batch of rows"""
+        if not batch:
+            return
+
+        # transposed in one go
+        for column, values in zip(self.columns, zip(*batch)):
+            column.extend(values)
+        self.length += len(batch)
+
+    def finish(self, use_numpy=None):
+        """no more rows.  `use_numpy` defaults to whether NumPy is installed"""
+
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError("use_numpy needs NumPy")
+
+        for column in self.columns:
+            column.finish(use_numpy)
+
+    def rows(self):
+        """the rows as tuples, None for NULLs"""
+        return zip(*[column.tolist() for column in self.columns])
+
+    def index(self, key, unique=True):
+        """
+        {key value: row position} for a column name, or a tuple of names
+
+        usable as the `left` of `Linker.link_keys`.
+
+        :param unique: with False, {key value: [row positions]}
+        """
+
+        if isinstance(key, (tuple, list)):
+            keyvals = zip(*[self[name].tolist() for name in key])
+        else:
+            keyvals = self[key].tolist()
+
+        if unique:
+            return dict(zip(keyvals, range(self.length)))
+
+        di = {}
+        for position, keyval in enumerate(keyvals):
+            li = di.get(keyval)
+            if li is None:
+                di[keyval] = [position]
+            else:
+                li.append(position)
+        return di
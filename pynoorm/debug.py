@@ -16,7 +16,9 @@ class PGDebugBinder(Binder_pyformat):
 
     name_debug_dict = "di_query_debug"
 
-    def __init__(self, name_debug_dict=None, multiple=False):
+    def __init__(self, name_debug_dict=None, multiple=False, **kwds):
+
+        super(PGDebugBinder, self).__init__(**kwds)
 
         if name_debug_dict:
             self.name_debug_dict = name_debug_dict
@@ -41,20 +43,19 @@ class PGDebugBinder(Binder_pyformat):
             raise
 
 
-    def __getitem__(self, key):
-        if key in self.sub:
-            return None
-
-        got = self._get_from_args(key)
-
+    def _quote(self, got):
         if isinstance(got, basestring):
             got = "'%s'" % (got)
         elif got is None:
             got = "null"
         #!!!todo!!!p4 - handle date/datetimes...
+        return got
+
+    def format(self, tqry, *args):
+        qry, sub = Binder_pyformat.format(self, tqry, *args)
+        return qry, dict([(key, self._quote(got)) for key, got in sub.items()])
 
-        self.sub[key] = got
-        return None
+    __call__ = format
 
     @classmethod
     def get_query(cls, tqry, *args, **kwds):
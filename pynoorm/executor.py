@@ -0,0 +1,318 @@
+"""
+streaming query execution on top of a Binder
+
+    executor = StreamingExecutor(binder, connection)
+
+    stream = executor.stream("select * from orders where custid = %(custid)s", request)
+    for row in stream:
+        ...
+    print(stream.stats)
+
+rows are fetched with `cursor.fetchmany`, so only a batch at a time is held
+in memory instead of the whole result set.  the batch size, `arraysize`,
+adapts to the width of the rows and to how long the database takes to
+return them, and is remembered per template for its next executions.
+"""
+
+import sys
+import threading
+from functools import partial
+from itertools import starmap
+from time import time
+
+from pynoorm.columnar import ColumnarResult
+from pynoorm.rows import RowFactory
+
+# the arraysize of a template's first execution
+DEFAULT_ARRAYSIZE = 100
+MIN_ARRAYSIZE = 10
+MAX_ARRAYSIZE = 50000
+
+# roughly how much row data to hold at a time
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+
+# batches fetched in under half of this grow, those over twice this shrink
+DEFAULT_BATCH_SECONDS = 0.1
+
+# rows of a batch sampled to estimate its rows' width
+WIDTH_SAMPLE = 5
+
+
+def row_bytes(row):
+    """estimated memory used by a fetched row:  the row and its values.
+       values shared with other rows (small ints, None) are counted anyway."""
+    return sys.getsizeof(row) + sum([sys.getsizeof(value) for value in row])
+
+
+class StreamStats(object):
+    """counters for a RowStream
+
+    `peak_bytes` is the estimated size of the largest batch held, see `row_bytes`.
+    `fetch_seconds` is the time spent in the database, executing and fetching.
+    """
+
+    def __init__(self, fingerprint, arraysize):
+        self.fingerprint = fingerprint
+        self.arraysize = arraysize
+        self.rows = 0
+        self.batches = 0
+        self.fetch_seconds = 0.0
+        self.row_bytes = 0
+        self.peak_bytes = 0
+        self.started = time()
+        self.finished = None
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.as_dict())
+
+    @property
+    def elapsed(self):
+        return (self.finished or time()) - self.started
+
+    @property
+    def rows_per_second(self):
+        """end to end, including the time spent by the consumer on each row"""
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return dict(
+            fingerprint=self.fingerprint,
+            rows=self.rows,
+            batches=self.batches,
+            arraysize=self.arraysize,
+            fetch_seconds=self.fetch_seconds,
+            elapsed=self.elapsed,
+            rows_per_second=self.rows_per_second,
+            row_bytes=self.row_bytes,
+            peak_bytes=self.peak_bytes,
+        )
+
+
+class RowStream(object):
+    """the rows of an executed query, fetched a batch at a time as they're iterated.
+
+    the cursor is closed once the rows are exhausted, or by `close`.
+    """
+
+    def __init__(self, executor, cursor, stats, convert=None):
+        """
+        :param convert: None or a function turning a fetched batch into an iterable of rows
+        """
+        self.cursor = cursor
+        self.stats = stats
+        self._executor = executor
+        self._batches = self._iter_batches(executor)
+        self._rows = self._iter_rows(convert)
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.stats)
+
+    def __iter__(self):
+        # the generator itself, sparing a method call per row
+        return self._rows
+
+    def __next__(self):
+        return next(self._rows)
+
+    next = __next__
+
+    def batches(self):
+        """iterate over the fetched batches, as the cursor returns them, instead of the rows"""
+        return self._batches
+
+    def close(self):
+        """stop fetching, closing the cursor"""
+        self._rows.close()
+        self._batches.close()
+
+        # a generator closed before it started doesn't run its `finally`
+        if self.stats.finished is None:
+            self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _iter_rows(self, convert):
+        for batch in self._batches:
+            rows = batch if convert is None else convert(batch)
+            for row in rows:
+                yield row
+
+            # don't hold on to this batch while fetching the next one
+            batch = rows = None
+
+    def _iter_batches(self, executor):
+        cursor = self.cursor
+        stats = self.stats
+
+        try:
+            arraysize = stats.arraysize
+            while True:
+                start = time()
+                batch = cursor.fetchmany(arraysize)
+                seconds = time() - start
+                stats.fetch_seconds += seconds
+                if not batch:
+                    break
+
+                count = len(batch)
+                stats.rows += count
+                stats.batches += 1
+
+                width = stats.row_bytes = executor._get_row_bytes(batch)
+                stats.peak_bytes = max(stats.peak_bytes, width * count)
+
+                if count == arraysize:
+                    arraysize = executor._next_arraysize(arraysize, width, seconds)
+                    if arraysize != stats.arraysize:
+                        stats.arraysize = cursor.arraysize = arraysize
+
+                yield batch
+                batch = None
+        finally:
+            self._finish()
+
+    def _finish(self):
+        self.stats.finished = time()
+        self._executor._record(self.stats)
+        self.cursor.close()
+
+
+class StreamingExecutor(object):
+    """executes query templates formatted by `binder` on `connection`, see RowStream"""
+
+    def __init__(
+        self,
+        binder,
+        connection,
+        arraysize=DEFAULT_ARRAYSIZE,
+        min_arraysize=MIN_ARRAYSIZE,
+        max_arraysize=MAX_ARRAYSIZE,
+        batch_bytes=DEFAULT_BATCH_BYTES,
+        batch_seconds=DEFAULT_BATCH_SECONDS,
+    ):
+        """
+        :param binder: the Binder for `connection`'s paramstyle
+        :param connection: a DB-API connection, each stream uses a cursor of its own
+        :param arraysize: the first arraysize of a template
+        :param min_arraysize, max_arraysize: bound the adapted arraysize
+        :param batch_bytes: the arraysize is capped so that a batch stays around this size
+        :param batch_seconds: the fetch latency the arraysize adapts to
+        """
+        self.binder = binder
+        self.connection = connection
+        self.arraysize = arraysize
+        self.min_arraysize = min_arraysize
+        self.max_arraysize = max_arraysize
+        self.batch_bytes = batch_bytes
+        self.batch_seconds = batch_seconds
+
+        self._lock = threading.Lock()
+
+        # fingerprint => totals over the template's streams
+        self.stats = {}
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.binder)
+
+    def stream(self, tqry, *args, **kwds):
+        """
+        executes `tqry` formatted with `args`, see Binder.execute
+
+        :param row_factory: called on each row, dict(zip(names, row)) for example,
+                            or a RowFactory whose row class for the query is used
+        :param **kwds: other keyword arguments are passed on to Binder.execute
+        :return: a RowStream
+        """
+
+        row_factory = kwds.pop("row_factory", None)
+
+        fingerprint = self.binder.fingerprint(tqry)
+        with self._lock:
+            totals = self.stats.get(fingerprint)
+        arraysize = totals["arraysize"] if totals else self.arraysize
+
+        stats = StreamStats(fingerprint, arraysize)
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.arraysize = arraysize
+            start = time()
+            self.binder.execute(cursor, tqry, *args, **kwds)
+            stats.fetch_seconds += time() - start
+        except (Exception,):
+            cursor.close()
+            raise
+
+        if isinstance(row_factory, RowFactory):
+            convert = partial(starmap, row_factory.get_class(cursor.description))
+        elif row_factory is not None:
+            convert = partial(map, row_factory)
+        else:
+            convert = None
+
+        return RowStream(self, cursor, stats, convert)
+
+    def fetch_columns(self, tqry, *args, **kwds):
+        """
+        executes `tqry` like `stream`, gathering the rows by column, see ColumnarResult
+
+        :param typecodes: {column name: array typecode} for the columns whose type is
+                          known, the others' are inferred from their values
+        :param use_numpy: NumPy arrays rather than array.arrays, the default when
+                          NumPy is installed
+        :return: a ColumnarResult
+        """
+
+        typecodes = kwds.pop("typecodes", None)
+        use_numpy = kwds.pop("use_numpy", None)
+
+        stream = self.stream(tqry, *args, **kwds)
+        result = ColumnarResult(stream.cursor.description, typecodes)
+        try:
+            for batch in stream.batches():
+                result.extend(batch)
+        finally:
+            stream.close()
+
+        result.finish(use_numpy)
+        result.stats = stream.stats
+        return result
+
+    def _get_row_bytes(self, batch):
+        """the estimated width of a batch's rows, from a sample of them"""
+        sample = batch[:: max(1, len(batch) // WIDTH_SAMPLE)]
+        return sum([row_bytes(row) for row in sample]) // len(sample)
+
+    def _next_arraysize(self, arraysize, width, seconds):
+        """the arraysize for the next fetch, after a full batch of `width` rows took `seconds`"""
+
+        if seconds < self.batch_seconds / 2:
+            arraysize *= 2
+        elif seconds > self.batch_seconds * 2:
+            arraysize //= 2
+
+        if width:
+            arraysize = min(arraysize, self.batch_bytes // width)
+
+        return max(self.min_arraysize, min(self.max_arraysize, arraysize))
+
+    def _record(self, stats):
+        """add a finished stream to its template's totals"""
+
+        with self._lock:
+            totals = self.stats.get(stats.fingerprint)
+            if totals is None:
+                totals = self.stats[stats.fingerprint] = dict(
+                    streams=0, rows=0, batches=0, fetch_seconds=0.0, peak_bytes=0
+                )
+            totals["streams"] += 1
+            totals["rows"] += stats.rows
+            totals["batches"] += stats.batches
+            totals["fetch_seconds"] += stats.fetch_seconds
+            totals["peak_bytes"] = max(totals["peak_bytes"], stats.peak_bytes)
+            totals["arraysize"] = stats.arraysize
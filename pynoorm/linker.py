@@ -1,5 +1,11 @@
+from numbers import Integral
 from operator import attrgetter, itemgetter, setitem
-import collections
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:  # pragma: no cover
+    # Python 2
+    from collections import Mapping, Sequence
 
 from six import string_types
 
@@ -20,6 +26,41 @@ cpdb.enabled = False
 ########### debugging aids ##################
 
 
+def column_positions(description, key):
+    """the position in `description` of a column name, or a tuple of them for a tuple of names.
+       names are matched case-insensitively if they don't match exactly.
+
+       :param description: a DB-API cursor.description
+    """
+
+    if is_positional(key):
+        return key
+
+    names = [column[0] for column in description]
+    lowered = [name.lower() for name in names]
+
+    def position(name):
+        if name in names:
+            return names.index(name)
+        try:
+            return lowered.index(name.lower())
+        except ValueError:
+            raise ValueError("column %s not found in %s" % (name, names))
+
+    if isinstance(key, string_types):
+        return position(key)
+    return tuple([position(name) for name in key])
+
+
+def is_positional(key):
+    """is `key` a column position, or a tuple of them"""
+    if isinstance(key, Integral):
+        return True
+    if isinstance(key, string_types) or not isinstance(key, Sequence) or not key:
+        return False
+    return all([isinstance(position, Integral) for position in key])
+
+
 class LinkResultHelper(object):
     """returned by `Linker.link` and can be used to see what wasn't linked"""
 
@@ -82,6 +123,24 @@ class LinkResultHelper(object):
             raise
 
 
+class LinkKeysResultHelper(LinkResultHelper):
+    """returned by `Linker.link_keys`.  the rows can't take attributes,
+       initializing means giving the unlinked left keys an entry in `links`"""
+
+    def initialize_lefts(self):
+        """an empty list, or None for scalars, for the left keys without links"""
+        type_ = self.type_on_left
+        links = self.links
+        for keyval in self.left:
+            if keyval not in links:
+                links[keyval] = None if type_ is None else type_()
+        return self
+
+    def initialize_rights(self):
+        """nothing links back to the left, right-side rows are left as they are"""
+        return self
+
+
 class Linker(object):
     """
         Used to set up very fast one or two-way links between
@@ -93,12 +152,19 @@ class Linker(object):
 
     TYPE_SCALAR = None
 
-    def __init__(self, key_left):
+    def __init__(self, key_left, description=None):
         """key_left is either a string or tuple of strings
            stating which attributes/keys on future objects
            identify them.
            ex:  ("custid","order_id") for CustomerOrder Table
+
+           for tuple rows, key_left can also be a column position or a tuple of them,
+           or names looked up in `description`, the cursor.description of the rows.
         """
+        # the column names, for key_right's positions in other descriptions
+        self.key_names = key_left
+        if description is not None:
+            key_left = column_positions(description, key_left)
         self.key_left = key_left
 
     def __repr__(self):
@@ -107,10 +173,15 @@ class Linker(object):
     def _get_getter(self, obj, key):
         """returns a getter function appropriate for the getitem/getattr support in `obj`"""
         try:
-            if isinstance(obj, collections.Mapping):
+            if is_positional(key):
+                # tuple rows, by column position
+                if isinstance(key, Integral):
+                    return itemgetter(key)
+                return itemgetter(*key)
+            elif isinstance(obj, Mapping):
                 if isinstance(key, string_types):
                     return itemgetter(key)
-                elif isinstance(key, collections.Sequence):
+                elif isinstance(key, Sequence):
                     return itemgetter(*key)
                 else:
                     raise TypeError(
@@ -120,7 +191,7 @@ class Linker(object):
             else:
                 if isinstance(key, string_types):
                     return attrgetter(key)
-                elif isinstance(key, collections.Sequence):
+                elif isinstance(key, Sequence):
                     return attrgetter(*key)
                 else:
                     raise TypeError(
@@ -270,6 +341,75 @@ class Linker(object):
         else:
             return self.helper
 
+    def link_keys(
+        self, left, right, key_right=None, description_right=None, type_on_left=list
+    ):
+        """
+        links rows that can't take attributes, such as DB-API tuples.
+        the links go in a side dictionary instead, {left key: [right-side rows]}
+
+        :param left: a dictionary of left-side rows by key, as from `dict_from_list`
+        :param right: an iterable of right-side rows.  a cursor works too, the
+                      right-side rows are then only held by the links.
+        :param key_right: see `link`, column positions for tuple rows
+        :param description_right: the cursor.description of the right-side rows,
+                                  to look up the positions of `key_right`'s names
+        :param type_on_left: list (the default) - all the right-side rows of each key
+                             None/Linker.scalar - the last right-side row of each key
+
+        :return: LinkKeysResultHelper instance, the side dictionary is its `links`
+        """
+
+        try:
+            helper = self.helper = LinkKeysResultHelper(**locals())
+            links = helper.links = {}
+
+            if type_on_left not in self.supported_target_types:
+                raise TypeError(
+                    "unsupported target type:%s.  Supported are: %s"
+                    % (type_on_left, self.supported_target_types)
+                )
+
+            if description_right is not None:
+                key_right = column_positions(
+                    description_right, key_right if key_right is not None else self.key_names
+                )
+            elif key_right is None:
+                key_right = self.key_left
+
+            it_right = iter(right)
+            try:
+                sample_right = next(it_right)
+            except (StopIteration,) as e:
+                helper.exception = ValueError("empty right", e)
+                return helper
+
+            get_key = self._get_getter(sample_right, key_right)
+
+            for right_ in [[sample_right], it_right]:
+                for o_right in right_:
+                    keyval = get_key(o_right)
+                    if keyval not in left:
+                        helper.add_right_orphan(o_right)
+                        continue
+
+                    if type_on_left is None:
+                        links[keyval] = o_right
+                        continue
+
+                    li = links.get(keyval)
+                    if li is None:
+                        links[keyval] = [o_right]
+                    else:
+                        li.append(o_right)
+
+        except (Exception,) as e:  # pragma: no cover
+            if cpdb():
+                pdb.set_trace()
+            raise
+        else:
+            return helper
+
     def _preppedlinkleft(
         self,
         left,
@@ -325,7 +465,7 @@ class Linker(object):
     def _get_empty_setter(self, obj, attrname_on_tgt, type_on_tgt):
         """initialize the attribute to an appropriate empty value"""
         try:
-            if isinstance(obj, collections.Mapping):
+            if isinstance(obj, Mapping):
 
                 def setdefault(tgt, attrname, value):
                     tgt.setdefault(attrname, value())
@@ -374,7 +514,7 @@ class Linker(object):
 
         assert isinstance(attrname_on_tgt, string_types)
         try:
-            if isinstance(obj, collections.Mapping):
+            if isinstance(obj, Mapping):
 
                 def append(tgt, attrname, value):
                     li = tgt.setdefault(attrname, [])
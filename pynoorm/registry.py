@@ -0,0 +1,223 @@
+"""
+a registry of query templates kept in .sql files
+
+    binders = Binder.factories(["named", "qmark"])
+    registry = TemplateRegistry(binders, cache_file="cache/sql_templates.json")
+    registry.load("sql/")
+
+    qry, sub = binders["named"].format(registry["orders/by_customer"], request)
+
+`load` parses and renders every template for every binder up front.  With a
+`cache_file`, the parsed templates are saved to it as JSON, keyed by a hash of
+their text, so that the next processes (prefork workers, cron jobs) start warm
+and only have to render them.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+from pynoorm import __version__
+from pynoorm.binder import ParsedTemplate
+
+# bump when the persisted templates change shape
+CACHE_FORMAT = 4
+
+SQL_EXTENSION = ".sql"
+
+
+def template_hash(tqry):
+    """what compiled templates are keyed by in the cache file"""
+    return hashlib.sha1(tqry.encode("utf-8")).hexdigest()
+
+
+def _dump_template(compiled, digest, normalized):
+    """the parse of a template as JSON data, everything ParsedTemplate derives
+       from its tokens included so that loading it doesn't have to"""
+    return dict(
+        hash=digest,
+        normalized=normalized,
+        tqry=compiled.tqry,
+        fingerprint=compiled.fingerprint,
+        tokens=compiled.tokens,
+        list_keys=compiled.list_keys,
+        predicates=sorted(compiled.predicates.items()),
+        predicate_keys=sorted(compiled.predicate_keys),
+        fragments=compiled.fragments,
+    )
+
+
+def _load_template(template):
+    """the ParsedTemplate of `_dump_template`'s data"""
+
+    parsed = ParsedTemplate.__new__(ParsedTemplate)
+    parsed.tqry = template["tqry"]
+    parsed.normalized = template["normalized"]
+    parsed.fingerprint = template["fingerprint"]
+    parsed.tokens = [(kind, value) for kind, value in template["tokens"]]
+    parsed.list_keys = template["list_keys"]
+    parsed.predicates = dict(
+        [(ix, (expr, negated, start, end)) for ix, (expr, negated, start, end) in template["predicates"]]
+    )
+    parsed.predicate_keys = set(template["predicate_keys"])
+    parsed.fragments = [(parent, tuple(keys)) for parent, keys in template["fragments"]]
+    parsed.compiled = {}
+    return parsed
+
+
+class TemplateRegistry(object):
+    """query templates by name, precompiled for a set of binders
+
+    a template's name is its path relative to the loaded directory,
+    without the .sql extension and with / separators: `orders/by_customer`.
+    """
+
+    def __init__(self, binders, cache_file=None):
+        """
+        :param binders: {paramstyle: Binder} as from Binder.factories, or a list of binders
+        :param cache_file: where parsed templates are persisted, None to not persist them
+        """
+
+        if hasattr(binders, "values"):
+            binders = list(binders.values())
+        self.binders = binders
+        self.cache_file = cache_file
+        self.templates = {}
+
+        # how the last precompile went
+        self.stats = dict(templates=0, warm=0, cold=0)
+
+    def __repr__(self):
+        return "%s %s templates %s" % (self.__class__.__name__, len(self.templates), self.stats)
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __len__(self):
+        return len(self.templates)
+
+    def add(self, name, tqry):
+        """register a template that doesn't come from a file"""
+        self.templates[name] = tqry
+
+    def load(self, directory, precompile=True):
+        """register all the .sql files under `directory`, then precompile them"""
+
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+
+            prefix = os.path.relpath(dirpath, directory).replace(os.sep, "/")
+            prefix = "" if prefix == "." else prefix + "/"
+
+            for filename in sorted(filenames):
+                if not filename.endswith(SQL_EXTENSION):
+                    continue
+
+                with io.open(os.path.join(dirpath, filename), encoding="utf-8") as fi:
+                    self.add(prefix + filename[: -len(SQL_EXTENSION)], fi.read())
+
+        if precompile:
+            self.precompile()
+
+    def precompile(self):
+        """compile all the templates for all the binders, from `cache_file` when
+           possible.  the cache file is rewritten if anything had to be parsed.
+
+           the binders' template caches are grown to hold all the templates if
+           they're too small, which affects any other binder sharing them.
+        """
+
+        di_cached = self._read_cache()
+        cold = warm = 0
+
+        # binders from Binder.factories share a cache.  normalizing binders
+        # cache another parse of the same template.
+        groups = []
+        for binder in self.binders:
+            for cache, normalize, binders in groups:
+                if cache is binder.cache and normalize == binder.normalize:
+                    binders.append(binder)
+                    break
+            else:
+                groups.append((binder.cache, binder.normalize, [binder]))
+
+        for cache, normalize, binders in groups:
+            # make room for all of them
+            size = len(self.templates) * len([group for group in groups if group[0] is cache])
+            if 0 < cache.maxsize < size:
+                cache.maxsize = size
+
+        di_parsed = {}
+        for name, tqry in self.templates.items():
+            digest = template_hash(tqry)
+
+            is_warm = True
+            for cache, normalize, binders in groups:
+                key = (digest, normalize)
+
+                cached = di_cached.get(key)
+                if cached is not None and cached.tqry == tqry:
+                    cache.put(binders[0].cache_key(tqry), cached)
+                else:
+                    is_warm = False
+
+                # the renderings aren't persisted, they're quick to rebuild
+                for binder in binders:
+                    compiled = binder.compile(tqry)
+                di_parsed[key] = compiled
+
+            if is_warm:
+                warm += 1
+            else:
+                cold += 1
+
+        self.stats = dict(templates=len(self.templates), warm=warm, cold=cold)
+
+        if cold and self.cache_file:
+            self._write_cache(di_parsed)
+
+    def _read_cache(self):
+        """{(template hash, normalized): ParsedTemplate} from `cache_file`,
+           empty if it's missing or stale"""
+
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+
+        try:
+            with io.open(self.cache_file, encoding="utf-8") as fi:
+                data = json.load(fi)
+
+            if data.get("format") != CACHE_FORMAT or data.get("version") != __version__:
+                return {}
+
+            di = {}
+            for template in data["templates"]:
+                di[(template["hash"], template["normalized"])] = _load_template(template)
+        except (Exception,):
+            # unreadable: it's only a cache, recompile
+            return {}
+
+        return di
+
+    def _write_cache(self, di_parsed):
+        """persist the parsed templates, atomically so that readers never see half a file"""
+
+        templates = [
+            _dump_template(compiled, digest, normalized)
+            for (digest, normalized), compiled in sorted(di_parsed.items())
+        ]
+        data = dict(format=CACHE_FORMAT, version=__version__, templates=templates)
+
+        tmp = "%s.%s.tmp" % (self.cache_file, os.getpid())
+        with open(tmp, "wb") as fo:
+            fo.write(json.dumps(data).encode("utf-8"))
+
+        try:
+            os.replace(tmp, self.cache_file)
+        except AttributeError:
+            # Python 2
+            os.rename(tmp, self.cache_file)
@@ -0,0 +1,279 @@
+"""
+a cache of query results, for reference data queried again and again with the same binds
+
+    cache = ResultCache(max_bytes=32 * 1024 * 1024, ttl=300)
+
+    rows = cache.fetch(binder, connection, '''
+        -- cache_tags: tax_rate
+        select * from tax_rate where country = %(country)s''', request)
+
+    # after updating tax_rate
+    cache.invalidate("tax_rate")
+
+results are keyed by the template's fingerprint, the paramstyle and the query
+and parameters that `Binder.format` produced.  they're kept as a tuple of
+tuples, which every hit returns as is:  don't try to change them.
+
+entries are evicted least recently used first, when there are more than
+`maxsize` of them or they take more than `max_bytes`, after `ttl` seconds
+and when one of the tables they're tagged with is invalidated.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from time import time
+
+from pynoorm.executor import row_bytes
+
+# table tags declared in the template, `-- cache_tags: country, currency`
+RE_CACHE_TAGS = re.compile(r"--\s*cache_tags:\s*([\w., ]+)")
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def get_cache_tags(tqry):
+    """the table tags declared in a template's `-- cache_tags:` comments"""
+    tags = set()
+    for match in RE_CACHE_TAGS.finditer(tqry):
+        tags.update([tag.strip() for tag in match.group(1).split(",") if tag.strip()])
+    return frozenset(tags)
+
+
+def _freeze(value):
+    """lists, such as LIST_ARRAY binds, as tuples so that they can be hashed"""
+    if isinstance(value, list):
+        return tuple([_freeze(item) for item in value])
+    return value
+
+
+class CacheEntry(object):
+    """a cached result"""
+
+    __slots__ = ("rows", "nbytes", "expires", "seconds", "tags")
+
+    def __init__(self, rows, nbytes, expires, seconds, tags):
+        self.rows = rows
+        self.nbytes = nbytes
+        # None for never
+        self.expires = expires
+        # what fetching the rows took, what a hit saves
+        self.seconds = seconds
+        self.tags = tags
+
+
+class ResultCache(object):
+    """bounded LRU cache of query results, with TTL and table tag invalidation.
+
+    safe to share between threads.
+    """
+
+    # replaceable, for tests
+    clock = staticmethod(time)
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        """
+        :param maxsize: the most results kept
+        :param max_bytes: roughly how much memory the results can take, see executor.row_bytes.
+                          results bigger than this aren't cached.
+        :param ttl: how many seconds a result is kept, None for as long as possible
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._di = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        # tag => keys of the entries tagged with it
+        self._di_tag_keys = {}
+
+        # template fingerprint => tags, from the template's comments
+        self._di_tags = {}
+
+        # tag => how many times it's been invalidated, see `put`
+        self._di_generation = {}
+
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.invalidations = self.uncacheable = 0
+        self.saved_seconds = 0.0
+
+    def __repr__(self):
+        return "%s %s" % (self.__class__.__name__, self.stats())
+
+    def __len__(self):
+        return len(self._di)
+
+    def fetch(self, binder, connection, tqry, *args, **kwds):
+        """
+        the rows of `tqry` formatted by `binder` with `args`, from cache if possible
+
+        :param connection: a DB-API connection, only used on misses
+        :param tags: the tables the result depends on, instead of the template's `-- cache_tags:`
+        :param ttl: overrides the cache's for this result
+        :return: a tuple of row tuples, shared by all the hits
+        """
+
+        tags = kwds.pop("tags", None)
+        ttl = kwds.pop("ttl", self.ttl)
+        if kwds:
+            raise TypeError("unexpected keyword arguments %s" % (list(kwds.keys())))
+
+        qry, sub = binder.format(tqry, *args)
+        fingerprint = binder.fingerprint(tqry)
+
+        # the query text tells apart the optional fragment combinations of a template
+        if isinstance(sub, dict):
+            params = tuple(sorted([(key, _freeze(value)) for key, value in sub.items()]))
+        else:
+            params = tuple([_freeze(value) for value in sub])
+        key = (fingerprint, binder.paramstyle, qry, params)
+
+        try:
+            hash(key)
+        except TypeError:
+            with self._lock:
+                self.uncacheable += 1
+            return self._execute(connection, qry, sub)[0]
+
+        rows = self.get(key)
+        if rows is not None:
+            return rows
+
+        if tags is None:
+            tags = self._di_tags.get(fingerprint)
+            if tags is None:
+                tags = self._di_tags.setdefault(fingerprint, get_cache_tags(tqry))
+        else:
+            tags = frozenset(tags)
+
+        # an invalidation while the query runs makes its rows stale
+        generations = self.generations(tags)
+        rows, seconds = self._execute(connection, qry, sub)
+
+        self.put(key, rows, seconds, tags, ttl, generations)
+        return rows
+
+    def _execute(self, connection, qry, sub):
+        """(rows as a tuple of tuples, seconds it took)"""
+
+        start = self.clock()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(qry, sub)
+            rows = tuple([row if type(row) is tuple else tuple(row) for row in cursor.fetchall()])
+        finally:
+            cursor.close()
+        return rows, self.clock() - start
+
+    def get(self, key):
+        """the cached rows for `key`, None if there are none"""
+
+        with self._lock:
+            entry = self._di.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires is not None and entry.expires <= self.clock():
+                self._forget(key, entry)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # back at the most-recently-used end
+            self._di[key] = entry
+            self.hits += 1
+            self.saved_seconds += entry.seconds
+            return entry.rows
+
+    def generations(self, tags):
+        """{tag: generation}, to take before fetching rows to `put`"""
+        with self._lock:
+            return dict([(tag, self._di_generation.get(tag, 0)) for tag in tags])
+
+    def put(self, key, rows, seconds=0.0, tags=frozenset(), ttl=None, generations=None):
+        """cache `rows`, a tuple of tuples.  `seconds` is what fetching them took.
+
+           with `generations`, from before the rows were fetched, the rows aren't
+           cached if one of their tags has been invalidated since.
+        """
+
+        nbytes = sum([row_bytes(row) for row in rows])
+        if self.maxsize <= 0 or nbytes > self.max_bytes:
+            return
+
+        expires = None if ttl is None else self.clock() + ttl
+        entry = CacheEntry(rows, nbytes, expires, seconds, tags)
+
+        di = self._di
+        with self._lock:
+            if generations is not None:
+                for tag, generation in generations.items():
+                    if self._di_generation.get(tag, 0) != generation:
+                        return
+
+            previous = di.pop(key, None)
+            if previous is not None:
+                self._forget(key, previous)
+
+            while di and (len(di) >= self.maxsize or self.nbytes + nbytes > self.max_bytes):
+                oldest, evicted = di.popitem(last=False)
+                self._forget(oldest, evicted)
+                self.evictions += 1
+
+            di[key] = entry
+            self.nbytes += nbytes
+            for tag in tags:
+                self._di_tag_keys.setdefault(tag, set()).add(key)
+
+    def _forget(self, key, entry):
+        """bookkeeping for an entry that's been taken out of the cache, under the lock"""
+        self.nbytes -= entry.nbytes
+        for tag in entry.tags:
+            keys = self._di_tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._di_tag_keys[tag]
+
+    def invalidate(self, *tags):
+        """drop the results tagged with any of `tags`, after the tables changed.
+           :return: how many results were dropped"""
+
+        count = 0
+        with self._lock:
+            for tag in tags:
+                self._di_generation[tag] = self._di_generation.get(tag, 0) + 1
+                for key in list(self._di_tag_keys.get(tag, ())):
+                    entry = self._di.pop(key, None)
+                    if entry is not None:
+                        self._forget(key, entry)
+                        count += 1
+            self.invalidations += count
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._di.clear()
+            self._di_tag_keys.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=float(self.hits) / lookups if lookups else 0.0,
+            saved_seconds=self.saved_seconds,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            invalidations=self.invalidations,
+            uncacheable=self.uncacheable,
+            size=len(self._di),
+            maxsize=self.maxsize,
+            nbytes=self.nbytes,
+            max_bytes=self.max_bytes,
+        )
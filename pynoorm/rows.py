@@ -0,0 +1,136 @@
+"""
+compact row objects for fetched results, instead of one dict per row
+
+    factory = RowFactory(extra=("orders",))
+
+    cursor.execute(qry, sub)
+    customers = factory.rows(cursor)
+
+    customers[0].custid
+    linker.link(di_customer, orders, attrname_on_left="orders")
+
+each distinct column signature of `cursor.description` gets a generated class
+with `__slots__`, created once and cached by the factory.  its rows take about
+as much memory as the fetched tuples and work with Linker's attrgetter getters
+and setattr setters as they are.
+
+attributes other than the columns, such as those set by Linker.link, go in the
+`extra` slots declared upfront or, with `overflow`, in an instance __dict__ that
+Python only allocates when the first such attribute is set.
+"""
+
+import keyword
+import re
+from itertools import starmap
+
+RE_NOT_IDENTIFIER = re.compile(r"\W")
+
+
+def column_names(description, lower=False):
+    """attribute names for a cursor.description's columns
+
+    `count(*)` becomes `count___`, repeated names get a _1, _2... suffix
+    and names that aren't valid identifiers are prefixed with `_`.
+    """
+
+    names = []
+    seen = set()
+    for column in description:
+        name = column[0]
+        if lower:
+            name = name.lower()
+        name = RE_NOT_IDENTIFIER.sub("_", name)
+        if not name or name[0].isdigit() or keyword.iskeyword(name) or name.startswith("__"):
+            name = "_" + name
+
+        unique = name
+        suffix = 0
+        while unique in seen:
+            suffix += 1
+            unique = "%s_%s" % (name, suffix)
+        seen.add(unique)
+        names.append(unique)
+
+    return tuple(names)
+
+
+class RowBase(object):
+    """base class of the generated row classes, see RowFactory"""
+
+    __slots__ = ()
+
+    # the column attributes, in cursor.description order
+    _fields = ()
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            self.__class__.__name__,
+            ", ".join(["%s=%r" % (name, getattr(self, name)) for name in self._fields]),
+        )
+
+    def _astuple(self):
+        return tuple([getattr(self, name) for name in self._fields])
+
+    def _asdict(self):
+        return dict([(name, getattr(self, name)) for name in self._fields])
+
+
+class RowFactory(object):
+    """generates and caches a RowBase subclass per column signature"""
+
+    def __init__(self, extra=(), overflow=True, lower=False):
+        """
+        :param extra: attribute names to declare as slots besides the columns,
+                      for the attributes that Linker.link will set
+        :param overflow: allow other attributes too, in an instance __dict__
+        :param lower: lowercase column names, for databases that uppercase them
+        """
+        self.extra = tuple(extra)
+        self.overflow = overflow
+        self.lower = lower
+
+        # column names => class
+        self._di_class = {}
+
+    def __repr__(self):
+        return "%s %s classes" % (self.__class__.__name__, len(self._di_class))
+
+    def get_class(self, description):
+        """the row class for a cursor.description"""
+
+        names = tuple([column[0] for column in description])
+        try:
+            return self._di_class[names]
+        except KeyError:
+            # setdefault so that threads racing on a signature share one class
+            return self._di_class.setdefault(names, self._make_class(description))
+
+    def rows(self, cursor, fetched=None):
+        """`fetched`, cursor.fetchall() by default, as rows"""
+        if fetched is None:
+            fetched = cursor.fetchall()
+        return list(starmap(self.get_class(cursor.description), fetched))
+
+    def _make_class(self, description):
+        fields = column_names(description, self.lower)
+
+        slots = fields + tuple([name for name in self.extra if name not in fields])
+        if self.overflow:
+            slots += ("__dict__",)
+
+        # an __init__ assigning each column in turn is the fastest way to fill slots
+        params = ["_%s" % (ix) for ix in range(len(fields))]
+        source = "def __init__(self%s):\n%s" % (
+            "".join([", %s" % (param) for param in params]),
+            "".join(["    self.%s = %s\n" % (name, param) for name, param in zip(fields, params)])
+            or "    pass\n",
+        )
+        namespace = {}
+        exec(source, namespace)
+
+        name = "Row%s" % (len(self._di_class))
+        return type(
+            name,
+            (RowBase,),
+            dict(__slots__=slots, _fields=fields, __init__=namespace["__init__"]),
+        )
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_columnar
+----------------------------------
+
+Tests for `pynoorm.columnar` module.
+"""
+import array
+import sqlite3
+import unittest
+from time import time
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### debugging #####################
+import pdb
+
+
+def cpdb(e=None):
+    """conditional debugging
+       use with:  `if cpdb(): pdb.set_trace()`
+    """
+    return cpdb.enabled
+
+
+cpdb.enabled = False
+###################################
+
+from pynoorm.binder import Binder
+from pynoorm.columnar import Column, TYPECODE_INT, TYPECODE_FLOAT, numpy
+from pynoorm.executor import StreamingExecutor
+from pynoorm.linker import Linker
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    # Python 2
+    tracemalloc = None
+
+
+class Test_Columnar(unittest.TestCase):
+
+    rows = 1000
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "create table orders (ordernum integer, custid integer, amount real, status text, qty integer)"
+        )
+        self.connection.executemany(
+            "insert into orders values (?, ?, ?, ?, ?)",
+            [
+                (ix, ix % 10, ix * 1.5, "ABC"[ix % 3], None if ix % 4 == 0 else ix % 7)
+                for ix in range(self.rows)
+            ],
+        )
+        self.executor = StreamingExecutor(Binder.factory("qmark"), self.connection, arraysize=10)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_fetch_columns(self):
+        tqry = "select * from orders where custid in (%(li_custid)l) order by ordernum"
+        args = dict(li_custid=[1, 2, 3])
+
+        result = self.executor.fetch_columns(tqry, args, use_numpy=False)
+        qry, sub = Binder.factory("qmark").format(tqry, args)
+        exp = self.connection.execute(qry, sub).fetchall()
+
+        self.assertEqual(len(exp), len(result))
+        self.assertEqual(exp, list(result.rows()))
+        self.assertEqual(len(exp), result.stats.rows)
+        self.assertEqual(["ordernum", "custid", "amount", "status", "qty"], result.names)
+
+        ordernum = result["ordernum"]
+        self.assertTrue(result[0] is ordernum)
+        self.assertEqual(TYPECODE_INT, ordernum.typecode)
+        self.assertTrue(isinstance(ordernum.values, array.array))
+        self.assertEqual(None, ordernum.mask)
+        self.assertEqual([row[0] for row in exp], ordernum.tolist())
+
+        self.assertEqual(TYPECODE_FLOAT, result["amount"].typecode)
+        self.assertEqual(None, result["status"].typecode)
+        self.assertEqual(["B", "C", "A"], result["status"].values[:3])
+
+        # zero-copy views of the buffers
+        view = result["amount"].memoryview()
+        self.assertEqual(TYPECODE_FLOAT, view.format)
+        self.assertEqual(exp[1][2], view[1])
+        self.assertRaises(BufferError, result["amount"].values.append, 1.0)
+        view.release()
+        self.assertRaises(TypeError, result["status"].memoryview)
+
+        # NULLs are 0 in the buffer, flagged in the mask
+        qty = result["qty"]
+        self.assertEqual([row[4] is None for row in exp], [bool(null) for null in qty.mask])
+        self.assertEqual([row[4] for row in exp], qty.tolist())
+        self.assertEqual(0, qty.values[exp.index([row for row in exp if row[4] is None][0])])
+
+    def test_infer(self):
+        """types from the first values, widened if need be"""
+
+        def column(*batches, **kwds):
+            column = Column("test", **kwds)
+            for batch in batches:
+                column.extend(batch)
+            return column
+
+        # NULLs until the first value
+        col = column((None, None), (None, 3))
+        self.assertEqual(TYPECODE_INT, col.typecode)
+        self.assertEqual([None, None, None, 3], col.tolist())
+
+        col = column((1, None), (2.5,))
+        self.assertEqual(TYPECODE_FLOAT, col.typecode)
+        self.assertEqual([1.0, None, 2.5], col.tolist())
+
+        col = column((1, None), (2, "x"))
+        self.assertEqual(None, col.typecode)
+        self.assertEqual([1, None, 2, "x"], col.tolist())
+        self.assertEqual(bytearray([0, 1, 0, 0]), col.mask)
+
+        col = column((1, 2), (2 ** 70,))
+        self.assertEqual([1, 2, 2 ** 70], col.tolist())
+
+        # booleans stay booleans
+        col = column((True, None), (False,))
+        self.assertEqual(None, col.typecode)
+        self.assertEqual([True, None, False], col.tolist())
+        col = column((1, None), (2.5, True))
+        self.assertEqual(None, col.typecode)
+        self.assertEqual([1, None, 2.5, True], col.tolist())
+        self.assertEqual(bool, type(col.tolist()[3]))
+
+        # declared types don't widen
+        self.assertRaises(TypeError, column, (1, 2), (2.5,), typecode=TYPECODE_INT)
+        col = column((1, 2), typecode="i")
+        self.assertEqual(array.array("i", [1, 2]), col.values)
+
+    def test_typecodes(self):
+        result = self.executor.fetch_columns(
+            "select custid, qty from orders", typecodes=dict(custid="b"), use_numpy=False
+        )
+        self.assertEqual("b", result["custid"].typecode)
+        self.assertEqual(self.rows, len(result["custid"].memoryview()))
+
+    def test_index(self):
+        """a key index for Linker"""
+        customers = self.executor.fetch_columns("select distinct custid from orders order by custid")
+
+        index = customers.index("custid")
+        self.assertEqual(dict([(custid, custid) for custid in range(10)]), index)
+
+        cursor = self.connection.execute("select ordernum, custid from orders where ordernum < 100")
+        helper = Linker(key_left="custid").link_keys(
+            index, cursor, description_right=cursor.description
+        )
+        self.assertEqual(10, len(helper.links[3]))
+        self.assertEqual(set([3]), set([row[1] for row in helper.links[3]]))
+
+        orders = self.executor.fetch_columns("select custid, status, ordernum from orders")
+        index = orders.index(("custid", "status"), unique=False)
+        self.assertEqual([1, 31, 61], index[(1, "B")][:3])
+
+    @unittest.skipIf(numpy is None, "needs NumPy")
+    def test_numpy(self):
+        result = self.executor.fetch_columns("select * from orders order by ordernum", use_numpy=True)
+        self.assertTrue(isinstance(result["amount"].values, numpy.ndarray))
+        self.assertEqual(self.rows * 1.5 * (self.rows - 1) / 2, result["amount"].values.sum())
+        self.assertEqual(self.rows // 4, result["qty"].mask.sum())
+        self.assertEqual(None, result["qty"].tolist()[0])
+
+        empty = self.executor.fetch_columns("select * from orders where 1 = 0", use_numpy=True)
+        self.assertEqual(0, len(empty))
+
+    @unittest.skipIf(tracemalloc is None, "needs tracemalloc")
+    def test_benchmark(self):
+        """memory and throughput, against fetchall and row dicts"""
+
+        count = 200000
+        self.connection.execute("delete from orders")
+        self.connection.executemany(
+            "insert into orders values (?, ?, ?, ?, ?)",
+            [(ix, ix % 1000, ix * 1.5, "ABC"[ix % 3], ix % 7) for ix in range(count)],
+        )
+        tqry = "select ordernum, custid, amount, qty from orders"
+        names = ["ordernum", "custid", "amount", "qty"]
+        binder = self.executor.binder
+        executor = StreamingExecutor(binder, self.connection)
+
+        def measure(fetch):
+            tracemalloc.start()
+            try:
+                start = time()
+                result = fetch()
+                seconds = time() - start
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return result, current, peak, seconds
+
+        def fetch_dicts():
+            qry, sub = binder.format(tqry)
+            return [dict(zip(names, row)) for row in self.connection.execute(qry, sub).fetchall()]
+
+        dicts, size_dicts, peak_dicts, seconds_dicts = measure(fetch_dicts)
+        total = sum([di["amount"] for di in dicts])
+        del dicts
+
+        result, size_columns, peak_columns, seconds_columns = measure(
+            lambda: executor.fetch_columns(tqry, use_numpy=False)
+        )
+        self.assertEqual(total, sum(result["amount"].values))
+        self.assertTrue(size_columns * 5 < size_dicts)
+        self.assertTrue(peak_columns < peak_dicts)
+
+        print(
+            "%s rows:  row dicts %s KB (peak %s KB) %.3f seconds, %d rows/sec.  "
+            "columns %s KB (peak %s KB) %.3f seconds, %d rows/sec"
+            % (
+                count,
+                size_dicts // 1024,
+                peak_dicts // 1024,
+                seconds_dicts,
+                count / seconds_dicts,
+                size_columns // 1024,
+                peak_columns // 1024,
+                seconds_columns,
+                count / seconds_columns,
+            )
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # interactive debug
+    debug_flag = "--pdb"
+    if debug_flag in sys.argv:
+        sys.argv.remove(debug_flag)
+        cpdb.enabled = True
+
+    sys.exit(unittest.main())
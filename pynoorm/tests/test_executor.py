@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_executor
+----------------------------------
+
+Tests for `pynoorm.executor` module.
+"""
+import sqlite3
+import unittest
+from time import time
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### debugging #####################
+import pdb
+
+
+def cpdb(e=None):
+    """conditional debugging
+       use with:  `if cpdb(): pdb.set_trace()`
+    """
+    return cpdb.enabled
+
+
+cpdb.enabled = False
+###################################
+
+from pynoorm.binder import Binder
+from pynoorm.executor import StreamingExecutor
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    # Python 2
+    tracemalloc = None
+
+
+class Test_Executor(unittest.TestCase):
+
+    tqry = "select * from orders where custid = %(custid)s and status in (%(li_status)l) order by ordernum"
+    args = dict(custid="ACME", li_status=["A", "B"])
+
+    rows = 20000
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "create table orders (ordernum integer, custid text, status text, comment text)"
+        )
+        self.connection.executemany(
+            "insert into orders values (?, ?, ?, ?)",
+            [
+                (ix, "ACME" if ix % 4 else "OTHER", "ABC"[ix % 3], "comment %s " % (ix) * (ix % 7))
+                for ix in range(self.rows)
+            ],
+        )
+        self.binder = Binder.factory("qmark")
+
+    def tearDown(self):
+        self.connection.close()
+
+    def fetchall(self):
+        qry, sub = self.binder.format(self.tqry, self.args)
+        return self.connection.execute(qry, sub).fetchall()
+
+    def test_stream(self):
+        executor = StreamingExecutor(self.binder, self.connection, arraysize=10)
+
+        stream = executor.stream(self.tqry, self.args)
+        got = list(stream)
+        self.assertEqual(self.fetchall(), got)
+
+        stats = stream.stats
+        self.assertEqual(len(got), stats.rows)
+        self.assertEqual(self.binder.fingerprint(self.tqry), stats.fingerprint)
+        self.assertTrue(stats.rows_per_second > 0)
+        self.assertTrue(0 < stats.peak_bytes <= executor.batch_bytes)
+
+        # sqlite answers fast, the batches grew
+        self.assertTrue(stats.arraysize > 10)
+        self.assertTrue(stats.batches < len(got) / 10)
+
+        # and the template's next stream starts where this one stopped
+        totals = executor.stats[stats.fingerprint]
+        self.assertEqual((1, len(got), stats.batches), (totals["streams"], totals["rows"], totals["batches"]))
+        stream = executor.stream(self.tqry, self.args)
+        self.assertEqual(totals["arraysize"], stream.stats.arraysize)
+        stream.close()
+
+    def test_adapt(self):
+        """wide rows get smaller batches, slow fetches shrink them"""
+        executor = StreamingExecutor(self.binder, self.connection, arraysize=10, batch_bytes=64 * 1024)
+
+        narrow = executor.stream("select ordernum from orders")
+        list(narrow)
+        wide = executor.stream("select ordernum, comment, comment || comment as double from orders")
+        list(wide)
+
+        self.assertTrue(wide.stats.row_bytes > narrow.stats.row_bytes)
+        self.assertTrue(wide.stats.arraysize < narrow.stats.arraysize)
+        # widths are estimated from a sample of each batch
+        self.assertTrue(wide.stats.peak_bytes <= 2 * 64 * 1024)
+
+        self.assertEqual(500, executor._next_arraysize(1000, 10, executor.batch_seconds * 3))
+        self.assertEqual(1000, executor._next_arraysize(1000, 10, executor.batch_seconds))
+        self.assertEqual(executor.max_arraysize, executor._next_arraysize(executor.max_arraysize, 1, 0))
+        self.assertEqual(executor.min_arraysize, executor._next_arraysize(10, 10 ** 9, 0))
+
+    def test_close(self):
+        executor = StreamingExecutor(self.binder, self.connection)
+
+        with executor.stream(self.tqry, self.args) as stream:
+            row = next(stream)
+        self.assertEqual(1, row[0])
+        self.assertRaises(sqlite3.ProgrammingError, stream.cursor.fetchone)
+        self.assertEqual(1, executor.stats[stream.stats.fingerprint]["streams"])
+
+        # closed before fetching anything
+        stream = executor.stream(self.tqry, self.args)
+        stream.close()
+        self.assertRaises(sqlite3.ProgrammingError, stream.cursor.fetchone)
+        self.assertTrue(stream.stats.finished is not None)
+        self.assertEqual(2, executor.stats[stream.stats.fingerprint]["streams"])
+        stream.close()
+        self.assertEqual(2, executor.stats[stream.stats.fingerprint]["streams"])
+
+        # failed executions don't leave a cursor behind
+        self.assertRaises(sqlite3.OperationalError, executor.stream, "select * from nosuchtable")
+
+    def test_row_factory(self):
+        executor = StreamingExecutor(self.binder, self.connection)
+
+        def as_dict(row):
+            return dict(ordernum=row[0], custid=row[1])
+
+        got = list(executor.stream(self.tqry, self.args, row_factory=as_dict))
+        self.assertEqual([row[0] for row in self.fetchall()], [di["ordernum"] for di in got])
+        self.assertEqual("ACME", got[-1]["custid"])
+
+    @unittest.skipIf(tracemalloc is None, "needs tracemalloc")
+    def test_memory(self):
+        """peak memory and time against fetchall and dicts"""
+
+        tqry = "select * from orders"
+        names = ["ordernum", "custid", "status", "comment"]
+
+        tracemalloc.start()
+        try:
+            start = time()
+            qry, sub = self.binder.format(tqry)
+            rows = [dict(zip(names, row)) for row in self.connection.execute(qry, sub).fetchall()]
+            count_all = len(rows)
+            del rows
+            seconds_all = time() - start
+            peak_all = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        tracemalloc.start()
+        try:
+            start = time()
+            executor = StreamingExecutor(self.binder, self.connection, batch_bytes=256 * 1024)
+            count = 0
+            for row in executor.stream(tqry, row_factory=lambda row: dict(zip(names, row))):
+                count += 1
+            seconds = time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(count_all, count)
+        self.assertTrue(peak < peak_all)
+        print(
+            "%s rows: fetchall %.3f seconds, peak %s KB.  streamed %.3f seconds, peak %s KB"
+            % (count, seconds_all, peak_all // 1024, seconds, peak // 1024)
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # interactive debug
+    debug_flag = "--pdb"
+    if debug_flag in sys.argv:
+        sys.argv.remove(debug_flag)
+        cpdb.enabled = True
+
+    sys.exit(unittest.main())
@@ -15,7 +15,7 @@ import pprint
 import unittest
 from time import time
 
-from pynoorm.linker import Linker, SlotProxy
+from pynoorm.linker import Linker, SlotProxy, column_positions
 
 import random
 import logging
@@ -942,6 +942,104 @@ class Test_Basic(unittest.TestCase):
             raise
 
 
+class Test_Tuples(unittest.TestCase):
+    """DB-API rows as they are fetched"""
+
+    description_customer = [("CUSTID", None), ("NAME", None)]
+    description_order = [("ORDER_ID", None), ("CUSTID", None), ("QTY", None)]
+
+    def get_rows(self, customers=3):
+        customers_ = [(custid, "customer %s" % (custid)) for custid in range(1, customers + 1)]
+        orders = [
+            (custid * 1000 + ix, custid, ix)
+            for custid in range(1, customers + 1)
+            for ix in range(custid)
+        ]
+        # an orphan
+        orders.append((99001, 99, 1))
+        return customers_, orders
+
+    def test_column_positions(self):
+        self.assertEqual(1, column_positions(self.description_order, "custid"))
+        self.assertEqual((1, 0), column_positions(self.description_order, ("CUSTID", "order_id")))
+        self.assertRaises(ValueError, column_positions, self.description_order, "name")
+
+    def test_link_keys(self):
+        customers, orders = self.get_rows()
+
+        linker = Linker(key_left="custid", description=self.description_customer)
+        self.assertEqual(0, linker.key_left)
+        lookup = linker.dict_from_list(customers)
+        self.assertEqual(customers[1], lookup[2])
+
+        helper = linker.link_keys(lookup, orders, description_right=self.description_order)
+        self.assertEqual([(99001, 99, 1)], helper.right_orphans)
+        self.assertEqual([(3000, 3, 0), (3001, 3, 1), (3002, 3, 2)], helper.links[3])
+        self.assertEqual(set([1, 2, 3]), set(helper.links.keys()))
+
+        # the rows weren't touched
+        self.assertEqual((1, "customer 1"), customers[0])
+
+        # customers without orders get an entry too
+        lookup[4] = (4, "customer 4")
+        helper = linker.link_keys(lookup, orders, description_right=self.description_order)
+        self.assertTrue(helper.initialize_rights() is helper)
+        helper.initialize_lefts()
+        self.assertEqual([], helper.links[4])
+        self.assertEqual(3, len(helper.links[3]))
+        helper = linker.link_keys(lookup, orders, key_right=1, type_on_left=None).initialize_lefts()
+        self.assertEqual(None, helper.links[4])
+        del lookup[4]
+
+        # the last row per key
+        helper = linker.link_keys(lookup, orders, key_right=1, type_on_left=None)
+        self.assertEqual((3002, 3, 2), helper.links[3])
+
+        # compound keys, by position
+        linker = Linker(key_left=(1, 0))
+        lookup = linker.dict_from_list(orders)
+        helper = linker.link_keys(lookup, [(2, 2001, "line")], key_right=(0, 1))
+        self.assertEqual([(2, 2001, "line")], helper.links[(2, 2001)])
+
+        self.assertRaises(TypeError, linker.link_keys, lookup, orders, type_on_left=dict)
+        self.assertTrue(isinstance(linker.link_keys(lookup, []).exception, ValueError))
+
+    def test_link_objects_to_tuples(self):
+        """positional keys on the right, attributes on the left"""
+        customers, orders = self.get_rows()
+        customers = [dict(custid=custid, name=name) for custid, name in customers]
+
+        linker = Linker(key_left="custid")
+        lookup = linker.dict_from_list(customers)
+        linker.link(lookup, orders, attrname_on_left="orders", key_right=1)
+        self.assertEqual([(2000, 2, 0), (2001, 2, 1)], lookup[2]["orders"])
+
+    def test_speed(self):
+        """side links on tuples against dicts and link"""
+        size = 100000
+        customers = [(custid, "customer %s" % (custid)) for custid in range(size // 10)]
+        orders = [(ix, ix % len(customers), ix % 7) for ix in range(size)]
+
+        start = time()
+        linker = Linker(key_left=0)
+        lookup = linker.dict_from_list(customers)
+        linker.link_keys(lookup, iter(orders), key_right=1)
+        duration_tuples = time() - start
+
+        start = time()
+        customers = [dict(zip(["custid", "name"], row)) for row in customers]
+        orders = [dict(zip(["order_id", "custid", "qty"], row)) for row in orders]
+        linker = Linker(key_left="custid")
+        lookup = linker.dict_from_list(customers)
+        linker.link(lookup, orders, attrname_on_left="orders")
+        duration_dicts = time() - start
+
+        print(
+            "%s orders linked in %.3f seconds as tuples, %.3f as dicts"
+            % (len(orders), duration_tuples, duration_dicts)
+        )
+
+
 if __name__ == "__main__":
     # conditional debugging, but not in nosetests
     if "--pdb" in sys.argv:
@@ -13,8 +13,34 @@ with unittests argument expectations.
 """
 
 import unittest
-
-from pynoorm.binder import Binder, PARAMSTYLE_SQLSERVER
+from collections import defaultdict, OrderedDict
+from time import time
+from decimal import Decimal
+
+from pynoorm.binder import (
+    Binder,
+    PARAMSTYLE_SQLSERVER,
+    BUCKETS_POW2,
+    PAD_NULL,
+    execute_chunks,
+    DEFAULT_FETCH_SIZE,
+    LIST_ARRAY,
+    LIST_VALUES,
+    LIST_TEMPTABLE,
+    plan_accessor,
+    ListStrategy,
+    TemplateCache,
+    AdapterRegistry,
+    normalize_sql,
+    LIST_EXPAND,
+    _MISSING,
+    tokenize,
+    TOKEN_LITERAL,
+    TOKEN_BIND,
+    TOKEN_LIST,
+    TOKEN_OPEN,
+    TOKEN_CLOSE,
+)
 
 import logging
 
@@ -1043,6 +1069,54 @@ class DryRunTest_MSSQL(BinderHelper, unittest.TestCase):
     type_sub = tuple
 
 
+class DryRunTest_Numeric(BinderHelper, unittest.TestCase):
+    """test numeric/positional handling
+       currently not executing sql however, just formatting"""
+
+    paramstyle = "numeric"
+    type_sub = tuple
+
+
+class Test_Numeric(unittest.TestCase):
+    """numeric binds pass each distinct value once"""
+
+    tqry = """select * from orders
+              where custid = %(custid)s
+              and status in (%(status_list)l)
+              and (ordernum = %(ordernum)s or %(custid)s = 'ALL')"""
+
+    def test_dedupe(self):
+        binder = Binder.factory("numeric")
+
+        qry, sub = binder.format(
+            self.tqry, dict(custid="ACME", ordernum=3, status_list=["A", "B"])
+        )
+
+        self.assertTrue("custid = :1" in qry)
+        self.assertTrue("in (:2, :3)" in qry)
+        self.assertTrue("ordernum = :4 or :1 = 'ALL'" in qry)
+        self.assertEqual(("ACME", "A", "B", 3), sub)
+
+    def test_dollar(self):
+        binder = Binder.factory("dollar")
+
+        qry, sub = binder.format(
+            self.tqry, dict(custid="ACME", ordernum=3, status_list=[])
+        )
+        self.assertTrue("custid = $1" in qry)
+        self.assertTrue("in (NULL)" in qry)
+        self.assertTrue("ordernum = $2 or $1 = 'ALL'" in qry)
+        self.assertEqual(("ACME", 3), sub)
+
+    def test_case_insensitive(self):
+        binder = Binder.factory("numeric", case_insensitive=True)
+
+        qry, sub = binder.format(
+            self.tqry, dict(CUSTID="ACME", ORDERNUM=3, STATUS_LIST=["A"])
+        )
+        self.assertEqual(("ACME", "A", 3), sub)
+
+
 class CaseInsensitiveMixin(object):
     def test_i03_repeated_insensitive(self):
         """...supports repeated use of the same bind parameter"""
@@ -1163,6 +1237,1647 @@ class DryRunTest_MSSQL_CaseInsensitive(
     case_insensitive = True
 
 
+class Test_TemplateCache(unittest.TestCase):
+    """compiled query templates are cached per Binder"""
+
+    tqry = """select * from orders
+              where custid = %(custid)s and status in (%(status_list)l)"""
+
+    def test_hit_miss(self):
+        binder = Binder.factory("named")
+
+        qry1, sub1 = binder.format(self.tqry, dict(custid="ACME", status_list=["A"]))
+        qry2, sub2 = binder.format(self.tqry, dict(custid="ACME", status_list=["A"]))
+
+        self.assertEqual(qry1, qry2)
+        self.assertEqual(sub1, sub2)
+
+        stats = binder.cache.stats()
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["size"])
+
+    def test_list_lengths(self):
+        """...each list length gets its own rendering of the same compiled template"""
+        binder = Binder.factory("qmark")
+
+        for li in [["A"], ["A", "B"], ["C"], []]:
+            qry, sub = binder.format(self.tqry, dict(custid="ACME", status_list=li))
+            self.assertEqual(tuple(["ACME"] + li), sub)
+            if li:
+                self.assertTrue("(%s)" % ", ".join(["?"] * len(li)) in qry)
+            else:
+                self.assertTrue("(NULL)" in qry)
+
+        compiled = binder.compile(self.tqry)
+        self.assertEqual(set([(1,), (2,), (0,)]), set(compiled.variants.keys()))
+        self.assertEqual(1, binder.cache.stats()["misses"])
+
+    def test_eviction(self):
+        binder = Binder.factory("qmark", cache_size=2)
+
+        for custid in range(4):
+            binder.format("select %d from orders where custid = %%(custid)s" % custid, locals())
+
+        stats = binder.cache.stats()
+        self.assertEqual(2, stats["size"])
+        self.assertEqual(4, stats["misses"])
+        self.assertEqual(2, stats["evictions"])
+
+        # least recently used went first
+        binder.format("select 3 from orders where custid = %(custid)s", locals())
+        self.assertEqual(1, binder.cache.stats()["hits"])
+
+        # hits move templates to the most recently used end, without the lock
+        binder = Binder.factory("qmark", cache_size=2)
+        tqry = "select %d from orders where custid = %%(custid)s"
+        for ix in [0, 1, 0, 2]:
+            binder.format(tqry % ix, locals())
+        self.assertEqual([tqry % 0, tqry % 2], list(binder.cache._di.keys()))
+
+    def test_disabled(self):
+        binder = Binder.factory("pyformat", cache_size=0)
+
+        for _ in range(3):
+            qry, sub = binder.format(self.tqry, dict(custid="ACME", status_list=["A"]))
+            self.assertEqual(dict(custid="ACME", status_list_000__="A"), sub)
+
+        stats = binder.cache.stats()
+        self.assertEqual(0, stats["size"])
+        self.assertEqual(3, stats["misses"])
+
+
+class Test_FormatMany(unittest.TestCase):
+    """Binder.format_many parses once and binds a batch of rows"""
+
+    def get_rows(self, count=10):
+        return [dict(ordernum=ordernum, sku="sku.%s" % (ordernum)) for ordernum in range(count)]
+
+    def test_sqlite3_executemany(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+
+        defaults = dict(custid="ACME", qty=1, status=BinderHelper.status_pending)
+
+        binder = Binder.factory(sqlite3.paramstyle)
+        qry, li_sub = binder.format_many(TQRY_INS_ORDERS, self.get_rows(), defaults)
+
+        self.assertTrue("?" in qry)
+        cursor.executemany(qry, li_sub)
+
+        cursor.execute("select custid, ordernum, sku from orders order by ordernum")
+        res = cursor.fetchall()
+        self.assertEqual(10, len(res))
+        self.assertEqual(("ACME", 9, "sku.9"), res[-1])
+
+        # and the template was only parsed the once
+        self.assertEqual(1, binder.cache.stats()["misses"])
+        conn.close()
+
+    def test_named(self):
+        binder = Binder.factory("named")
+        defaults = dict(custid="ACME", qty=1, status=BinderHelper.status_pending)
+
+        qry, li_sub = binder.format_many(TQRY_INS_ORDERS, self.get_rows(3), defaults)
+        self.assertTrue(":ordernum" in qry)
+
+        li_sub = list(li_sub)
+        self.assertEqual(3, len(li_sub))
+        self.assertEqual(
+            dict(custid="ACME", ordernum=2, sku="sku.2", qty=1, status="pending"),
+            li_sub[2],
+        )
+
+    def test_lazy(self):
+        """...rows are only looked up as parameters are consumed"""
+        binder = Binder.factory("qmark")
+
+        def rows():
+            yield dict(custid="ACME")
+            raise AssertionError("should not have been reached")
+
+        qry, li_sub = binder.format_many("select * from orders where custid = %(custid)s", rows())
+        self.assertEqual(("ACME",), next(li_sub))
+
+    def test_list_lengths(self):
+        binder = Binder.factory("qmark")
+
+        tqry = "select * from orders where custid = %(custid)s and status in (%(status_list)l)"
+        rows = [dict(status_list=["A", "B"]), dict(status_list=["C", "D"])]
+
+        qry, li_sub = binder.format_many(tqry, rows, dict(custid="ACME"))
+        self.assertTrue("(?, ?)" in qry)
+        self.assertEqual([("ACME", "A", "B"), ("ACME", "C", "D")], list(li_sub))
+
+        rows.append(dict(status_list=["E"]))
+        qry, li_sub = binder.format_many(tqry, rows, dict(custid="ACME"))
+        self.assertRaises(ValueError, list, li_sub)
+
+
+class Test_Threads(unittest.TestCase):
+    """a single Binder shared by many threads gives the same results as serial use"""
+
+    threads = 8
+    loops = 300
+
+    tqry_list = """select * from orders
+                   where custid = %(custid)s
+                   and status in (%(status_list)l)
+                   and ordernum > %(ordernum)s"""
+
+    def get_work(self, seed):
+        li = []
+        for ix in range(self.loops):
+            ordernum = seed * self.loops + ix
+            status_list = ["S%s" % (cntr) for cntr in range(ordernum % 5)]
+            custid = "CUST%s" % (seed)
+            # a few distinct templates to exercise the cache
+            tqry = self.tqry_list + " and qty > %s" % (ix % 7)
+            li.append((tqry, dict(status_list=status_list, ordernum=ordernum), custid))
+        return li
+
+    def run_paramstyle(self, paramstyle):
+        import threading
+
+        # small cache, so evictions happen under contention too
+        binder = Binder.factory(paramstyle, cache_size=4)
+
+        works = [self.get_work(seed) for seed in range(self.threads)]
+
+        def bind(work):
+            li = []
+            for tqry, di, custid in work:
+                arg = BasicArgument()
+                arg.custid = custid
+                li.append(binder.format(tqry, di, arg))
+            return li
+
+        exp = [bind(work) for work in works]
+
+        got = [None] * self.threads
+        errors = []
+        start = threading.Event()
+
+        def run(ix):
+            try:
+                start.wait()
+                got[ix] = bind(works[ix])
+            except (Exception,) as e:
+                errors.append(e)
+
+        li_thread = [threading.Thread(target=run, args=(ix,)) for ix in range(self.threads)]
+        for thread in li_thread:
+            thread.start()
+        start.set()
+        for thread in li_thread:
+            thread.join()
+
+        self.assertEqual([], errors)
+        for ix in range(self.threads):
+            self.assertEqual(exp[ix], got[ix], "%s thread %s" % (paramstyle, ix))
+
+    def test_contention(self):
+        for paramstyle in ["qmark", "named", "pyformat", "format"]:
+            self.run_paramstyle(paramstyle)
+
+
+class Test_ListBuckets(unittest.TestCase):
+    """list binds can be padded to a few bucket sizes"""
+
+    tqry = "select * from orders where ordernum in (%(li)l)"
+
+    def test_pow2(self):
+        binder = Binder.factory("qmark", list_buckets=BUCKETS_POW2)
+
+        qry, sub = binder.format(self.tqry, dict(li=[1, 2, 3]))
+        self.assertTrue("(?, ?, ?, ?)" in qry)
+        self.assertEqual((1, 2, 3, 3), sub)
+
+        for length in range(1, 65):
+            binder.format(self.tqry, dict(li=list(range(length))))
+
+        # 64 lengths, but only 1, 2, 4, 8, 16, 32, 64
+        self.assertEqual(7, len(binder.compile(self.tqry).variants))
+
+        stats = binder.list_bucket_stats()
+        self.assertEqual(64, stats["raw"])
+        self.assertEqual(7, stats["texts"])
+        self.assertEqual(57, stats["saved"])
+        self.assertTrue(stats["padded_values"] > 0)
+
+        # the lengths recorded are bounded
+        compiled = binder.compile(self.tqry)
+        compiled.MAX_RAW_LENGTHS = 100
+        for length in range(1, 300):
+            binder.format(self.tqry, dict(li=list(range(length))))
+        self.assertEqual(100, len(compiled.raw_lengths))
+        self.assertEqual(100, binder.list_bucket_stats()["raw"])
+
+    def test_ladder_null(self):
+        binder = Binder.factory("named", list_buckets=[10, 5], list_pad=PAD_NULL)
+
+        qry, sub = binder.format(self.tqry, dict(li=[1, 2]))
+        self.assertEqual(5, len(sub))
+        self.assertEqual(None, sub["li_004__"])
+
+        qry, sub = binder.format(self.tqry, dict(li=list(range(7))))
+        self.assertEqual(10, len(sub))
+
+        # past the ladder: multiples of the largest size
+        qry, sub = binder.format(self.tqry, dict(li=list(range(11))))
+        self.assertEqual(20, len(sub))
+
+        # empty lists are unaffected
+        qry, sub = binder.format(self.tqry, dict(li=[]))
+        self.assertTrue("(NULL)" in qry)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Binder.factory, "qmark", list_buckets=[0, 4])
+        self.assertRaises(ValueError, Binder.factory, "qmark", list_pad="zero")
+
+    def test_sqlite3(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+        cursor.executemany(
+            "insert into orders(custid, ordernum) values ('ACME', ?)",
+            [(ordernum,) for ordernum in range(10)],
+        )
+
+        for pad in ["last", "null"]:
+            binder = Binder.factory("qmark", list_buckets=BUCKETS_POW2, list_pad=pad)
+            qry, sub = binder.format(self.tqry, dict(li=[1, 2, 5]))
+            cursor.execute(qry, sub)
+            self.assertEqual([1, 2, 5], sorted([row[1] for row in cursor.fetchall()]))
+        conn.close()
+
+
+class Test_Chunks(unittest.TestCase):
+    """oversized list binds are split to fit the database's limits"""
+
+    tqry = """select * from orders
+              where custid = %(custid)s
+              and ordernum in (%(li_ordernum)l)"""
+
+    def test_fits(self):
+        binder = Binder.factory("named")
+        li = list(binder.format_chunks(self.tqry, dict(custid="ACME", li_ordernum=[1, 2])))
+        self.assertEqual(1, len(li))
+        self.assertEqual(
+            binder.format(self.tqry, dict(custid="ACME", li_ordernum=[1, 2])), li[0]
+        )
+
+    def test_oracle_list_size(self):
+        binder = Binder.factory("named")
+        li_ordernum = list(range(2500))
+
+        li = list(
+            binder.format_chunks(self.tqry, dict(custid="ACME", li_ordernum=li_ordernum))
+        )
+
+        self.assertEqual([1001, 1001, 501], [len(sub) for qry, sub in li])
+        # full chunks share the same query text
+        self.assertEqual(li[0][0], li[1][0])
+
+        got = []
+        for qry, sub in li:
+            self.assertEqual("ACME", sub["custid"])
+            got.extend(
+                [value for key, value in sorted(sub.items()) if key.startswith("li_ordernum")]
+            )
+        self.assertEqual(li_ordernum, got)
+
+    def test_max_params(self):
+        """...a list repeated in the template counts once per use with qmark"""
+        binder = Binder.factory("qmark", max_params=100)
+
+        tqry = self.tqry + " or qty in (%(li_ordernum)l)"
+        li = list(binder.format_chunks(tqry, dict(custid="ACME", li_ordernum=list(range(200)))))
+
+        for qry, sub in li:
+            self.assertTrue(len(sub) <= 100)
+        self.assertEqual(5, len(li))
+
+    def test_buckets(self):
+        binder = Binder.factory("qmark", list_buckets=BUCKETS_POW2)
+
+        li = list(
+            binder.format_chunks(self.tqry, dict(custid="ACME", li_ordernum=list(range(1500))))
+        )
+        # 512 fits in 999 parameters, 1024 would not
+        self.assertEqual([513, 513, 513], [len(sub) for qry, sub in li])
+
+    def test_too_many_lists(self):
+        binder = Binder.factory("named")
+
+        tqry = self.tqry + " and status in (%(li_status)l)"
+        li = list(range(2000))
+        self.assertRaises(
+            ValueError,
+            binder.format_chunks,
+            tqry,
+            dict(custid="ACME", li_ordernum=li, li_status=li),
+        )
+
+    def test_sqlite3(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+        cursor.executemany(
+            "insert into orders(custid, ordernum) values ('ACME', ?)",
+            [(ordernum,) for ordernum in range(5000)],
+        )
+
+        binder = Binder.factory(sqlite3.paramstyle)
+        li_ordernum = list(range(0, 5000, 2))
+
+        chunks = binder.format_chunks(
+            "select ordernum from orders where ordernum in (%(li_ordernum)l)", locals()
+        )
+        rows = list(execute_chunks(cursor, chunks))
+
+        self.assertEqual(li_ordernum, sorted([row[0] for row in rows]))
+
+        # fetched DEFAULT_FETCH_SIZE rows at a time, not the cursor's arraysize of 1
+        class Cursor(object):
+            def __init__(self, cursor):
+                self.cursor = cursor
+                self.sizes = []
+
+            def execute(self, qry, sub):
+                self.cursor.execute(qry, sub)
+
+            def fetchmany(self, size=1):
+                self.sizes.append(size)
+                return self.cursor.fetchmany(size)
+
+        counting = Cursor(cursor)
+        chunks = binder.format_chunks(
+            "select ordernum from orders where ordernum in (%(li_ordernum)l)", locals()
+        )
+        self.assertEqual(len(rows), len(list(execute_chunks(counting, chunks))))
+        self.assertEqual(set([DEFAULT_FETCH_SIZE]), set(counting.sizes))
+        self.assertTrue(len(counting.sizes) < 10)
+        conn.close()
+
+
+class Test_ListStrategy(unittest.TestCase):
+    """large list binds can be rendered without one bind per value"""
+
+    tqry = "select ordernum from orders where ordernum in (%(li_ordernum)l)"
+
+    @classmethod
+    def setUpClass(cls):
+        import sqlite3
+
+        cls.conn = sqlite3.connect(":memory:")
+        cls.cursor = cls.conn.cursor()
+        cls.cursor.execute(Sqlite3.qry_create)
+        cls.cursor.executemany(
+            "insert into orders(custid, ordernum) values ('ACME', ?)",
+            [(ordernum,) for ordernum in range(20000)],
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cursor.close()
+        cls.conn.close()
+
+    def test_threshold(self):
+        binder = Binder.factory("pyformat", list_strategy=LIST_ARRAY, list_strategy_threshold=3)
+
+        qry, sub = binder.format(self.tqry, dict(li_ordernum=[1, 2]))
+        self.assertTrue("in (%(li_ordernum_000__)s, %(li_ordernum_001__)s)" in qry)
+
+        qry, sub = binder.format(self.tqry, dict(li_ordernum=[1, 2, 3]))
+        self.assertTrue("in (SELECT unnest(%(li_ordernum__)s))" in qry)
+        self.assertEqual(dict(li_ordernum__=[1, 2, 3]), sub)
+
+        # one query text whatever the length
+        qry2, sub = binder.format(self.tqry, dict(li_ordernum=list(range(100))))
+        self.assertEqual(qry, qry2)
+        self.assertEqual(list(range(100)), sub["li_ordernum__"])
+
+    def test_paramstyle(self):
+        self.assertRaises(ValueError, Binder.factory, "qmark", list_strategy=LIST_ARRAY)
+        self.assertRaises(ValueError, Binder.factory, "qmark", list_strategy="unknown")
+
+    def test_values(self):
+        binder = Binder.factory("qmark", list_strategy=LIST_VALUES, list_strategy_threshold=10)
+        li_ordernum = list(range(0, 1000, 3))
+
+        qry, sub = binder.format(self.tqry, locals())
+        self.assertTrue("in (VALUES (?), (?)" in qry)
+
+        self.cursor.execute(qry, sub)
+        self.assertEqual(li_ordernum, sorted([row[0] for row in self.cursor.fetchall()]))
+
+    def test_temptable(self):
+        binder = Binder.factory("qmark", list_strategy=LIST_TEMPTABLE)
+        li_ordernum = list(range(0, 20000, 2))
+
+        # the temp table needs a cursor to be loaded
+        self.assertRaises(ValueError, binder.format, self.tqry, locals())
+        self.assertRaises(ValueError, binder.format_chunks, self.tqry, locals())
+
+        cursor = binder.execute(self.cursor, self.tqry, locals())
+        self.assertEqual(li_ordernum, sorted([row[0] for row in cursor.fetchall()]))
+
+        # reloaded on each call
+        li_ordernum = [3, 5]
+        cursor = binder.execute(
+            self.cursor, self.tqry, locals(), list_strategy_threshold=1
+        )
+        self.assertEqual(li_ordernum, sorted([row[0] for row in cursor.fetchall()]))
+
+    def test_execute_per_call(self):
+        binder = Binder.factory("qmark")
+        li_ordernum = [1, 2, 3]
+
+        cursor = binder.execute(
+            self.cursor,
+            self.tqry,
+            locals(),
+            list_strategy=LIST_TEMPTABLE,
+            list_strategy_threshold=0,
+        )
+        self.assertEqual(li_ordernum, sorted([row[0] for row in cursor.fetchall()]))
+
+        # the binder's own configuration is untouched
+        qry, sub = binder.format(self.tqry, locals())
+        self.assertEqual((1, 2, 3), sub)
+
+        # strategies the binder doesn't know would change its renderings for good
+        class Custom(ListStrategy):
+            name = LIST_EXPAND
+
+        render_key = binder.render_key
+        self.assertRaises(
+            ValueError, binder.execute, self.cursor, self.tqry, locals(), list_strategy=Custom()
+        )
+        self.assertTrue(render_key is binder.render_key)
+        self.assertTrue(Binder._di_list_strategy is binder._di_list_strategy)
+
+
+class Test_Accessors(unittest.TestCase):
+    """planned accessors find the same values as arg[key], then getattr(arg, key)"""
+
+    def get_args(self):
+        class DictAttr(dict):
+            pass
+
+        class Slotted(object):
+            __slots__ = ("custid",)
+
+        class Dynamic(object):
+            def __getattr__(self, attrname):
+                if attrname == "ordernum":
+                    return "dynamic"
+                raise AttributeError(attrname)
+
+        class ClassAttr(object):
+            status = "class"
+
+        class Prop(object):
+            @property
+            def qty(self):
+                return "property"
+
+        dictattr = DictAttr(custid="dictattr")
+        dictattr.ordernum = "dictattr.attr"
+
+        slotted = Slotted()
+        slotted.custid = "slotted"
+
+        obj = BasicArgument()
+        obj.custid = "obj"
+        obj.sku = None
+
+        attrdict = AttrDict()
+        attrdict.data["sku"] = "attrdict"
+
+        return [
+            dict(custid="dict", sku=None),
+            OrderedDict(custid="ordered"),
+            defaultdict(lambda: "default"),
+            dictattr,
+            slotted,
+            Dynamic(),
+            ClassAttr(),
+            Prop(),
+            obj,
+            attrdict,
+            7,
+        ]
+
+    def generic(self, arg, key):
+        try:
+            return arg[key]
+        except (KeyError, AttributeError, TypeError):
+            return getattr(arg, key, _MISSING)
+
+    def test_same_as_generic(self):
+        for key in ["custid", "ordernum", "status", "qty", "sku", "items", "real", "nope"]:
+            for arg in self.get_args():
+                exp = self.generic(arg, key)
+                got = plan_accessor(type(arg), key)(arg)
+                self.assertEqual(exp, got, "%s.%s" % (type(arg), key))
+
+    def test_precedence(self):
+        """...an accessor plan never skips an earlier argument"""
+        binder = Binder.factory("qmark")
+        tqry = "select %(custid)s"
+
+        obj = BasicArgument()
+        obj.custid = "obj"
+
+        self.assertEqual(("obj",), binder.format(tqry, {}, obj)[1])
+        self.assertEqual(("dict",), binder.format(tqry, dict(custid="dict"), obj)[1])
+
+        first = BasicArgument()
+        self.assertEqual(("obj",), binder.format(tqry, first, obj)[1])
+        first.custid = "first"
+        self.assertEqual(("first",), binder.format(tqry, first, obj)[1])
+
+
+class Test_AccessorSpeed(unittest.TestCase):
+    """20-key template, looked up through 4 layers of arguments"""
+
+    loops = 10000
+
+    def run_it(self, plan_accessors):
+        keys = ["key%02d" % (ix) for ix in range(20)]
+        tqry = "insert into foo values (%s)" % ", ".join(["%%(%s)s" % key for key in keys])
+
+        row = BasicArgument()
+        for key in keys[:5]:
+            setattr(row, key, "row")
+        request_ctx = dict([(key, "request_ctx") for key in keys[5:10]])
+        extra = BasicArgument()
+        for key in keys[10:15]:
+            setattr(extra, key, "extra")
+        defaults = dict([(key, "defaults") for key in keys])
+
+        binder = Binder.factory("qmark")
+        binder.plan_accessors = plan_accessors
+
+        start = time()
+        for _ in range(self.loops):
+            qry, sub = binder.format(tqry, row, request_ctx, extra, defaults)
+        duration = time() - start
+
+        self.assertEqual(("row",) * 5 + ("request_ctx",) * 5, sub[:10])
+        self.assertEqual(("extra",) * 5 + ("defaults",) * 5, sub[10:])
+        return duration
+
+    def test_speed(self):
+        generic = self.run_it(False)
+        planned = self.run_it(True)
+        print(
+            "%s formats: %.3f seconds with generic accessors, %.3f planned (%.1fx)"
+            % (self.loops, generic, planned, generic / planned)
+        )
+
+
+class Test_SimpleSpeed(unittest.TestCase):
+    """the most common call:  scalar binds only, one dict argument"""
+
+    loops = 20000
+    tqry = "select * from orders where custid = %(custid)s and status = %(status)s and qty > %(qty)s"
+
+    def test_same_as_generic(self):
+        """the fast path gives what the general one does, track_types takes the latter"""
+        args = dict(custid="ACME", status="A", qty=1)
+
+        class Row(object):
+            custid = "ACME"
+            status = "A"
+
+        for paramstyle in ["qmark", "named", "numeric", "pyformat"]:
+            fast = Binder.factory(paramstyle)
+            generic = Binder.factory(paramstyle, track_types=True)
+            self.assertTrue(fast.compile(self.tqry).rendering is not None)
+            self.assertEqual(generic.format(self.tqry, args), fast.format(self.tqry, args))
+            self.assertEqual(
+                generic.format(self.tqry, Row(), dict(qty=1)), fast.format(self.tqry, Row(), dict(qty=1))
+            )
+            self.assertRaises(KeyError, fast.format, self.tqry, dict(custid="ACME"))
+
+        # a key missing from the dict goes through the usual lookup
+        binder = Binder.factory("named", case_insensitive=True)
+        qry, sub = binder.format(self.tqry, dict(CUSTID="ACME", status="A", qty=1))
+        self.assertEqual(dict(custid="ACME", status="A", qty=1), sub)
+
+        self.assertEqual(None, Binder.factory("qmark").compile("select %(li)l").rendering)
+
+    def test_speed(self):
+        args = dict(custid="ACME", status="A", qty=1, other=2)
+
+        for paramstyle in ["qmark", "named"]:
+            binder = Binder.factory(paramstyle)
+            generic = Binder.factory(paramstyle, track_types=True)
+
+            durations = []
+            for binder_ in [generic, binder]:
+                start = time()
+                for _ in range(self.loops):
+                    qry, sub = binder_.format(self.tqry, args)
+                durations.append(time() - start)
+
+            print(
+                "%s %s formats, 3 scalar binds:  %.2f us per call, %.2f us tracking types"
+                % (self.loops, paramstyle, durations[1] / self.loops * 1e6, durations[0] / self.loops * 1e6)
+            )
+
+
+class Test_CaseFolding(unittest.TestCase):
+    """case-insensitive binders also match mixed-case keys"""
+
+    tqry = "select * from orders where custid = %(custid)s and ordernum = %(OrderNum)s"
+
+    def test_mixed_case(self):
+        binder = Binder.factory("named", case_insensitive=True)
+
+        # i.e. a SQL Server row
+        row = dict(CustId="ACME", ORDERNUM=3)
+        qry, sub = binder.format(self.tqry, row)
+        self.assertEqual(dict(custid="ACME", OrderNum=3), sub)
+
+    def test_exact_first(self):
+        """...an exact match in a later argument beats a case variant in an earlier one"""
+        binder = Binder.factory("qmark", case_insensitive=True)
+
+        qry, sub = binder.format(self.tqry, dict(CUSTID="upper", ordernum=1), dict(custid="exact"))
+        self.assertEqual(("exact", 1), sub)
+
+    def test_objects(self):
+        binder = Binder.factory("qmark", case_insensitive=True)
+
+        class Row(object):
+            @property
+            def ORDERNUM(self):
+                return 5
+
+        row = Row()
+        row.CustID = "ACME"
+
+        qry, sub = binder.format(self.tqry, row)
+        self.assertEqual(("ACME", 5), sub)
+
+    def test_case_sensitive(self):
+        binder = Binder.factory("qmark")
+        self.assertRaises(KeyError, binder.format, self.tqry, dict(CustId="ACME", OrderNum=3))
+
+    def test_format_many(self):
+        """...the folded index of each row is rebuilt, the defaults' are reused"""
+        binder = Binder.factory("qmark", case_insensitive=True)
+
+        rows = [dict(CUSTID="ACME"), dict(CustId="AMAZON")]
+        qry, li_sub = binder.format_many(self.tqry, rows, dict(ORDERNUM=1))
+        self.assertEqual([("ACME", 1), ("AMAZON", 1)], list(li_sub))
+
+
+class Test_Tokenize(unittest.TestCase):
+    """templates are split into literal and bind tokens in a single pass"""
+
+    def test_tokens(self):
+        tqry = "select * from orders where sku like 'A%%' and custid = %(custid)s and ordernum in (%(li)l)"
+
+        self.assertEqual(
+            [
+                (TOKEN_LITERAL, "select * from orders where sku like 'A%' and custid = "),
+                (TOKEN_BIND, "custid"),
+                (TOKEN_LITERAL, " and ordernum in ("),
+                (TOKEN_LIST, "li"),
+                (TOKEN_LITERAL, ")"),
+            ],
+            tokenize(tqry),
+        )
+
+    def test_edges(self):
+        self.assertEqual([], tokenize(""))
+        self.assertEqual([(TOKEN_BIND, "a"), (TOKEN_BIND, "b")], tokenize("%(a)s%(b)s"))
+        self.assertEqual([(TOKEN_BIND, "f(x)")], tokenize("%(f(x))s"))
+
+    def test_invalid(self):
+        for tqry in ["100% sure", "%(custid)d", "%(custid", "%(custid)", "trailing %"]:
+            self.assertRaises(ValueError, tokenize, tqry)
+
+    def test_percent_per_paramstyle(self):
+        """...a literal %% stays escaped for pyformat only"""
+        tqry = "select * from orders where sku like 'A%%' and custid = %(custid)s"
+        di = dict(custid="ACME")
+
+        qry, sub = Binder.factory("pyformat").format(tqry, di)
+        self.assertEqual(tqry, qry)
+
+        qry, sub = Binder.factory("named").format(tqry, di)
+        self.assertEqual("select * from orders where sku like 'A%' and custid = :custid", qry)
+
+    def test_many_lists(self):
+        """...a large generated template with many list binds"""
+        binder = Binder.factory("named")
+
+        count = 500
+        tqry = " union all ".join(
+            ["select %s from orders where ordernum in (%%(li%s)l)" % (ix, ix) for ix in range(count)]
+        )
+        di = dict([("li%s" % (ix), [ix, ix + 1]) for ix in range(count)])
+
+        qry, sub = binder.format(tqry, di)
+        self.assertEqual(2 * count, len(sub))
+        self.assertTrue("in (:li499_000__, :li499_001__)" in qry)
+        self.assertFalse("%" in qry)
+
+
+class Test_ListOptimize(unittest.TestCase):
+    """list_optimize dedupes, sorts and collapses integer runs into BETWEEN"""
+
+    tqry = "select ordernum from orders where ordernum in (%(li_ordernum)l)"
+
+    def test_dedupe_sort(self):
+        binder = Binder.factory("qmark", list_optimize=True)
+
+        tqry = "select * from orders where custid in (%(li_custid)l)"
+        qry, sub = binder.format(tqry, dict(li_custid=set(["b", "c", "a"])))
+        self.assertEqual("select * from orders where custid in (?, ?, ?)", qry)
+        self.assertEqual(("a", "b", "c"), sub)
+
+        # can't be sorted, only deduped
+        qry, sub = binder.format(tqry, dict(li_custid=["b", 1, "b", None]))
+        self.assertEqual(("b", 1, None), sub)
+
+        # off by default
+        qry, sub = Binder.factory("qmark").format(tqry, dict(li_custid=["b", "b"]))
+        self.assertEqual(("b", "b"), sub)
+
+    def test_ranges(self):
+        binder = Binder.factory("named", list_optimize=True)
+        li_ordernum = [12, 5, 1, 2, 3, 3, 20, 11, 10]
+
+        qry, sub = binder.format(self.tqry, locals())
+        exp = (
+            "select ordernum from orders where (ordernum BETWEEN :li_ordernum_000__ "
+            "AND :li_ordernum_001__ OR ordernum BETWEEN :li_ordernum_002__ "
+            "AND :li_ordernum_003__ OR ordernum IN (:li_ordernum_004__, :li_ordernum_005__))"
+        )
+        self.assertEqual(exp, qry)
+        self.assertEqual([1, 3, 10, 12, 5, 20], [sub["li_ordernum_%03d__" % (ix)] for ix in range(6)])
+
+        # runs shorter than list_min_range stay as they are
+        binder = Binder.factory("named", list_optimize=True, list_min_range=4)
+        qry, sub = binder.format(self.tqry, locals())
+        self.assertTrue("BETWEEN" not in qry)
+        self.assertEqual(8, len(sub))
+
+    def test_not_a_predicate(self):
+        """ranges need the `expr in (...)`, otherwise values are only deduped and sorted"""
+        binder = Binder.factory("qmark", list_optimize=True)
+
+        tqry = "select ordernum from orders where ordernum in (select 0 union %(li)l) or ordernum in (%(li)l)"
+        qry, sub = binder.format(tqry, dict(li=[3, 2, 1, 1]))
+        self.assertEqual(
+            "select ordernum from orders where ordernum in (select 0 union ?, ?, ?) or ordernum in (?, ?, ?)",
+            qry,
+        )
+        self.assertEqual((1, 2, 3, 1, 2, 3), sub)
+
+        # booleans aren't integers here
+        qry, sub = binder.format(self.tqry, dict(li_ordernum=[True, False, 0, 1, 2]))
+        self.assertTrue("BETWEEN" not in qry)
+
+    def test_not_an_operand(self):
+        """only whole operands are rewritten, not a function's arguments"""
+        import sqlite3
+
+        binder = Binder.factory("qmark", list_optimize=True)
+        ids = [1, 2, 3, 4, 9]
+
+        for tqry in [
+            "select x from t where abs(x) in (%(ids)l)",
+            "select x from t where coalesce(x, y) not in (%(ids)l)",
+            "select x from t where x + y in (%(ids)l)",
+            "select x from t where x in (%(ids)l) = 0",
+        ]:
+            qry, sub = binder.format(tqry, locals())
+            self.assertTrue("BETWEEN" not in qry, qry)
+            self.assertEqual(tuple(ids), sub)
+
+        conn = sqlite3.connect(":memory:")
+        conn.execute("create table t (x integer, y integer)")
+        conn.executemany("insert into t values (?, null)", [(x,) for x in range(-5, 10)])
+        tqry = "select x from t where abs(x) in (%(ids)l) order by x"
+        qry, sub = binder.format(tqry, locals())
+        self.assertEqual(
+            [-4, -3, -2, -1, 1, 2, 3, 4, 9], [row[0] for row in conn.execute(qry, sub)]
+        )
+
+        # still rewritten after keywords, commas and parentheses
+        for tqry in [
+            "select x from t where y = 1 and x in (%(ids)l)",
+            "select x from t where (x in (%(ids)l) or y = 1)",
+            "select case when x not in (%(ids)l) then 1 end from t",
+        ]:
+            qry, sub = binder.format(tqry, locals())
+            self.assertTrue("x BETWEEN ? AND ?" in qry, qry)
+            conn.execute(qry, sub)
+        conn.close()
+
+    def test_sqlite3(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+        cursor.executemany(
+            "insert into orders(custid, ordernum) values ('ACME', ?)",
+            [(ordernum,) for ordernum in range(5000)],
+        )
+
+        li_ordernum = list(range(100, 2100)) + list(range(3000, 3010, 2)) + [4000, 100, 4000]
+        exp = sorted(set(li_ordernum))
+
+        binder = Binder.factory("qmark", list_optimize=True)
+        qry, sub = binder.format(self.tqry, locals())
+        self.assertEqual(2 + 6, len(sub))
+        cursor.execute(qry, sub)
+        self.assertEqual(exp, sorted([row[0] for row in cursor.fetchall()]))
+
+        tqry = "select ordernum from orders where ordernum not in (%(li_ordernum)l)"
+        qry, sub = binder.format(tqry, locals())
+        self.assertTrue("NOT (ordernum BETWEEN" in qry)
+        cursor.execute(qry, sub)
+        self.assertEqual(5000 - len(exp), len(cursor.fetchall()))
+
+        conn.close()
+
+    def test_format_chunks(self):
+        """ranges can't be split, lists whose singles don't fit in max_params stay plain"""
+        binder = Binder.factory("qmark", list_optimize=True)
+        li_ordernum = list(range(1, 6)) + list(range(10, 10000, 2))
+
+        got = []
+        chunks = list(binder.format_chunks(self.tqry, locals()))
+        self.assertTrue(len(chunks) > 1)
+        for qry, sub in chunks:
+            self.assertTrue(len(sub) <= binder.max_params)
+            self.assertTrue("BETWEEN" not in qry)
+            got.extend(sub)
+        self.assertEqual(sorted(set(li_ordernum)), got)
+
+        # the ranges are kept when they fit
+        li_ordernum = list(range(1, 6)) + list(range(10, 100, 2))
+        chunks = list(binder.format_chunks(self.tqry, locals()))
+        self.assertEqual(1, len(chunks))
+        self.assertTrue("BETWEEN" in chunks[0][0])
+        self.assertEqual(2 + 45, len(chunks[0][1]))
+
+
+class Test_ListRows(unittest.TestCase):
+    """lists of tuples, for compound keys"""
+
+    tqry = "select custid, ordernum from orders where (custid, ordernum) in (%(li_key)l)"
+
+    @classmethod
+    def setUpClass(cls):
+        import sqlite3
+
+        cls.conn = sqlite3.connect(":memory:")
+        cls.cursor = cls.conn.cursor()
+        cls.cursor.execute(Sqlite3.qry_create)
+        cls.cursor.executemany(
+            "insert into orders(custid, ordernum) values (?, ?)",
+            [("C%s" % (ordernum % 10), ordernum) for ordernum in range(2000)],
+        )
+
+        cls.li_key = [("C%s" % (ordernum % 10), ordernum) for ordernum in range(0, 2000, 3)]
+        # not actual orders
+        cls.li_key += [("C1", 0), ("C9", 5000)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cursor.close()
+        cls.conn.close()
+
+    def check(self, binder, tqry=None):
+        self.cursor.execute(*binder.format(tqry or self.tqry, dict(li_key=self.li_key)))
+        return sorted(self.cursor.fetchall())
+
+    def test_paramstyles(self):
+        li_key = [("C1", 1), ("C2", 2)]
+        exp = dict(
+            qmark="((?, ?), (?, ?))",
+            named="((:li_key_000__, :li_key_001__), (:li_key_002__, :li_key_003__))",
+            numeric="((:1, :2), (:3, :4))",
+            dollar="(($1, $2), ($3, $4))",
+            pyformat="((%(li_key_000__)s, %(li_key_001__)s), (%(li_key_002__)s, %(li_key_003__)s))",
+        )
+        for paramstyle, exp_in in exp.items():
+            qry, sub = Binder.factory(paramstyle).format(self.tqry, locals())
+            self.assertTrue(qry.endswith("in %s" % (exp_in)), qry)
+            self.assertEqual(4, len(sub))
+
+    def test_sqlite3(self):
+        exp = sorted(self.li_key[:-2])
+        self.assertEqual(exp, self.check(Binder.factory("qmark")))
+
+    def test_no_row_values(self):
+        binder = Binder.factory("qmark", row_values=False)
+
+        qry, sub = binder.format(self.tqry, dict(li_key=[("C1", 1), ("C2", 2)]))
+        self.assertTrue(
+            qry.endswith("where ((custid = ? AND ordernum = ?) OR (custid = ? AND ordernum = ?))")
+        )
+        self.assertEqual(("C1", 1, "C2", 2), sub)
+
+        self.assertEqual(sorted(self.li_key[:-2]), self.check(binder))
+
+        tqry = self.tqry.replace(" in ", " not in ")
+        self.assertEqual(2000 - len(self.li_key[:-2]), len(self.check(binder, tqry)))
+
+        # the columns have to match the tuples
+        tqry = "select * from orders where (custid) in (%(li_key)l)"
+        self.assertRaises(ValueError, binder.format, tqry, dict(li_key=[("C1", 1)]))
+
+    def test_chunks(self):
+        exp = sorted(self.li_key[:-2])
+
+        for row_values in [True, False]:
+            binder = Binder.factory("qmark", row_values=row_values)
+            chunks = list(binder.format_chunks(self.tqry, dict(li_key=self.li_key)))
+
+            # 2 binds per tuple
+            self.assertEqual([998, 340], [len(sub) for qry, sub in chunks])
+            got = []
+            for qry, sub in chunks:
+                self.cursor.execute(qry, sub)
+                got.extend(self.cursor.fetchall())
+            self.assertEqual(exp, sorted(got))
+
+        binder = Binder.factory("named")
+        chunks = list(binder.format_chunks(self.tqry, dict(li_key=self.li_key * 2)))
+        self.assertEqual([2000, 676], [len(sub) for qry, sub in chunks])
+
+    def test_empty(self):
+        """no tuples, as for the children of an empty set of parents"""
+        tqry_not = self.tqry.replace(" in ", " not in ")
+
+        for row_values in [True, False]:
+            binder = Binder.factory("qmark", row_values=row_values)
+            qry, sub = binder.format(self.tqry, dict(li_key=[]))
+            self.assertTrue(qry.endswith("where (1 = 0)"), qry)
+            self.assertEqual((), sub)
+            self.assertEqual([], self.check_empty(binder, self.tqry))
+            self.assertEqual(2000, len(self.check_empty(binder, tqry_not)))
+
+        # single expressions keep `in (NULL)`
+        qry, sub = binder.format("select * from orders where custid in (%(li)l)", dict(li=[]))
+        self.assertTrue(qry.endswith("in (NULL)"))
+
+    def check_empty(self, binder, tqry):
+        self.cursor.execute(*binder.format(tqry, dict(li_key=[])))
+        return self.cursor.fetchall()
+
+    def test_not_a_row(self):
+        """a function's arguments aren't a row of columns"""
+        binder = Binder.factory("qmark", row_values=False)
+        tqry = "select * from orders where coalesce(custid, ordernum) in (%(li_key)l)"
+        self.assertRaises(ValueError, binder.format, tqry, dict(li_key=[("C1", 1)]))
+
+        binder = Binder.factory("qmark")
+        qry, sub = binder.format(tqry, dict(li_key=[("C1", 1)]))
+        self.assertTrue(qry.endswith("coalesce(custid, ordernum) in ((?, ?))"), qry)
+
+    def test_invalid(self):
+        binder = Binder.factory("qmark")
+        self.assertRaises(ValueError, binder.format, self.tqry, dict(li_key=[("C1", 1), ("C2",)]))
+        self.assertRaises(ValueError, binder.format, self.tqry, dict(li_key=[("C1", 1), "C2"]))
+
+
+class Test_FormatInsert(unittest.TestCase):
+    """multi-row INSERT ... VALUES from a single row template"""
+
+    tqry = """insert into orders (custid, ordernum, sku, qty, status)
+              values (%(custid)s, %(ordernum)s, upper(%(sku)s), %(qty)s, %(status)s)"""
+
+    def get_rows(self, count):
+        li = []
+        for ordernum in range(count):
+            if ordernum % 2:
+                row = BasicArgument()
+                row.custid, row.ordernum, row.sku, row.qty = "ACME", ordernum, "sku%s" % (ordernum), ordernum % 7
+            else:
+                row = dict(custid="BETA", ordernum=ordernum, sku="sku%s" % (ordernum), qty=ordernum % 7)
+            li.append(row)
+        return li
+
+    def get_cursor(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+        return cursor
+
+    def test_sizes(self):
+        binder = Binder.factory("qmark")
+        chunks = list(binder.format_insert(self.tqry, self.get_rows(450), dict(status="new")))
+
+        # 5 binds per row, 999 max
+        self.assertEqual([995, 995, 260], [len(sub) for qry, sub in chunks])
+        self.assertEqual(199, chunks[0][0].count("upper(?)"))
+
+        # SQL Server's 1000 rows per VALUES
+        binder = Binder.factory("named")
+        chunks = list(binder.format_insert(self.tqry, self.get_rows(2500), dict(status="new")))
+        self.assertEqual([5000, 5000, 2500], [len(sub) for qry, sub in chunks])
+
+        chunks = list(
+            binder.format_insert(self.tqry, self.get_rows(5), dict(status="new"), rows_per_statement=2)
+        )
+        self.assertEqual([10, 10, 5], [len(sub) for qry, sub in chunks])
+
+        self.assertEqual([], list(binder.format_insert(self.tqry, [])))
+
+    def test_paramstyles(self):
+        rows = self.get_rows(2)
+        exp = dict(
+            qmark="(?, ?, upper(?), ?, ?), (?, ?, upper(?), ?, ?)",
+            numeric="(:1, :2, upper(:3), :4, :5), (:6, :7, upper(:8), :9, :10)",
+            named="(:custid_000__, :ordernum_000__, upper(:sku_000__), :qty_000__, :status_000__), "
+            "(:custid_001__, :ordernum_001__, upper(:sku_001__), :qty_001__, :status_001__)",
+        )
+        for paramstyle, exp_values in exp.items():
+            binder = Binder.factory(paramstyle)
+            ((qry, sub),) = list(binder.format_insert(self.tqry, rows, dict(status="new")))
+            self.assertTrue(qry.endswith("values %s" % (exp_values)), qry)
+
+    def test_shared_binds(self):
+        """binds outside of the VALUES row come from the defaults"""
+
+        tqry = self.tqry + " on conflict do nothing -- %(batch)s"
+        binder = Binder.factory("named")
+        ((qry, sub),) = list(binder.format_insert(tqry, self.get_rows(2), dict(status="new", batch=7)))
+        self.assertTrue(qry.endswith("upper(:sku_001__), :qty_001__, :status_001__) on conflict do nothing -- :batch"))
+        self.assertEqual(7, sub["batch"])
+
+    def test_invalid(self):
+        binder = Binder.factory("qmark")
+        for tqry in [
+            "update orders set qty = %(qty)s",
+            "insert into orders (qty) values (%(qty)s",
+            "insert into orders (ordernum) values (%(li)l)",
+        ]:
+            self.assertRaises(ValueError, binder.format_insert, tqry, [])
+
+    def test_sqlite3(self):
+        rows = self.get_rows(3000)
+        cursor = self.get_cursor()
+
+        start = time()
+        qry, li_sub = Binder.factory("qmark").format_many(self.tqry, rows, dict(status="new"))
+        cursor.executemany(qry, li_sub)
+        duration_many = time() - start
+        cursor.execute("select * from orders order by ordernum")
+        exp = cursor.fetchall()
+        cursor.execute("delete from orders")
+
+        start = time()
+        for qry, sub in Binder.factory("qmark").format_insert(self.tqry, rows, dict(status="new")):
+            cursor.execute(qry, sub)
+        duration = time() - start
+
+        cursor.execute("select * from orders order by ordernum")
+        self.assertEqual(exp, cursor.fetchall())
+        self.assertEqual("SKU2999", exp[-1][2])
+
+        print(
+            "%s rows: %.0f rows/sec with executemany, %.0f with format_insert"
+            % (len(rows), len(rows) / duration_many, len(rows) / duration)
+        )
+
+
+class Test_SharedCache(unittest.TestCase):
+    """binders for several databases parse each template once"""
+
+    tqry = Test_TemplateCache.tqry
+    paramstyles = ["named", "qmark", "format", "pyformat", "numeric"]
+
+    def test_factories(self):
+        di_binder = Binder.factories(self.paramstyles)
+        args = dict(custid="ACME", status_list=["A", "B"])
+
+        for paramstyle in self.paramstyles:
+            binder = di_binder[paramstyle]
+            self.assertEqual(Binder.factory(paramstyle).format(self.tqry, args), binder.format(self.tqry, args))
+            self.assertTrue(binder.cache is di_binder["named"].cache)
+
+        stats = di_binder["named"].cache.stats()
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["size"])
+
+        # the parse is shared, the renderings sit side by side
+        (parsed,) = di_binder["named"].cache.values()
+        self.assertEqual(len(self.paramstyles), len(parsed.compiled))
+        named = di_binder["named"].compile(self.tqry)
+        qmark = di_binder["qmark"].compile(self.tqry)
+        self.assertTrue(named is not qmark)
+        self.assertTrue(named.tokens is qmark.tokens)
+
+    def test_own_strategy(self):
+        """a binder with its own list strategy doesn't share renderings"""
+
+        class Custom(ListStrategy):
+            name = LIST_EXPAND
+
+            def render(self, binder, key, length, di_element):
+                return [(TOKEN_LITERAL, "select id from big_list")]
+
+        cache = TemplateCache()
+        binder = Binder.factory("qmark", cache=cache)
+        custom = Binder.factory("qmark", cache=cache, list_strategy=Custom(), list_strategy_threshold=0)
+
+        args = dict(custid="ACME", status_list=["A"])
+        qry, sub = binder.format(self.tqry, args)
+        self.assertTrue("in (?)" in qry)
+        qry, sub = custom.format(self.tqry, args)
+        self.assertTrue("in (select id from big_list)" in qry)
+
+        self.assertEqual(1, cache.stats()["misses"])
+
+    def test_insert(self):
+        di_binder = Binder.factories(self.paramstyles)
+        tqry = "insert into orders (custid, ordernum) values (%(custid)s, %(ordernum)s)"
+        rows = [dict(custid="ACME", ordernum=ordernum) for ordernum in range(3)]
+
+        for paramstyle in self.paramstyles:
+            ((qry, sub),) = list(di_binder[paramstyle].format_insert(tqry, rows))
+            self.assertEqual(6, len(sub))
+        self.assertEqual(1, di_binder["named"].cache.stats()["misses"])
+
+
+class Test_Fragments(unittest.TestCase):
+    """%[ ... %] fragments are only included when their binds are set"""
+
+    tqry = """select custid, ordernum from orders
+              where 1 = 1
+              %[ and custid = %(custid)s %]
+              %[ and status in (%(li_status)l) %[ and qty >= %(qty)s %] %]
+              order by ordernum"""
+
+    def test_tokens(self):
+        self.assertEqual(
+            [(TOKEN_LITERAL, "a "), (TOKEN_OPEN, ""), (TOKEN_LITERAL, "and b = "), (TOKEN_BIND, "b"), (TOKEN_CLOSE, "")],
+            tokenize("a %[and b = %(b)s%]"),
+        )
+
+        binder = Binder.factory("qmark")
+        for tqry in ["select %[ 1", "select 1 %]", "select %[ %] %] 1"]:
+            self.assertRaises(ValueError, binder.format, tqry)
+
+    def test_shapes(self):
+        binder = Binder.factory("named")
+
+        qry, sub = binder.format(self.tqry, dict(custid="ACME", li_status=[], qty=3))
+        self.assertTrue("and custid = :custid" in qry)
+        self.assertFalse("status" in qry or "qty" in qry)
+        self.assertEqual(dict(custid="ACME"), sub)
+
+        # missing, None and "" all mean unset, 0 doesn't
+        for custid in [None, ""]:
+            qry, sub = binder.format(self.tqry, dict(custid=custid, li_status=["A"], qty=0))
+            self.assertFalse("custid =" in qry)
+            self.assertTrue("and status in (:li_status_000__)  and qty >= :qty" in qry)
+            self.assertEqual(dict(li_status_000__="A", qty=0), sub)
+
+        # a nested fragment needs its enclosing one
+        qry, sub = binder.format(self.tqry, dict(qty=3))
+        self.assertFalse("qty" in qry)
+
+        # one plan per combination
+        compiled = binder.compile(self.tqry)
+        self.assertEqual(
+            set([(True, False, False), (False, True, True), (False, False, False)]),
+            set(compiled.shapes.keys()),
+        )
+
+        qry2, sub2 = binder.format(self.tqry, dict(custid="BETA"))
+        self.assertEqual(3, len(compiled.shapes))
+        self.assertTrue(compiled.shapes[(True, False, False)].variants[()].qry is qry2)
+
+    def test_shapes_lru(self):
+        """the least recently used shapes go first, the hot ones stay"""
+        binder = Binder.factory("named")
+        compiled = binder.compile(self.tqry)
+        compiled.MAX_VARIANTS = 2
+
+        hot = dict(custid="ACME")
+        binder.format(self.tqry, hot)
+        binder.format(self.tqry, dict(li_status=["A"]))
+        binder.format(self.tqry, hot)
+        binder.format(self.tqry, dict(li_status=["A"], qty=1))
+
+        self.assertEqual(2, len(compiled.shapes))
+        self.assertTrue((True, False, False) in compiled.shapes)
+        self.assertFalse((False, True, False) in compiled.shapes)
+
+    def test_bucket_stats(self):
+        """lists in fragments are counted, shape by shape"""
+        binder = Binder.factory("qmark", list_buckets=BUCKETS_POW2)
+        for length in range(1, 9):
+            binder.format(self.tqry, dict(li_status=list(range(length))))
+
+        stats = binder.list_bucket_stats()
+        self.assertEqual(8, stats["raw"])
+        self.assertEqual(4, stats["texts"])
+
+    def test_sqlite3(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor()
+        cursor.execute(Sqlite3.qry_create)
+        cursor.executemany(
+            "insert into orders(custid, ordernum, status, qty) values (?, ?, ?, ?)",
+            [("C%s" % (ordernum % 3), ordernum, "AB"[ordernum % 2], ordernum) for ordernum in range(30)],
+        )
+
+        binder = Binder.factory("qmark")
+
+        def search(**kwds):
+            cursor.execute(*binder.format(self.tqry, kwds))
+            return [row[1] for row in cursor.fetchall()]
+
+        self.assertEqual(list(range(30)), search())
+        self.assertEqual(list(range(1, 30, 3)), search(custid="C1", qty=20))
+        self.assertEqual([21, 23, 25, 27, 29], search(li_status=["B"], qty=20))
+        self.assertEqual([0, 6, 12, 18, 24], search(custid="C0", li_status=["A"], qty=None))
+
+        conn.close()
+
+    def test_format_many(self):
+        binder = Binder.factory("qmark")
+        tqry = "update orders set status = %(status)s where 1 = 1 %[ and custid = %(custid)s %]"
+
+        qry, li_sub = binder.format_many(tqry, [dict(status="A"), dict(status="B")])
+        self.assertFalse("custid" in qry)
+        self.assertEqual([("A",), ("B",)], list(li_sub))
+
+        qry, li_sub = binder.format_many(tqry, [dict(status="A", custid=1), dict(status="B")])
+        self.assertRaises(ValueError, list, li_sub)
+
+        self.assertRaises(
+            ValueError, binder.format_insert, "insert into orders (qty) values (%(qty)s) %[ %]", []
+        )
+
+
+class Test_BoundTemplate(unittest.TestCase):
+    """binder.bind(tqry, *pinned) looks up the pinned arguments only once"""
+
+    tqry = """select * from orders
+              where custid = %(custid)s and status in (%(li_status)l)
+              %[ and qty >= %(qty)s %] and sku like %(sku)s"""
+
+    def get_pinned(self):
+        request_ctx = BasicArgument()
+        request_ctx.custid = "ACME"
+        request_ctx.li_status = ["A", "B"]
+        defaults = dict(custid="DEFAULT", qty=None, sku="%", li_status=["X"])
+        return request_ctx, defaults
+
+    def test_same_as_format(self):
+        pinned = self.get_pinned()
+
+        for paramstyle in ["named", "qmark", "numeric"]:
+            binder = Binder.factory(paramstyle)
+            bound = binder.bind(self.tqry, *pinned)
+
+            for row in [{}, dict(custid="ROW"), dict(qty=5, li_status=["C"]), dict(sku="A%")]:
+                self.assertEqual(binder.format(self.tqry, row, *pinned), bound(row))
+                self.assertEqual(binder.format(self.tqry, row, *pinned), bound.format(row))
+
+        self.assertRaises(KeyError, Binder.factory("qmark").bind("select %(nope)s", *pinned))
+
+    def test_pinned_once(self):
+        request_ctx, defaults = self.get_pinned()
+        bound = Binder.factory("qmark").bind(self.tqry, request_ctx, defaults)
+
+        qry, sub = bound(dict(qty=1))
+        self.assertEqual("ACME", sub[0])
+
+        # pinned values are kept...
+        request_ctx.custid = "CHANGED"
+        qry, sub = bound(dict(qty=1))
+        self.assertEqual("ACME", sub[0])
+
+        # ...but the call's arguments are looked up each time
+        self.assertEqual("ROW", bound(dict(custid="ROW"))[1][0])
+
+        qry, li_sub = bound.format_many([dict(qty=1), dict(qty=2)])
+        self.assertEqual([1, 2], [sub[3] for sub in li_sub])
+
+    def test_case_insensitive(self):
+        """exact keys first across all the arguments, then case-folded ones"""
+        binder = Binder.factory("qmark", case_insensitive=True)
+        tqry = "select %(custid)s, %(sku)s"
+        pinned = (dict(CUSTID="pinned", SKU="pinned"), dict(custid="exact"))
+
+        for row in [{}, dict(CustId="row"), dict(custid="row")]:
+            self.assertEqual(binder.format(tqry, row, *pinned), binder.bind(tqry, *pinned)(row))
+
+    def test_speed(self):
+        keys = ["key%02d" % (ix) for ix in range(20)]
+        tqry = "insert into foo values (%s)" % ", ".join(["%%(%s)s" % key for key in keys])
+
+        row = dict([(key, "row") for key in keys[:5]])
+        request_ctx = BasicArgument()
+        for key in keys[5:10]:
+            setattr(request_ctx, key, "request_ctx")
+        defaults = dict([(key, "defaults") for key in keys])
+
+        binder = Binder.factory("qmark")
+        bound = binder.bind(tqry, request_ctx, defaults)
+        loops = 10000
+
+        start = time()
+        for _ in range(loops):
+            exp = binder.format(tqry, row, request_ctx, defaults)
+        duration = time() - start
+
+        start = time()
+        for _ in range(loops):
+            got = bound(row)
+        duration_bound = time() - start
+
+        self.assertEqual(exp, got)
+        print(
+            "%s formats: %.3f seconds with format, %.3f bound (%.1fx)"
+            % (loops, duration, duration_bound, duration / duration_bound)
+        )
+
+
+class Test_TypeTracking(unittest.TestCase):
+    """types bound per template and key, hints and type churn"""
+
+    tqry = "select * from orders where custid = %(custid)s and qty >= %(qty)s and ordernum in (%(li)l)"
+
+    def test_off(self):
+        binder = Binder.factory("qmark")
+        binder.format(self.tqry, dict(custid="A", qty=1, li=[1]))
+        self.assertTrue(binder.compile(self.tqry).type_tracker is None)
+        self.assertEqual([], binder.type_stats())
+
+    def test_churn(self):
+        binder = Binder.factory("named", track_types=True)
+
+        for custid, qty in [("A", 1), ("B", 2), (None, 3), ("C", Decimal("4.5")), ("D", Decimal(5))]:
+            binder.format(self.tqry, dict(custid=custid, qty=qty, li=[1, 2]))
+        binder.format("select %(custid)s", dict(custid="A"))
+
+        stats = binder.type_stats()
+        self.assertEqual(2, len(stats))
+        stats = stats[0]
+        self.assertEqual(self.tqry, stats["tqry"])
+        self.assertEqual(5, stats["calls"])
+        self.assertEqual(3, stats["changes"])
+
+        custid = stats["keys"]["custid"]
+        self.assertEqual(2, custid["changes"])
+        self.assertEqual(str, custid["hint"])
+        self.assertEqual({str: 4, type(None): 1}, custid["types"])
+
+        # int widened to Decimal
+        self.assertEqual(Decimal, stats["keys"]["qty"]["hint"])
+        self.assertEqual({int: 10}, stats["keys"]["li"]["types"])
+
+    def test_coerce(self):
+        binder = Binder.factory("qmark", coerce_types=True)
+
+        qry, sub = binder.format(self.tqry, dict(custid="A", qty=Decimal("1.5"), li=[1]))
+        qry, sub = binder.format(self.tqry, dict(custid="A", qty=2, li=[1]))
+        self.assertEqual(Decimal, type(sub[1]))
+        self.assertEqual(Decimal(2), sub[1])
+
+        # lossy conversions are left alone
+        qry, sub = binder.format(self.tqry, dict(custid=1, qty=None, li=[1.5]))
+        self.assertEqual((1, None, 1.5), sub)
+
+        # integers too big to be exact as floats stay integers
+        qry, sub = binder.format(self.tqry, dict(custid="A", qty=2, li=[2 ** 60 + 1]))
+        self.assertEqual(2 ** 60 + 1, sub[2])
+        self.assertEqual(int, type(sub[2]))
+        qry, sub = binder.format(self.tqry, dict(custid="A", qty=2, li=[-(2 ** 53)]))
+        self.assertEqual(float, type(sub[2]))
+
+    def test_input_sizes(self):
+        binder = Binder.factory("qmark")
+        binder.format_input_sizes(self.tqry, dict(custid="A", qty=1, li=[1, 2]))
+        qry, sub, sizes = binder.format_input_sizes(self.tqry, dict(custid=None, qty=None, li=[3]))
+        self.assertEqual((None, None, 3), sub)
+        self.assertEqual((str, int, int), sizes)
+
+        binder = Binder.factory("named")
+        qry, sub, sizes = binder.format_input_sizes(self.tqry, dict(custid="A", qty=1, li=[1, 2]))
+        self.assertEqual(dict(custid=str, qty=int, li_000__=int, li_001__=int), sizes)
+
+    def test_execute(self):
+        class Cursor(object):
+            def setinputsizes(self, *args, **kwds):
+                self.sizes = (args, kwds)
+
+            def execute(self, qry, sub):
+                self.executed = (qry, sub)
+
+        binder = Binder.factory("named")
+        cursor = binder.execute(Cursor(), self.tqry, dict(custid="A", qty=1, li=[1]), input_sizes=True)
+        self.assertEqual(((), dict(custid=str, qty=int, li_000__=int)), cursor.sizes)
+        self.assertEqual(dict(custid="A", qty=1, li_000__=1), cursor.executed[1])
+
+    def test_format_many(self):
+        binder = Binder.factory("qmark", coerce_types=True)
+        tqry = "insert into orders (custid, qty) values (%(custid)s, %(qty)s)"
+        rows = [dict(custid="A", qty=Decimal("1.5")), dict(custid="B", qty=2)]
+
+        qry, li_sub = binder.format_many(tqry, rows)
+        self.assertEqual([Decimal, Decimal], [type(sub[1]) for sub in li_sub])
+        self.assertEqual(1, binder.type_stats()[0]["changes"])
+
+
+class Test_Adapters(unittest.TestCase):
+    """bind values converted by type"""
+
+    tqry = "select * from orders where custid = %(custid)s and status = %(status)s and ordernum in (%(li)l)"
+
+    def get_adapters(self):
+        import enum
+        import uuid
+        from datetime import datetime, timedelta, tzinfo
+
+        class UTC(tzinfo):
+            def utcoffset(self, dt):
+                return timedelta(0)
+
+        adapters = AdapterRegistry()
+        adapters.register(enum.Enum, lambda value: value.value)
+        adapters.register(uuid.UUID, str)
+        adapters.register(datetime, lambda value: value.replace(tzinfo=None) if value.tzinfo else value)
+
+        self.Status = enum.Enum("Status", "NEW SHIPPED")
+        self.custid = uuid.UUID("12345678123456781234567812345678")
+        self.aware = datetime(2020, 1, 1, 12, tzinfo=UTC())
+        return adapters
+
+    def test_adapt(self):
+        adapters = self.get_adapters()
+        binder = Binder.factory("named", adapters=adapters)
+
+        qry, sub = binder.format(self.tqry, dict(custid=self.custid, status=self.Status.SHIPPED, li=[self.aware, 3]))
+        self.assertEqual("12345678-1234-5678-1234-567812345678", sub["custid"])
+        self.assertEqual(2, sub["status"])
+        self.assertEqual(None, sub["li_000__"].tzinfo)
+        self.assertEqual(3, sub["li_001__"])
+
+        # looked up once per concrete type, through the MRO
+        self.assertTrue(adapters.get(type(self.Status.NEW)) is adapters.get(type(self.Status.SHIPPED)))
+        self.assertEqual(None, adapters.get(int))
+
+        # a new adapter resets the lookups
+        adapters.register(int, lambda value: value * 10)
+        qry, sub = binder.format(self.tqry, dict(custid=1, status=True, li=[]))
+        self.assertEqual((10, 10), (sub["custid"], sub["status"]))
+
+    def test_off(self):
+        binder = Binder.factory("qmark")
+        status = object()
+        qry, sub = binder.format(self.tqry, dict(custid=1, status=status, li=[]))
+        self.assertTrue(sub[1] is status)
+
+    def test_format_many(self):
+        """adapted a batch at a time, same results as one row at a time"""
+        adapters = self.get_adapters()
+
+        rows = []
+        for ix in range(25):
+            status = self.Status.NEW if ix % 3 else "mixed"
+            rows.append(dict(custid=self.custid, status=status, li=[ix, self.aware]))
+
+        for paramstyle in ["qmark", "named"]:
+            binder = Binder.factory(paramstyle, adapters=adapters)
+            binder.ADAPT_BATCH = 10
+
+            qry, li_sub = binder.format_many(self.tqry, rows)
+            exp = [binder.format(self.tqry, row)[1] for row in rows]
+            self.assertEqual(exp, list(li_sub))
+
+        binder = Binder.factory("qmark", adapters=adapters)
+        qry, li_sub = binder.format_many("select 1", [{}, {}])
+        self.assertEqual([(), ()], list(li_sub))
+
+    def test_array(self):
+        """the values of lists bound as arrays are adapted too"""
+        adapters = self.get_adapters()
+        binder = Binder.factory(
+            "pyformat", adapters=adapters, list_strategy=LIST_ARRAY, list_strategy_threshold=2
+        )
+
+        qry, sub = binder.format(self.tqry, dict(custid=1, status=2, li=[self.custid, self.Status.NEW]))
+        self.assertEqual(["12345678-1234-5678-1234-567812345678", 1], sub["li__"])
+
+        rows = [dict(custid=1, status=2, li=[self.Status.NEW, self.Status.SHIPPED]) for ix in range(3)]
+        qry, li_sub = binder.format_many(self.tqry, rows)
+        self.assertEqual([[1, 2]] * 3, [sub["li__"] for sub in li_sub])
+        self.assertEqual([[2], [1]], adapters.adapt_column([[self.Status.SHIPPED], [self.Status.NEW]]))
+
+
+class Test_Normalize(unittest.TestCase):
+    """comments and whitespace stripped, fingerprints"""
+
+    tqry = """
+        select o.*   -- all of it
+        from orders o
+        /* only the customer's */
+        where o.custid = %(custid)s
+          and o.note = '  -- not a comment  '
+          and "Odd  Column" = 'it''s /* kept */'
+        """
+
+    def test_normalize_sql(self):
+        exp = (
+            "select o.* from orders o where o.custid = %(custid)s "
+            "and o.note = '  -- not a comment  ' "
+            "and \"Odd  Column\" = 'it''s /* kept */'"
+        )
+        self.assertEqual(exp, normalize_sql(self.tqry))
+
+        # optimizer hints are comments that matter
+        self.assertEqual(
+            "select /*+ INDEX(o ix_custid) */ * from orders o",
+            normalize_sql("select /*+ INDEX(o ix_custid) */ *\n  from orders o -- done"),
+        )
+
+        # a comment between two words still separates them
+        self.assertEqual("select a from b", normalize_sql("select a/* x */from b"))
+
+    def test_binder(self):
+        sub_exp = dict(custid=5)
+
+        binder = Binder.factory("qmark", normalize=True)
+        qry, sub = binder.format(self.tqry, sub_exp)
+        self.assertTrue(qry.startswith("select o.* from orders o where o.custid = ? and"))
+        self.assertEqual((5,), tuple(sub))
+
+        # normalized and verbatim parses don't mix in a shared cache
+        binders = Binder.factories(["qmark"])
+        plain = binders["qmark"]
+        qry_plain, sub = plain.format(self.tqry, sub_exp)
+        self.assertTrue("-- all of it" in qry_plain)
+
+        normalizing = Binder.factory("qmark", normalize=True, cache=plain.cache)
+        self.assertEqual(qry, normalizing.format(self.tqry, sub_exp)[0])
+        self.assertEqual(qry_plain, plain.format(self.tqry, sub_exp)[0])
+
+    def test_fingerprint(self):
+        """the same across paramstyles, whitespace and comments"""
+
+        reformatted = (
+            "select o.* from orders o\nwhere o.custid = %(custid)s and o.note = '  -- not a comment  '\n"
+            "and \"Odd  Column\" = 'it''s /* kept */' -- reformatted"
+        )
+
+        fingerprints = set()
+        for paramstyle in ["named", "qmark", "pyformat"]:
+            binder = Binder.factory(paramstyle)
+            fingerprints.add(binder.fingerprint(self.tqry))
+            fingerprints.add(binder.fingerprint(reformatted))
+            fingerprints.add(Binder.factory(paramstyle, normalize=True).fingerprint(self.tqry))
+        self.assertEqual(1, len(fingerprints))
+
+        binder = Binder.factory("named")
+        self.assertNotEqual(binder.fingerprint(self.tqry), binder.fingerprint(self.tqry + " and 1 = 1"))
+        self.assertNotEqual(binder.fingerprint(self.tqry), binder.fingerprint(self.tqry.replace("'  --", "' --")))
+
+        # and what instrumentation is keyed on
+        binder = Binder.factory("named", track_types=True)
+        binder.format(self.tqry, dict(custid=1))
+        (stats,) = binder.type_stats()
+        self.assertEqual(binder.fingerprint(self.tqry), stats["fingerprint"])
+
+    def test_fingerprint_fragments(self):
+        """each fragment combination is its own query"""
+        tqry = "select * from orders where 1 = 1 %[and custid = %(custid)s%] %[and status = %(status)s%]"
+        binder = Binder.factory("qmark")
+        compiled = binder.compile(tqry)
+        self.assertEqual(compiled.fingerprint + ".10", compiled.shape(binder, (True, False)).fingerprint)
+        self.assertEqual(compiled.fingerprint + ".01", compiled.shape(binder, (False, True)).fingerprint)
+
+
 if __name__ == "__main__":
     import sys
 
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_registry
+----------------------------------
+
+Tests for `pynoorm.registry` module.
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from time import time
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### debugging #####################
+import pdb
+
+
+def cpdb(e=None):
+    """conditional debugging
+       use with:  `if cpdb(): pdb.set_trace()`
+    """
+    return cpdb.enabled
+
+
+cpdb.enabled = False
+###################################
+
+from pynoorm.binder import Binder, ParsedTemplate
+from pynoorm.registry import TemplateRegistry
+
+
+class Test_Registry(unittest.TestCase):
+
+    paramstyles = ["named", "qmark", "pyformat"]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.directory, "templates.cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_templates(self, count):
+        for ix in range(count):
+            subdir = os.path.join(self.directory, "sql", "group%02d" % (ix % 10))
+            if not os.path.isdir(subdir):
+                os.makedirs(subdir)
+
+            tqry = """select o.*, c.name
+                      from orders o join customer c on c.custid = o.custid
+                      -- template %d
+                      where o.custid = %%(custid)s
+                      and o.status in (%%(li_status)l)
+                      and o.sku like 'A%%%%'
+                      and o.qty > %%(qty)s
+                      order by o.ordernum""" % (ix)
+
+            with open(os.path.join(subdir, "query%03d.sql" % (ix)), "w") as fo:
+                fo.write(tqry)
+
+    def get_registry(self, cache_file=True):
+        binders = Binder.factories(self.paramstyles)
+        registry = TemplateRegistry(binders, cache_file=self.cache_file if cache_file else None)
+        return binders, registry
+
+    def test_load(self):
+        self.write_templates(12)
+        with open(os.path.join(self.directory, "sql", "notes.txt"), "w") as fo:
+            fo.write("not a template")
+
+        binders, registry = self.get_registry(cache_file=False)
+        registry.load(os.path.join(self.directory, "sql"))
+
+        self.assertEqual(12, len(registry))
+        self.assertTrue("group01/query011" in registry)
+        self.assertEqual(dict(templates=12, warm=0, cold=12), registry.stats)
+
+        # already parsed and rendered
+        cache = binders["named"].cache
+        self.assertEqual(12, cache.stats()["misses"])
+        qry, sub = binders["named"].format(
+            registry["group01/query011"], dict(custid="ACME", li_status=["A"], qty=1)
+        )
+        self.assertTrue("where o.custid = :custid" in qry)
+        self.assertEqual(12, cache.stats()["misses"])
+
+    def test_warm(self):
+        self.write_templates(20)
+        args = dict(custid="ACME", li_status=["A", "B"], qty=1)
+
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertTrue(os.path.exists(self.cache_file))
+        exp = dict(
+            [(paramstyle, binder.format(registry["group05/query015"], args)) for paramstyle, binder in binders.items()]
+        )
+
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=20, warm=20, cold=0), registry.stats)
+
+        for paramstyle, binder in binders.items():
+            self.assertEqual(exp[paramstyle], binder.format(registry["group05/query015"], args))
+            self.assertEqual(0, binder.cache.stats()["misses"])
+
+    def test_changed(self):
+        """templates are keyed by their text, a changed file gets recompiled"""
+        self.write_templates(5)
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+
+        path = os.path.join(self.directory, "sql", "group03", "query003.sql")
+        with open(path, "a") as fo:
+            fo.write(" limit 10")
+
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=5, warm=4, cold=1), registry.stats)
+
+        # the parses are shared by all paramstyles, one more only needs to render them
+        self.paramstyles = self.paramstyles + ["numeric"]
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=5, warm=5, cold=0), registry.stats)
+        self.assertTrue(registry["group03/query003"].endswith(" limit 10"))
+        qry, sub = binders["numeric"].format(registry["group03/query003"], dict(custid="ACME", li_status=["A"], qty=1))
+        self.assertTrue("where o.custid = :1" in qry)
+
+    def test_json(self):
+        """the cache file is plain data, nothing in it gets executed"""
+        self.write_templates(2)
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+
+        with open(self.cache_file) as fi:
+            data = json.load(fi)
+        self.assertEqual(2, len(data["templates"]))
+        self.assertEqual(
+            [
+                "fingerprint",
+                "fragments",
+                "hash",
+                "list_keys",
+                "normalized",
+                "predicate_keys",
+                "predicates",
+                "tokens",
+                "tqry",
+            ],
+            sorted(data["templates"][0].keys()),
+        )
+
+    def test_restored(self):
+        """the parse comes back as it was, without deriving it again from the tokens"""
+        tqry = """select * from orders where 1 = 1
+                  %[and custid = %(custid)s %[and (custid, ordernum) not in (%(li_key)l)%]%]
+                  and status in (%(li_status)l) and sku in (select sku from sku where x in (%(li_status)l))"""
+        binders = Binder.factories(self.paramstyles)
+        registry = TemplateRegistry(binders, cache_file=self.cache_file)
+        registry.add("search", tqry)
+        registry.precompile()
+
+        binders = Binder.factories(self.paramstyles)
+        registry = TemplateRegistry(binders, cache_file=self.cache_file)
+        registry.add("search", tqry)
+        registry.precompile()
+        self.assertEqual(1, registry.stats["warm"])
+
+        parsed = ParsedTemplate(tqry)
+        restored = binders["qmark"].cache.values()[0]
+        for attrname in ["tokens", "list_keys", "predicates", "predicate_keys", "fragments", "fingerprint"]:
+            self.assertEqual(getattr(parsed, attrname), getattr(restored, attrname), attrname)
+
+        args = dict(custid="ACME", li_key=[("ACME", 1)], li_status=[1, 2, 3, 4])
+        self.assertEqual(
+            Binder.factory("qmark", list_optimize=True).format(tqry, args),
+            Binder.factory("qmark", list_optimize=True, cache=binders["qmark"].cache).format(tqry, args),
+        )
+
+    def test_normalize(self):
+        """normalizing binders get their own parses, cached as well"""
+        self.write_templates(4)
+        args = dict(custid="ACME", li_status=["A"], qty=1)
+
+        def get_registry():
+            binders = Binder.factories(self.paramstyles)
+            binders["normalized"] = Binder.factory("named", normalize=True, cache=binders["named"].cache)
+            return binders, TemplateRegistry(binders, cache_file=self.cache_file)
+
+        binders, registry = get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=4, warm=0, cold=4), registry.stats)
+
+        binders, registry = get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=4, warm=4, cold=0), registry.stats)
+
+        qry, sub = binders["normalized"].format(registry["group02/query002"], args)
+        self.assertFalse("--" in qry)
+        qry, sub = binders["named"].format(registry["group02/query002"], args)
+        self.assertTrue("-- template 2" in qry)
+        self.assertEqual(0, binders["named"].cache.stats()["misses"])
+
+    def test_corrupt(self):
+        self.write_templates(3)
+        with open(self.cache_file, "wb") as fo:
+            fo.write(b"garbage")
+
+        binders, registry = self.get_registry()
+        registry.load(os.path.join(self.directory, "sql"))
+        self.assertEqual(dict(templates=3, warm=0, cold=3), registry.stats)
+
+    def test_startup_speed(self):
+        """500 templates, 3 paramstyles"""
+        count = 500
+        self.write_templates(count)
+        directory = os.path.join(self.directory, "sql")
+
+        start = time()
+        binders, registry = self.get_registry()
+        registry.load(directory)
+        cold = time() - start
+
+        start = time()
+        binders, registry = self.get_registry()
+        registry.load(directory)
+        warm = time() - start
+
+        self.assertEqual(count, registry.stats["warm"])
+        print(
+            "%s templates, %s paramstyles: %.3f seconds cold, %.3f warm (%.1fx)"
+            % (count, len(self.paramstyles), cold, warm, cold / warm)
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # interactive debug
+    debug_flag = "--pdb"
+    if debug_flag in sys.argv:
+        sys.argv.remove(debug_flag)
+        cpdb.enabled = True
+
+    sys.exit(unittest.main())
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_resultcache
+----------------------------------
+
+Tests for `pynoorm.resultcache` module.
+"""
+import sqlite3
+import unittest
+from time import time
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### debugging #####################
+import pdb
+
+
+def cpdb(e=None):
+    """conditional debugging
+       use with:  `if cpdb(): pdb.set_trace()`
+    """
+    return cpdb.enabled
+
+
+cpdb.enabled = False
+###################################
+
+from pynoorm.binder import Binder
+from pynoorm.resultcache import ResultCache, get_cache_tags
+
+
+class Test_ResultCache(unittest.TestCase):
+
+    tqry = """-- cache_tags: tax_rate, country
+              select * from tax_rate where country = %(country)s order by code"""
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute("create table tax_rate (country text, code text, rate real)")
+        self.connection.executemany(
+            "insert into tax_rate values (?, ?, ?)",
+            [
+                (country, "T%02d" % (ix), ix / 100.0)
+                for country in ["CAN", "USA", "FRA"]
+                for ix in range(20)
+            ],
+        )
+        self.now = [1000.0]
+
+    def tearDown(self):
+        self.connection.close()
+
+    def get_cache(self, **kwds):
+        cache = ResultCache(**kwds)
+        cache.clock = lambda: self.now[0]
+        return cache
+
+    def test_fetch(self):
+        cache = self.get_cache()
+
+        for paramstyle in ["qmark", "named"]:
+            binder = Binder.factory(paramstyle)
+            rows = cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+            self.assertEqual(20, len(rows))
+            self.assertEqual(("CAN", "T01", 0.01), rows[1])
+            self.assertTrue(isinstance(rows, tuple))
+
+            # the same rows, not a copy
+            self.assertTrue(rows is cache.fetch(binder, self.connection, self.tqry, dict(country="CAN")))
+            self.assertFalse(rows is cache.fetch(binder, self.connection, self.tqry, dict(country="USA")))
+
+        stats = cache.stats()
+        self.assertEqual((2, 4, 4), (stats["hits"], stats["misses"], stats["size"]))
+        self.assertEqual(2 / 6.0, stats["hit_ratio"])
+        self.assertTrue(stats["nbytes"] > 0)
+
+    def test_fragments(self):
+        """the query text tells apart fragment combinations with the same parameters"""
+        tqry = "select count(*) from tax_rate where 1 = 1 %[and country = %(country)s%] %[and code = %(code)s%]"
+        cache = self.get_cache()
+        binder = Binder.factory("qmark")
+        self.assertEqual(((20,),), cache.fetch(binder, self.connection, tqry, dict(country="CAN")))
+        self.assertEqual(((0,),), cache.fetch(binder, self.connection, tqry, dict(code="CAN")))
+
+    def test_ttl(self):
+        cache = self.get_cache(ttl=60)
+        binder = Binder.factory("qmark")
+        args = dict(country="CAN")
+
+        rows = cache.fetch(binder, self.connection, self.tqry, args)
+        self.now[0] += 59
+        self.assertTrue(rows is cache.fetch(binder, self.connection, self.tqry, args))
+
+        self.now[0] += 1
+        self.assertFalse(rows is cache.fetch(binder, self.connection, self.tqry, args))
+        self.assertEqual(1, cache.stats()["expirations"])
+
+        # per result
+        rows = cache.fetch(binder, self.connection, self.tqry, dict(country="FRA"), ttl=None)
+        self.now[0] += 10 ** 6
+        self.assertTrue(rows is cache.fetch(binder, self.connection, self.tqry, dict(country="FRA")))
+
+    def test_lru(self):
+        binder = Binder.factory("qmark")
+        cache = self.get_cache(maxsize=2)
+
+        can = cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        cache.fetch(binder, self.connection, self.tqry, dict(country="USA"))
+        # CAN is the most recently used now, USA goes
+        cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        cache.fetch(binder, self.connection, self.tqry, dict(country="FRA"))
+
+        self.assertEqual(1, cache.stats()["evictions"])
+        self.assertTrue(can is cache.fetch(binder, self.connection, self.tqry, dict(country="CAN")))
+
+        # byte budget
+        size = cache.nbytes // 2
+        cache = self.get_cache(max_bytes=size * 2 + 1)
+        for country in ["CAN", "USA", "FRA"]:
+            cache.fetch(binder, self.connection, self.tqry, dict(country=country))
+        self.assertEqual(2, len(cache))
+        self.assertTrue(cache.nbytes <= cache.max_bytes)
+
+        # too big to cache at all
+        cache = self.get_cache(max_bytes=100)
+        cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        self.assertEqual((0, 0), (len(cache), cache.nbytes))
+
+    def test_invalidate(self):
+        self.assertEqual(frozenset(["tax_rate", "country"]), get_cache_tags(self.tqry))
+
+        binder = Binder.factory("qmark")
+        cache = self.get_cache()
+        other = "select * from tax_rate where rate > %(rate)s"
+
+        cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        cache.fetch(binder, self.connection, self.tqry, dict(country="USA"))
+        cache.fetch(binder, self.connection, other, dict(rate=0.1))
+        cache.fetch(binder, self.connection, other, dict(rate=0.2), tags=["rates"])
+
+        self.assertEqual(2, cache.invalidate("country"))
+        self.assertEqual(0, cache.invalidate("country"))
+        self.assertEqual(1, cache.invalidate("rates", "unknown"))
+        self.assertEqual(1, len(cache))
+        self.assertEqual(3, cache.stats()["invalidations"])
+
+        self.connection.execute("update tax_rate set rate = 1 where country = 'CAN'")
+        rows = cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        self.assertEqual(1, rows[0][2])
+
+    def test_invalidate_during_fetch(self):
+        """rows fetched while their table is invalidated aren't cached"""
+
+        binder = Binder.factory("qmark")
+        cache = self.get_cache()
+        execute = cache._execute
+
+        def invalidating(connection, qry, sub):
+            rows = execute(connection, qry, sub)
+            cache.invalidate("country")
+            return rows
+
+        cache._execute = invalidating
+        rows = cache.fetch(binder, self.connection, self.tqry, dict(country="CAN"))
+        self.assertEqual(20, len(rows))
+        self.assertEqual(0, len(cache))
+
+        # other tags don't matter
+        cache._execute = execute
+        generations = cache.generations(["country"])
+        cache.invalidate("currency")
+        cache.put("key", ((1,),), tags=frozenset(["country"]), generations=generations)
+        self.assertEqual(1, len(cache))
+
+    def test_uncacheable(self):
+        """parameters that can't be hashed are fetched without caching"""
+
+        class Unhashable(object):
+            __hash__ = None
+
+            def __conform__(self, protocol):
+                return "CAN"
+
+        cache = self.get_cache()
+        binder = Binder.factory("qmark")
+        rows = cache.fetch(binder, self.connection, self.tqry, dict(country=Unhashable()))
+        self.assertEqual(20, len(rows))
+        self.assertEqual((1, 0), (cache.stats()["uncacheable"], len(cache)))
+
+    def test_saved(self):
+        """the latency saved, against executing every time"""
+
+        self.connection.executemany(
+            "insert into tax_rate values (?, ?, ?)",
+            [("XXX", "T%05d" % (ix), ix / 100.0) for ix in range(20000)],
+        )
+        tqry = "select country, count(*), avg(rate) from tax_rate where rate > %(rate)s group by country"
+        binder = Binder.factory("qmark")
+        cache = ResultCache()
+        count = 200
+
+        start = time()
+        for ix in range(count):
+            qry, sub = binder.format(tqry, dict(rate=0.1))
+            exp = self.connection.execute(qry, sub).fetchall()
+        seconds_uncached = time() - start
+
+        start = time()
+        for ix in range(count):
+            rows = cache.fetch(binder, self.connection, tqry, dict(rate=0.1))
+        seconds_cached = time() - start
+
+        self.assertEqual(tuple(exp), rows)
+        stats = cache.stats()
+        self.assertEqual(count - 1, stats["hits"])
+        self.assertTrue(stats["saved_seconds"] > 0)
+        print(
+            "%s executions:  %.3f seconds uncached, %.3f cached.  %.3f seconds saved by %s hits"
+            % (count, seconds_uncached, seconds_cached, stats["saved_seconds"], stats["hits"])
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # interactive debug
+    debug_flag = "--pdb"
+    if debug_flag in sys.argv:
+        sys.argv.remove(debug_flag)
+        cpdb.enabled = True
+
+    sys.exit(unittest.main())
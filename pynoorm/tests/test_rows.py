@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_rows
+----------------------------------
+
+Tests for `pynoorm.rows` module.
+"""
+import sqlite3
+import unittest
+from time import time
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### debugging #####################
+import pdb
+
+
+def cpdb(e=None):
+    """conditional debugging
+       use with:  `if cpdb(): pdb.set_trace()`
+    """
+    return cpdb.enabled
+
+
+cpdb.enabled = False
+###################################
+
+from pynoorm.binder import Binder
+from pynoorm.executor import StreamingExecutor
+from pynoorm.linker import Linker
+from pynoorm.rows import RowFactory, RowBase, column_names
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    # Python 2
+    tracemalloc = None
+
+
+class Test_Rows(unittest.TestCase):
+
+    customers = 200
+    orders_per_customer = 10
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute("create table customer (custid integer, name text)")
+        self.connection.execute("create table orders (ordernum integer, custid integer, qty integer)")
+        self.connection.executemany(
+            "insert into customer values (?, ?)",
+            [(custid, "customer %s" % (custid)) for custid in range(self.customers)],
+        )
+        self.connection.executemany(
+            "insert into orders values (?, ?, ?)",
+            [
+                (ix, ix % self.customers, ix % 7)
+                for ix in range(self.customers * self.orders_per_customer)
+            ],
+        )
+
+    def tearDown(self):
+        self.connection.close()
+
+    def fetch(self, factory, qry):
+        cursor = self.connection.cursor()
+        cursor.execute(qry)
+        return factory.rows(cursor)
+
+    def test_rows(self):
+        factory = RowFactory()
+        rows = self.fetch(factory, "select * from customer order by custid")
+
+        self.assertEqual(self.customers, len(rows))
+        row = rows[3]
+        self.assertTrue(isinstance(row, RowBase))
+        self.assertEqual((3, "customer 3"), (row.custid, row.name))
+        self.assertEqual((3, "customer 3"), row._astuple())
+        self.assertEqual(dict(custid=3, name="customer 3"), row._asdict())
+        self.assertEqual("Row0(custid=3, name='customer 3')", repr(row))
+
+        # compact:  no __dict__ until an attribute other than the columns is set
+        self.assertFalse(hasattr(row, "__dict__") and row.__dict__)
+        row.note = "vip"
+        self.assertEqual("vip", row.note)
+
+        # one class per column signature
+        again = self.fetch(factory, "select custid, name from customer")
+        self.assertTrue(type(again[0]) is type(row))
+        other = self.fetch(factory, "select name, custid from customer")
+        self.assertFalse(type(other[0]) is type(row))
+
+    def test_column_names(self):
+        description = [("CUSTID",), ("count(*)",), ("custid",), ("1st",), ("class",), ("__init__",)]
+        self.assertEqual(
+            ("CUSTID", "count___", "custid", "_1st", "_class", "___init__"),
+            column_names(description),
+        )
+        self.assertEqual(
+            ("custid", "count___", "custid_1", "_1st", "_class", "___init__"),
+            column_names(description, lower=True),
+        )
+
+        factory = RowFactory(lower=True)
+        rows = self.fetch(factory, "select custid as CUSTID, count(*), custid from orders group by custid")
+        self.assertEqual((0, 10, 0), (rows[0].custid, rows[0].count___, rows[0].custid_1))
+
+    def test_link(self):
+        """Linker works with rows as is"""
+
+        for factory in [RowFactory(), RowFactory(extra=("orders",), overflow=False)]:
+            customers = self.fetch(factory, "select * from customer")
+            orders = self.fetch(factory, "select * from orders")
+
+            linker = Linker(key_left="custid")
+            di_customer = linker.dict_from_list(customers)
+            helper = linker.link(
+                di_customer,
+                orders,
+                attrname_on_left="orders",
+                attrname_on_right="customer" if factory.overflow else None,
+            )
+            self.assertEqual([], helper.right_orphans)
+
+            customer = di_customer[7]
+            self.assertEqual(self.orders_per_customer, len(customer.orders))
+            self.assertEqual(set([7]), set([order.custid for order in customer.orders]))
+            if factory.overflow:
+                self.assertTrue(customer.orders[0].customer is customer)
+
+        # without overflow, undeclared link attributes fail
+        orders = self.fetch(factory, "select * from orders")
+        self.assertRaises(
+            AttributeError,
+            linker.link,
+            di_customer,
+            orders,
+            attrname_on_left="orders",
+            attrname_on_right="customer",
+        )
+
+    def test_stream(self):
+        """a RowFactory as StreamingExecutor's row_factory"""
+        factory = RowFactory()
+        executor = StreamingExecutor(Binder.factory("qmark"), self.connection)
+
+        stream = executor.stream(
+            "select * from orders where custid = %(custid)s", dict(custid=5), row_factory=factory
+        )
+        rows = list(stream)
+        self.assertEqual(self.orders_per_customer, len(rows))
+        self.assertEqual(set([5]), set([row.custid for row in rows]))
+
+    @unittest.skipIf(tracemalloc is None, "needs tracemalloc")
+    def test_memory(self):
+        """against the tuples and one dict per row"""
+
+        count = 100000
+        fetched = [(ix, ix % 100, "status %s" % (ix % 5), ix * 1.5) for ix in range(count)]
+        description = [("ordernum",), ("custid",), ("status",), ("amount",)]
+        names = [column[0] for column in description]
+
+        class Cursor(object):
+            pass
+
+        cursor = Cursor()
+        cursor.description = description
+        factory = RowFactory()
+        factory.get_class(description)
+
+        def measure(convert):
+            tracemalloc.start()
+            try:
+                start = time()
+                rows = convert()
+                seconds = time() - start
+                size = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            return rows, size, seconds
+
+        dicts, size_dicts, seconds_dicts = measure(lambda: [dict(zip(names, row)) for row in fetched])
+        del dicts
+        rows, size_rows, seconds_rows = measure(lambda: factory.rows(cursor, fetched))
+
+        self.assertEqual(fetched[-1], rows[-1]._astuple())
+        # about half, the values themselves are shared with the tuples
+        self.assertTrue(size_rows < size_dicts * 0.6)
+        print(
+            "%s rows: dicts %s KB %.3f seconds, slotted rows %s KB %.3f seconds"
+            % (count, size_dicts // 1024, seconds_dicts, size_rows // 1024, seconds_rows)
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # interactive debug
+    debug_flag = "--pdb"
+    if debug_flag in sys.argv:
+        sys.argv.remove(debug_flag)
+        cpdb.enabled = True
+
+    sys.exit(unittest.main())